@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Producto,Clientes,Categoria,Empleado,Factura,Medicamento,Pedidos,Persona,Proveedor
+from .models import Producto,Clientes,Categoria,Empleado,Factura,Medicamento,Pedidos,Persona,Proveedor,MovimientoStock,Lote,AlertaInventario,OrdenCompra,ClaveIdempotencia,ResumenCliente,Sucursal,StockSucursal,TransferenciaStock,FacturaArchivada,FacturaClienteArchivada,FacturacionMensual
 # Register your models here
 
 
@@ -10,5 +10,19 @@ admin.site.register(Medicamento)
 admin.site.register(Proveedor)
 admin.site.register(Categoria)
 admin.site.register(Clientes)
-admin.site.register(Producto)
+@admin.register(Producto)
+class ProductoAdmin(admin.ModelAdmin):
+    readonly_fields = ['precio', 'stock']  # El stock solo cambia con movimientos del kardex
 admin.site.register(Persona)
+admin.site.register(MovimientoStock)
+admin.site.register(Lote)
+admin.site.register(AlertaInventario)
+admin.site.register(OrdenCompra)
+admin.site.register(ClaveIdempotencia)
+admin.site.register(ResumenCliente)
+admin.site.register(Sucursal)
+admin.site.register(StockSucursal)
+admin.site.register(TransferenciaStock)
+admin.site.register(FacturaArchivada)
+admin.site.register(FacturaClienteArchivada)
+admin.site.register(FacturacionMensual)
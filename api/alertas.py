@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import AlertaInventario, Lote, MarcaProceso, Producto, StockSucursal
+
+MARCA = 'alertas_inventario'
+# Solapamiento entre corridas para no perder cambios de transacciones lentas
+SOLAPAMIENTO = timedelta(minutes=1)
+LOTE = 1000
+
+
+def _evaluar_stock(stock, stock_minimo):
+    """Alertas de stock de un producto en un almacén: {tipo: mensaje}."""
+    if stock == 0:
+        return {'AGOTADO': "Producto agotado."}
+    if stock <= stock_minimo:
+        return {'STOCK_BAJO': f"Quedan {stock} unidades."}
+    return {}
+
+
+def _evaluar_vencimiento(fecha_vencimiento, hoy, limite, lote=''):
+    """Alerta de vencimiento de un producto (o de su lote más próximo): {tipo: mensaje}."""
+    if fecha_vencimiento < hoy:
+        return {'VENCIDO': f"{lote}Venció el {fecha_vencimiento:%d/%m/%Y}."}
+    if fecha_vencimiento <= limite:
+        return {'POR_VENCER': f"{lote}Vence el {fecha_vencimiento:%d/%m/%Y}."}
+    return {}
+
+
+def _deseadas(bloque, candidatos, hoy, limite, stock_minimo):
+    """
+    Alertas que corresponden a los productos del bloque: {(producto, sucursal, tipo): mensaje}.
+    El stock se evalúa en el almacén central y en cada local; el vencimiento, con la
+    fecha más próxima entre la del producto y la de sus lotes con existencias.
+    """
+    proximos = {}
+    for producto_id, lote_id, codigo, fecha_vencimiento in (
+        Lote.objects
+        .filter(producto_id__in=bloque, cantidad__gt=0)
+        .order_by('producto_id', 'fecha_vencimiento', 'id')
+        .values_list('producto_id', 'id', 'codigo', 'fecha_vencimiento')
+    ):
+        proximos.setdefault(producto_id, (fecha_vencimiento, f"Lote {codigo or lote_id}: "))
+
+    deseadas = {}
+    for pk in bloque:
+        stock, fecha_vencimiento = candidatos[pk]
+        lote = ''
+        if pk in proximos and proximos[pk][0] < fecha_vencimiento:
+            fecha_vencimiento, lote = proximos[pk]
+        alertas = {**_evaluar_stock(stock, stock_minimo), **_evaluar_vencimiento(fecha_vencimiento, hoy, limite, lote)}
+        deseadas.update({(pk, None, tipo): mensaje for tipo, mensaje in alertas.items()})
+    for producto_id, sucursal_id, stock in (
+        StockSucursal.objects.filter(producto_id__in=bloque).values_list('producto_id', 'sucursal_id', 'stock')
+    ):
+        deseadas.update({
+            (producto_id, sucursal_id, tipo): mensaje
+            for tipo, mensaje in _evaluar_stock(stock, stock_minimo).items()
+        })
+    return deseadas
+
+
+def escanear():
+    """
+    Recalcula las alertas de los productos modificados desde la última corrida (en
+    el almacén central o en algún local) y de los que, ellos o alguno de sus lotes,
+    entraron en la ventana de vencimiento por el paso de los días.
+    Devuelve (creadas, resueltas).
+    """
+    config = settings.INVENTARIO
+    stock_minimo = config['STOCK_MINIMO']
+    dias_aviso = timedelta(days=config['DIAS_AVISO_VENCIMIENTO'])
+    ahora = timezone.now()
+    hoy = timezone.localdate()
+    limite = hoy + dias_aviso
+
+    marca, _ = MarcaProceso.objects.get_or_create(nombre=MARCA)
+    desde = parse_datetime(marca.datos.get('desde', '')) if marca.datos.get('desde') else None
+    ultimo_dia = parse_date(marca.datos.get('dia', '')) if marca.datos.get('dia') else None
+
+    columnas = ('pk', 'stock', 'fecha_vencimiento')
+    if desde is None or ultimo_dia is None:
+        # Primera corrida: se evalúa todo el catálogo una sola vez
+        consultas = [Producto.objects.values_list(*columnas)]
+    else:
+        consultas = [
+            Producto.objects.filter(actualizado__gte=desde - SOLAPAMIENTO).values_list(*columnas),
+            Producto.objects.filter(
+                pk__in=StockSucursal.objects.filter(actualizado__gte=desde - SOLAPAMIENTO).values('producto')
+            ).values_list(*columnas),
+        ]
+        if ultimo_dia < hoy:
+            # Rangos indexados: los que entran a la ventana de aviso y los que vencieron desde la última corrida
+            consultas.append(Producto.objects.filter(
+                fecha_vencimiento__gt=ultimo_dia + dias_aviso, fecha_vencimiento__lte=limite
+            ).values_list(*columnas))
+            consultas.append(Producto.objects.filter(
+                fecha_vencimiento__gte=ultimo_dia, fecha_vencimiento__lt=hoy
+            ).values_list(*columnas))
+            # Lo mismo para los lotes con existencias (índice lote_vencimiento_idx)
+            lotes = Lote.objects.filter(cantidad__gt=0)
+            consultas.append(Producto.objects.filter(pk__in=lotes.filter(
+                fecha_vencimiento__gt=ultimo_dia + dias_aviso, fecha_vencimiento__lte=limite
+            ).values('producto')).values_list(*columnas))
+            consultas.append(Producto.objects.filter(pk__in=lotes.filter(
+                fecha_vencimiento__gte=ultimo_dia, fecha_vencimiento__lt=hoy
+            ).values('producto')).values_list(*columnas))
+
+    candidatos = {}
+    for consulta in consultas:
+        for pk, stock, fecha_vencimiento in consulta.iterator(chunk_size=LOTE):
+            candidatos[pk] = (stock, fecha_vencimiento)
+
+    creadas = resueltas = 0
+    ids = list(candidatos)
+    for inicio in range(0, len(ids), LOTE):
+        bloque = ids[inicio:inicio + LOTE]
+        deseadas = _deseadas(bloque, candidatos, hoy, limite, stock_minimo)
+        activas = {
+            (producto_id, sucursal_id, tipo): pk
+            for pk, producto_id, sucursal_id, tipo in AlertaInventario.objects
+            .filter(activa=True, producto_id__in=bloque)
+            .values_list('pk', 'producto_id', 'sucursal_id', 'tipo')
+        }
+        with transaction.atomic():
+            cerrar = [pk for clave, pk in activas.items() if clave not in deseadas]
+            if cerrar:
+                resueltas += AlertaInventario.objects.filter(pk__in=cerrar).update(activa=False, resuelta=ahora)
+            nuevas = [
+                AlertaInventario(producto_id=pk, sucursal_id=sucursal_id, tipo=tipo, mensaje=mensaje, creada=ahora)
+                for (pk, sucursal_id, tipo), mensaje in deseadas.items()
+                if (pk, sucursal_id, tipo) not in activas
+            ]
+            AlertaInventario.objects.bulk_create(nuevas, ignore_conflicts=True)
+            creadas += len(nuevas)
+
+    marca.datos = {'desde': ahora.isoformat(), 'dia': hoy.isoformat()}
+    marca.save(update_fields=['datos', 'actualizado'])
+    return creadas, resueltas
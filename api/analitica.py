@@ -0,0 +1,153 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DetalleFactura, DetalleFacturaCliente, Pedidos, Proveedor, TransicionPedido
+from .precios import desglosar, redondear
+
+CERO = Decimal('0')
+
+
+def _cache_segundos():
+    return getattr(settings, 'ANALITICA_PROVEEDORES_CACHE', 300)
+
+
+def _compras(desde, hasta):
+    """Pedidos del periodo por proveedor: cantidad, monto y unidades pedidas y recibidas."""
+    return {
+        fila.pop('proveedor'): fila
+        for fila in (
+            Pedidos.objects
+            .filter(fecha_pedido__range=(desde, hasta))
+            .values('proveedor')
+            .annotate(
+                pedidos=Count('id'),
+                monto_compras=Sum('total_pedido'),
+                unidades_pedidas=Sum('cantidad'),
+                unidades_recibidas=Sum('cantidad', filter=Q(estado='Completado')),
+            )
+            .order_by()
+        )
+    }
+
+
+def costos_promedio():
+    """Costo de compra promedio ponderado de cada producto según sus pedidos recibidos."""
+    return {
+        fila['producto']: fila['costo'] / fila['unidades']
+        for fila in (
+            Pedidos.objects
+            .filter(estado='Completado', producto__isnull=False)
+            .values('producto')
+            .annotate(costo=Sum(F('cantidad') * F('precio_compra')), unidades=Sum('cantidad'))
+            .order_by()
+        )
+        if fila['unidades']
+    }
+
+
+def _ventas(desde, hasta):
+    """
+    Ventas del periodo por producto de tienda y de clientes en una sola consulta:
+    [(producto, proveedor, unidades, total con IGV), ...].
+    """
+    tienda = (
+        DetalleFactura.objects
+        .filter(factura__fecha__range=(desde, hasta))
+        .order_by()
+        .values('producto', proveedor=F('producto__proveedor'))
+        .annotate(unidades=Sum('cantidad'), total=Sum('subtotal'))
+        .values_list('producto', 'proveedor', 'unidades', 'total')
+    )
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    clientes = (
+        DetalleFacturaCliente.objects
+        .filter(factura__fecha__gte=inicio, factura__fecha__lt=fin)
+        .order_by()
+        .values('producto', proveedor=F('producto__proveedor'))
+        .annotate(unidades=Sum('cantidad'), total=Sum('subtotal'))
+        .values_list('producto', 'proveedor', 'unidades', 'total')
+    )
+    return tienda.union(clientes, all=True)
+
+
+def _tiempos_entrega(desde, hasta):
+    """Días promedio entre la fecha del pedido y su paso a Completado, por proveedor."""
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    demora = ExpressionWrapper(TruncDate('fecha') - F('pedido__fecha_pedido'), output_field=DurationField())
+    return {
+        fila['pedido__proveedor']: fila
+        for fila in (
+            TransicionPedido.objects
+            .filter(estado_nuevo='Completado', fecha__gte=inicio, fecha__lt=fin)
+            .values('pedido__proveedor')
+            .annotate(demora=Avg(demora), completados=Count('pedido', distinct=True))
+            .order_by()
+        )
+    }
+
+
+def calcular(desde, hasta):
+    """
+    Indicadores por proveedor en [desde, hasta]. Cinco consultas agrupadas sin
+    importar la cantidad de proveedores, productos o pedidos.
+    """
+    compras = _compras(desde, hasta)
+    costos = costos_promedio()
+    tiempos = _tiempos_entrega(desde, hasta)
+
+    ventas = defaultdict(lambda: {'unidades': 0, 'total': CERO, 'costo': CERO})
+    for producto, proveedor, unidades, total in _ventas(desde, hasta):
+        acumulado = ventas[proveedor]
+        acumulado['unidades'] += unidades or 0
+        acumulado['total'] += total or CERO
+        acumulado['costo'] += (unidades or 0) * costos.get(producto, CERO)
+
+    ids = set(compras) | set(ventas) | set(tiempos)
+    nombres = dict(Proveedor.objects.filter(pk__in=ids).values_list('pk', 'nombre'))
+    resultado = []
+    for pk in ids:
+        if pk not in nombres:
+            continue
+        compra = compras.get(pk, {})
+        venta = ventas.get(pk, {'unidades': 0, 'total': CERO, 'costo': CERO})
+        ventas_netas, _ = desglosar(redondear(venta['total']))
+        costo = redondear(venta['costo'])
+        tiempo = tiempos.get(pk)
+        resultado.append({
+            'id': pk,
+            'nombre': nombres[pk],
+            'pedidos': compra.get('pedidos', 0),
+            'monto_compras': redondear(compra.get('monto_compras') or CERO),
+            'unidades_pedidas': compra.get('unidades_pedidas') or 0,
+            'unidades_recibidas': compra.get('unidades_recibidas') or 0,
+            'unidades_vendidas': venta['unidades'],
+            'ventas': redondear(venta['total']),
+            'ventas_sin_igv': ventas_netas,
+            'costo_ventas': costo,
+            'margen': ventas_netas - costo,
+            'pedidos_completados': tiempo['completados'] if tiempo else 0,
+            'dias_entrega_promedio': (
+                round(tiempo['demora'].total_seconds() / 86400, 1) if tiempo and tiempo['demora'] is not None else None
+            ),
+        })
+    resultado.sort(key=lambda fila: (-fila['ventas'], fila['id']))
+    return resultado
+
+
+def analitica_proveedores(desde, hasta):
+    """calcular() con caché por ventana de fechas (settings.ANALITICA_PROVEEDORES_CACHE segundos)."""
+    clave = f"analitica_proveedores:{desde.isoformat()}:{hasta.isoformat()}"
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular(desde, hasta)
+        cache.set(clave, resultado, _cache_segundos())
+    return resultado
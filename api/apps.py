@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Registra las señales que invalidan la caché de usuarios autenticados
+        # y la que reinicia las sentencias preparadas de cada conexión nueva
+        from . import autenticacion, sentencias  # noqa: F401
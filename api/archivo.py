@@ -0,0 +1,209 @@
+"""
+Archivo de periodos cerrados.
+
+Las facturas de meses ya cerrados (con cierre de costos y fuera de la ventana
+activa) se mueven por lotes a tablas de archivo con su id original, y sus
+totales se acumulan en resúmenes mensuales (FacturacionMensual y
+VentaProductoMensual). Así las tablas que usan las ventas y los ViewSets solo
+contienen el periodo vivo, y los reportes suman tabla viva + resúmenes sin leer
+el detalle archivado.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import (
+    DetalleFactura, DetalleFacturaArchivada, DetalleFacturaCliente, DetalleFacturaClienteArchivada,
+    Factura, FacturaArchivada, FacturaCliente, FacturaClienteArchivada, FacturacionMensual,
+    VentaProductoMensual,
+)
+from .valoracion import _siguiente, cerrar_meses, ultimo_cierre
+
+CERO = Decimal('0')
+
+# (origen, factura, detalle, factura archivada, detalle archivado, campos de la factura)
+FUENTES = (
+    ('tienda', Factura, DetalleFactura, FacturaArchivada, DetalleFacturaArchivada,
+     ('id', 'empleado_id', 'fecha', 'cliente', 'total', 'subtotal', 'igv', 'uuid', 'sucursal_id')),
+    ('cliente', FacturaCliente, DetalleFacturaCliente, FacturaClienteArchivada, DetalleFacturaClienteArchivada,
+     ('id', 'cliente_id', 'fecha', 'subtotal', 'igv', 'total')),
+)
+CAMPOS_DETALLE = ('id', 'factura_id', 'producto_id', 'cantidad', 'precio_unitario', 'subtotal')
+
+
+def _configuracion():
+    config = {'MESES_ACTIVOS': 12, 'LOTE': 2000}
+    config.update(getattr(settings, 'ARCHIVO', {}))
+    return config
+
+
+def _restar_meses(mes, meses):
+    for _ in range(meses):
+        mes = (mes - timedelta(days=1)).replace(day=1)
+    return mes
+
+
+def limite_archivable():
+    """
+    Primer mes que no se puede archivar: los MESES_ACTIVOS más recientes y los
+    meses sin cierre de costos quedan en las tablas vivas.
+    """
+    limite = _restar_meses(timezone.localdate().replace(day=1), _configuracion()['MESES_ACTIVOS'])
+    cerrado = ultimo_cierre()
+    if cerrado is not None:
+        limite = min(limite, _siguiente(cerrado))
+    return limite
+
+
+def archivar_periodo(hasta=None, lote=None):
+    """
+    Archiva las facturas con fecha anterior al mes `hasta` (por defecto, el
+    límite archivable). Cada lote es una transacción: resúmenes, copia al
+    archivo y borrado de las tablas vivas. Devuelve {origen: facturas archivadas}.
+    """
+    config = _configuracion()
+    lote = lote or config['LOTE']
+    cerrar_meses()  # El margen de los meses archivados sale de sus cierres
+    limite = limite_archivable()
+    if hasta is None:
+        hasta = limite
+    elif hasta > limite:
+        raise ValueError(f"Solo se pueden archivar meses anteriores a {limite:%Y-%m}.")
+
+    archivadas = {}
+    for origen, modelo, detalle, archivo, archivo_detalle, campos in FUENTES:
+        # FacturaCliente.fecha es DateTimeField: el corte es la medianoche local del mes
+        corte = hasta if modelo is Factura else timezone.make_aware(datetime.combine(hasta, time.min))
+        archivadas[origen] = 0
+        while True:
+            ids = list(
+                modelo.objects.filter(fecha__lt=corte).order_by('id').values_list('id', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                _acumular(origen, modelo, detalle, ids)
+                archivo.objects.bulk_create(
+                    [archivo(**fila) for fila in modelo.objects.filter(pk__in=ids).values(*campos)],
+                    batch_size=lote,
+                )
+                archivo_detalle.objects.bulk_create(
+                    [archivo_detalle(**fila) for fila in detalle.objects.filter(factura_id__in=ids).values(*CAMPOS_DETALLE)],
+                    batch_size=lote,
+                )
+                detalle.objects.filter(factura_id__in=ids).delete()
+                modelo.objects.filter(pk__in=ids).delete()
+            archivadas[origen] += len(ids)
+    return archivadas
+
+
+def _acumular(origen, modelo, detalle, ids):
+    """Suma las facturas `ids` a los resúmenes mensuales de su origen."""
+    tiene_sucursal = modelo is Factura
+    mes = TruncMonth('fecha', output_field=DateField())
+    facturas = (
+        modelo.objects.filter(pk__in=ids)
+        .annotate(mes=mes)
+        .values('mes', *(['sucursal_id'] if tiene_sucursal else []))
+        .annotate(facturas=Count('id'), total=Sum('total'), subtotal=Sum('subtotal'), igv=Sum('igv'))
+        .order_by()
+    )
+    _sumar(
+        FacturacionMensual, origen,
+        {(f['mes'], f.get('sucursal_id')): f for f in facturas},
+        ('facturas', 'total', 'subtotal', 'igv'),
+    )
+
+    ventas = (
+        detalle.objects.filter(factura_id__in=ids)
+        .annotate(mes=TruncMonth('factura__fecha', output_field=DateField()))
+        .values('mes', 'producto_id', *(['factura__sucursal_id'] if tiene_sucursal else []))
+        .annotate(unidades=Sum('cantidad'), subtotal=Sum('subtotal'))
+        .order_by()
+    )
+    _sumar(
+        VentaProductoMensual, origen,
+        {(v['mes'], v.get('factura__sucursal_id'), v['producto_id']): v for v in ventas},
+        ('unidades', 'subtotal'),
+    )
+
+
+def _sumar(modelo, origen, filas, campos):
+    """Suma `filas` {clave: valores} a las filas existentes del resumen o crea las que faltan."""
+    if not filas:
+        return
+    con_producto = modelo is VentaProductoMensual
+    existentes = modelo.objects.select_for_update().filter(origen=origen, mes__in={clave[0] for clave in filas})
+    if con_producto:
+        existentes = existentes.filter(producto_id__in={clave[2] for clave in filas})
+    por_clave = {
+        (fila.mes, fila.sucursal_id, fila.producto_id) if con_producto else (fila.mes, fila.sucursal_id): fila
+        for fila in existentes
+    }
+    nuevas = []
+    for clave, valores in filas.items():
+        fila = por_clave.get(clave)
+        if fila is None:
+            extra = {'producto_id': clave[2]} if con_producto else {}
+            nuevas.append(modelo(
+                origen=origen, mes=clave[0], sucursal_id=clave[1], **extra,
+                **{campo: valores[campo] or 0 for campo in campos},
+            ))
+            continue
+        for campo in campos:
+            setattr(fila, campo, getattr(fila, campo) + (valores[campo] or 0))
+    modelo.objects.bulk_update([f for f in por_clave.values() if f.pk], campos, batch_size=1000)
+    modelo.objects.bulk_create(nuevas, batch_size=1000)
+
+
+def _filtrar(queryset, origen, desde, hasta, sucursal_id):
+    queryset = queryset.filter(origen=origen)
+    if desde is not None:
+        queryset = queryset.filter(mes__gte=desde)
+    if hasta is not None:
+        queryset = queryset.filter(mes__lt=hasta)
+    if sucursal_id is not None:
+        queryset = queryset.filter(sucursal_id=sucursal_id)
+    return queryset
+
+
+def totales(origen, desde=None, hasta=None, sucursal_id=None):
+    """Totales archivados {'total', 'subtotal', 'igv', 'cantidad'} de los meses en [desde, hasta)."""
+    fila = _filtrar(FacturacionMensual.objects, origen, desde, hasta, sucursal_id).aggregate(
+        total=Sum('total'), subtotal=Sum('subtotal'), igv=Sum('igv'), cantidad=Sum('facturas'),
+    )
+    return {
+        'total': fila['total'] or CERO,
+        'subtotal': fila['subtotal'] or CERO,
+        'igv': fila['igv'] or CERO,
+        'cantidad': fila['cantidad'] or 0,
+    }
+
+
+def ventas_por_producto(origen, desde=None, hasta=None, sucursal_id=None):
+    """{producto_id: (unidades, subtotal)} archivados de los meses en [desde, hasta)."""
+    return {
+        fila['producto_id']: (fila['unidades'], fila['importe'])
+        for fila in (
+            _filtrar(VentaProductoMensual.objects, origen, desde, hasta, sucursal_id)
+            .values('producto_id')
+            .annotate(unidades=Sum('unidades'), importe=Sum('subtotal'))
+            .order_by()
+        )
+    }
+
+
+def ventas_por_proveedor(origen, desde=None, hasta=None, sucursal_id=None):
+    """{proveedor_id: importe} archivado de los meses en [desde, hasta), según el proveedor actual del producto."""
+    return dict(
+        _filtrar(VentaProductoMensual.objects, origen, desde, hasta, sucursal_id)
+        .values_list('producto__proveedor')
+        .annotate(importe=Sum('subtotal'))
+        .order_by()
+    )
+
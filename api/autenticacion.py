@@ -0,0 +1,150 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import Clientes
+
+
+class CacheUsuarios:
+    """Caché LRU en memoria del proceso, con expiración, de usuarios autenticados."""
+
+    def __init__(self, ttl, maximo):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, user_id):
+        with self._lock:
+            entrada = self._datos.get(user_id)
+            if entrada is None:
+                return None
+            expira, user = entrada
+            if expira < time.monotonic():
+                del self._datos[user_id]
+                return None
+            self._datos.move_to_end(user_id)
+        # Copia superficial: una vista no debe alterar la instancia compartida
+        return copy.copy(user)
+
+    def guardar(self, user_id, user):
+        with self._lock:
+            self._datos[user_id] = (time.monotonic() + self.ttl, user)
+            self._datos.move_to_end(user_id)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, user_id):
+        with self._lock:
+            self._datos.pop(user_id, None)
+
+
+cache_usuarios = CacheUsuarios(
+    ttl=getattr(settings, 'AUTH_CACHE_USUARIOS_TTL', 60),
+    maximo=getattr(settings, 'AUTH_CACHE_USUARIOS_MAXIMO', 10000),
+)
+
+
+def claims_de_usuario(user):
+    try:
+        cliente_id = user.clientes.id
+    except Clientes.DoesNotExist:
+        cliente_id = None
+    return {
+        'is_superuser': user.is_superuser,
+        'is_staff': user.is_staff,
+        'cliente_id': cliente_id,
+    }
+
+
+class TokenConClaimsSerializer(TokenObtainPairSerializer):
+    """
+    Incluye en el token datos del usuario para el cliente (p. ej. mostrar el menú
+    de administración). Son solo indicativos: los permisos se verifican siempre
+    con `request.user`, y el refresh los recalcula desde la BD.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim, valor in claims_de_usuario(user).items():
+            token[claim] = valor
+        return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que resuelve el usuario desde la caché del proceso, por lo
+    que las peticiones autenticadas no consultan la tabla de usuarios mientras la
+    entrada esté vigente. El usuario se carga junto con su cliente.
+    """
+
+    def _usuario_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+    def _verificar(self, user, validated_token):
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
+
+    def _consulta(self, user_id):
+        return User.objects.select_related('clientes').filter(**{api_settings.USER_ID_FIELD: user_id})
+
+    def get_user(self, validated_token):
+        user_id = self._usuario_id(validated_token)
+        user = cache_usuarios.obtener(user_id)
+        if user is None:
+            try:
+                user = self._consulta(user_id).get()
+            except User.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            cache_usuarios.guardar(user_id, user)
+        return self._verificar(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """authenticate() para vistas async: solo consulta la BD si el usuario no está en caché."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        user_id = self._usuario_id(validated_token)
+        user = cache_usuarios.obtener(user_id)
+        if user is None:
+            try:
+                user = await self._consulta(user_id).aget()
+            except User.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            cache_usuarios.guardar(user_id, user)
+        return self._verificar(user, validated_token), validated_token
+
+
+@receiver([post_save, post_delete], sender=User)
+def _invalidar_usuario(sender, instance, **kwargs):
+    cache_usuarios.invalidar(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+@receiver([post_save, post_delete], sender=Clientes)
+def _invalidar_cliente(sender, instance, **kwargs):
+    cache_usuarios.invalidar(instance.user_id)
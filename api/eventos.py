@@ -0,0 +1,219 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max, Q
+
+from .models import EventoInventario, Producto, StockSucursal
+
+LOTE = 500
+RECONEXION_MS = 3000
+# Un evento con id menor puede confirmarse después de uno mayor: los ids salteados se
+# siguen consultando estos segundos antes de darlos por revertidos
+ESPERA_HUECOS = 300
+
+
+def configuracion():
+    config = getattr(settings, 'EVENTOS', {})
+    return config.get('INTERVALO_SONDEO', 2), config.get('LATIDO', 15)
+
+
+class _SuscriptorAsync:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=LOTE)
+
+    def _poner(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            pass  # El flujo lo recupera de la tabla en el siguiente sondeo
+
+    def entregar(self, evento):
+        self.loop.call_soon_threadsafe(self._poner, evento)
+
+
+class _SuscriptorSync:
+    def __init__(self):
+        self.cola = queue.Queue(maxsize=LOTE)
+
+    def entregar(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except queue.Full:
+            pass
+
+
+class Canal:
+    """Pub/sub en memoria del proceso: despierta al instante los flujos del mismo worker."""
+
+    def __init__(self):
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self, asincrono=True):
+        suscriptor = _SuscriptorAsync() if asincrono else _SuscriptorSync()
+        with self._lock:
+            self._suscriptores.add(suscriptor)
+        return suscriptor
+
+    def cancelar(self, suscriptor):
+        with self._lock:
+            self._suscriptores.discard(suscriptor)
+
+    def publicar(self, evento):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for suscriptor in suscriptores:
+            suscriptor.entregar(evento)
+
+
+canal = Canal()
+
+
+def publicar(tipo, datos):
+    """
+    Registra el evento en la misma transacción que el cambio que describe y, al
+    confirmarse, lo entrega a los flujos del proceso. Los demás workers lo leen
+    de la tabla.
+    """
+    evento = EventoInventario.objects.create(tipo=tipo, datos=datos)
+    mensaje = {'id': evento.id, 'tipo': tipo, 'datos': datos}
+    transaction.on_commit(lambda: canal.publicar(mensaje))
+    return evento
+
+
+def publicar_stock(deltas, sucursal_id=None):
+    """
+    Stock resultante y variación de cada producto: {"productos": [[id, stock, delta], ...]}.
+    Los cambios de un local llevan además "sucursal" y su stock es el del local.
+    """
+    if not deltas:
+        return None
+    if sucursal_id is None:
+        stocks = dict(Producto.objects.filter(pk__in=deltas.keys()).values_list('pk', 'stock'))
+    else:
+        stocks = dict(
+            StockSucursal.objects
+            .filter(sucursal_id=sucursal_id, producto_id__in=deltas.keys())
+            .values_list('producto_id', 'stock')
+        )
+    datos = {'productos': [[pk, stocks[pk], delta] for pk, delta in deltas.items() if pk in stocks]}
+    if sucursal_id is not None:
+        datos['sucursal'] = sucursal_id
+    return publicar('stock', datos)
+
+
+def publicar_ventas(origen, facturas):
+    """Ventas confirmadas: {"origen": ..., "facturas": [[id, total], ...]}."""
+    return publicar('venta', {
+        'origen': origen,
+        'facturas': [[factura.pk, factura.total] for factura in facturas],
+    })
+
+
+def ultimo_id():
+    return EventoInventario.objects.aggregate(m=Max('id'))['m'] or 0
+
+
+def formatear(evento):
+    datos = json.dumps(evento['datos'], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+class LectorEventos:
+    """
+    Posición de un flujo en la tabla de eventos. Entrega cada id una sola vez,
+    llegue por el canal en memoria o por el sondeo de la tabla. Un id salteado es
+    una transacción que aún no confirma (o que se revirtió): se vuelve a buscar en
+    cada sondeo hasta ESPERA_HUECOS, de modo que un evento confirmado tarde
+    también se entrega.
+    """
+
+    def __init__(self, desde):
+        self.tope = desde
+        self.huecos = {}  # id salteado -> momento en que se detectó
+
+    def consulta(self):
+        filtro = Q(id__gt=self.tope)
+        if self.huecos:
+            filtro |= Q(id__in=list(self.huecos))
+        return EventoInventario.objects.filter(filtro).order_by('id').values('id', 'tipo', 'datos')[:LOTE]
+
+    def nuevos(self, filas):
+        pendientes = [fila for fila in filas if self.recibido(fila)]
+        limite = time.monotonic() - ESPERA_HUECOS
+        self.huecos = {pk: detectado for pk, detectado in self.huecos.items() if detectado > limite}
+        return pendientes
+
+    def recibido(self, evento):
+        pk = evento['id']
+        if pk > self.tope:
+            # Solo los últimos LOTE ids: los más antiguos ya se purgaron o se revirtieron
+            self.huecos.update(dict.fromkeys(range(max(self.tope + 1, pk - LOTE), pk), time.monotonic()))
+            self.tope = pk
+            return True
+        return self.huecos.pop(pk, None) is not None
+
+
+async def flujo_async(desde=None):
+    """Mensajes SSE para un servidor ASGI: no ocupa un worker mientras espera."""
+    intervalo, latido = configuracion()
+    suscriptor = canal.suscribir()
+    try:
+        # Suscrito antes de fijar la posición para no perder lo publicado entre ambos pasos
+        lector = LectorEventos(desde if desde is not None else await sync_to_async(ultimo_id)())
+        yield f"retry: {RECONEXION_MS}\n\n"
+        proximo_sondeo = ultimo_envio = time.monotonic()
+        while True:
+            if time.monotonic() >= proximo_sondeo:
+                for evento in lector.nuevos([fila async for fila in lector.consulta()]):
+                    yield formatear(evento)
+                    ultimo_envio = time.monotonic()
+                proximo_sondeo = time.monotonic() + intervalo
+            if time.monotonic() - ultimo_envio >= latido:
+                yield ": latido\n\n"
+                ultimo_envio = time.monotonic()
+            try:
+                evento = await asyncio.wait_for(suscriptor.cola.get(), max(proximo_sondeo - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                continue
+            if lector.recibido(evento):
+                yield formatear(evento)
+                ultimo_envio = time.monotonic()
+    finally:
+        canal.cancelar(suscriptor)
+
+
+def flujo(desde=None):
+    """Versión síncrona para WSGI; cada cliente conectado ocupa un hilo del worker."""
+    intervalo, latido = configuracion()
+    suscriptor = canal.suscribir(asincrono=False)
+    try:
+        lector = LectorEventos(desde if desde is not None else ultimo_id())
+        yield f"retry: {RECONEXION_MS}\n\n"
+        proximo_sondeo = ultimo_envio = time.monotonic()
+        while True:
+            if time.monotonic() >= proximo_sondeo:
+                for evento in lector.nuevos(lector.consulta()):
+                    yield formatear(evento)
+                    ultimo_envio = time.monotonic()
+                proximo_sondeo = time.monotonic() + intervalo
+            if time.monotonic() - ultimo_envio >= latido:
+                yield ": latido\n\n"
+                ultimo_envio = time.monotonic()
+            try:
+                evento = suscriptor.cola.get(timeout=max(proximo_sondeo - time.monotonic(), 0))
+            except queue.Empty:
+                continue
+            if lector.recibido(evento):
+                yield formatear(evento)
+                ultimo_envio = time.monotonic()
+    finally:
+        canal.cancelar(suscriptor)
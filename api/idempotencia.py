@@ -0,0 +1,119 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import ClaveIdempotencia
+
+CABECERA = 'Idempotency-Key'
+
+
+def _configuracion():
+    config = getattr(settings, 'IDEMPOTENCIA', {})
+    return timedelta(hours=config.get('TTL_HORAS', 24)), timedelta(seconds=config.get('BLOQUEO_SEGUNDOS', 60))
+
+
+def _huella(datos):
+    contenido = json.dumps(datos, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def _reservar(clave, ruta, usuario_id, huella):
+    """
+    Registra la clave como EN_CURSO. Devuelve (registro, propio): `propio` es False
+    si ya existía una clave vigente, que se devuelve para responder en su lugar.
+    """
+    ttl, bloqueo = _configuracion()
+    ahora = timezone.now()
+    valores = {
+        'huella': huella, 'estado': 'EN_CURSO',
+        'codigo': None, 'respuesta': None, 'creada': ahora, 'expira': ahora + ttl,
+    }
+    filtro = {'clave': clave, 'ruta': ruta, 'usuario_id': usuario_id}
+    try:
+        with transaction.atomic():
+            return ClaveIdempotencia.objects.create(**filtro, **valores), True
+    except IntegrityError:
+        pass
+
+    # Se reutiliza la fila si expiró o si quedó EN_CURSO tras una caída del proceso.
+    # La petición en curso mantiene bloqueada su fila (ver idempotente): si sigue
+    # bloqueada no se recupera aunque haya pasado el tiempo de bloqueo.
+    with transaction.atomic():
+        recuperada = (
+            ClaveIdempotencia.objects
+            .select_for_update(skip_locked=True)
+            .filter(**filtro)
+            .filter(Q(expira__lt=ahora) | Q(estado='EN_CURSO', creada__lt=ahora - bloqueo))
+            .first()
+        )
+        if recuperada is not None:
+            ClaveIdempotencia.objects.filter(pk=recuperada.pk).update(**valores)
+    registro = ClaveIdempotencia.objects.get(**filtro)
+    return registro, recuperada is not None
+
+
+def idempotente(metodo):
+    """
+    Hace idempotente una acción de creación de un ViewSet cuando el cliente envía
+    la cabecera Idempotency-Key: los reintentos con la misma clave devuelven la
+    respuesta registrada sin volver a ejecutar la acción.
+    """
+    @wraps(metodo)
+    def envoltura(self, request, *args, **kwargs):
+        clave = request.headers.get(CABECERA)
+        if not clave:
+            return metodo(self, request, *args, **kwargs)
+        if len(clave) > 255:
+            return Response({"error": f"{CABECERA} demasiado larga."}, status=status.HTTP_400_BAD_REQUEST)
+
+        usuario_id = request.user.pk if request.user.is_authenticated else None
+        huella = _huella(request.data)
+        registro, propio = _reservar(clave, request.path, usuario_id, huella)
+
+        if not propio:
+            if registro.huella != huella:
+                return Response(
+                    {"error": f"{CABECERA} ya fue usada con otra petición."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if registro.estado == 'EN_CURSO':
+                return Response(
+                    {"error": "Hay una petición en curso con la misma clave."},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={'Retry-After': '1'},
+                )
+            return Response(registro.respuesta, status=registro.codigo, headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            with transaction.atomic():
+                # La fila queda bloqueada mientras se ejecuta la acción y se marca
+                # COMPLETADA en la misma transacción que la venta
+                ClaveIdempotencia.objects.select_for_update().get(pk=registro.pk)
+                respuesta = metodo(self, request, *args, **kwargs)
+                if respuesta.status_code < 500:
+                    ClaveIdempotencia.objects.filter(pk=registro.pk).update(
+                        estado='COMPLETADA',
+                        codigo=respuesta.status_code,
+                        # Mismo JSON que produce el renderer, para que la repetición sea idéntica
+                        respuesta=json.loads(json.dumps(respuesta.data, cls=JSONEncoder)),
+                    )
+        except Exception:
+            registro.delete()
+            raise
+
+        if respuesta.status_code >= 500:
+            # Los errores del servidor no se registran: el reintento vuelve a ejecutarse
+            registro.delete()
+        return respuesta
+
+    return envoltura
@@ -0,0 +1,440 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Max, Min, OuterRef, Q, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, Lag
+from django.utils import timezone
+
+from . import sentencias
+from .eventos import publicar_stock
+from .models import CorteStock, Lote, MarcaProceso, MovimientoStock, Producto, StockSucursal, TransferenciaStock
+
+MARCA_CORTES = 'cortes_stock'
+# Tiempo durante el que se siguen buscando movimientos confirmados tarde en un hueco de ids
+RETENCION_HUECOS = timedelta(days=7)
+
+
+class StockInsuficiente(Exception):
+    pass
+
+
+def registrar_movimientos(movimientos, actualizar_stock=True):
+    """
+    Inserta los movimientos en bloque y aplica su efecto neto con un único UPDATE
+    por partición: Producto.stock para el almacén central y StockSucursal para
+    cada local. Lanza StockInsuficiente si algún stock quedaría negativo.
+    """
+    movimientos = [m for m in movimientos if m.cantidad]
+    if not movimientos:
+        return []
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    deltas_lote = defaultdict(int)
+    for movimiento in movimientos:
+        deltas[movimiento.sucursal_id][movimiento.producto_id] += movimiento.cantidad
+        if movimiento.lote_id:
+            deltas_lote[movimiento.lote_id] += movimiento.cantidad
+
+    with transaction.atomic():
+        creados = MovimientoStock.objects.bulk_create(movimientos)
+        if actualizar_stock:
+            for sucursal_id, deltas_sucursal in deltas.items():
+                if sucursal_id is None:
+                    _aplicar_deltas(Producto.objects, 'stock', deltas_sucursal, 'deltas_stock', actualizado=timezone.now())
+                else:
+                    _aplicar_deltas_sucursal(sucursal_id, deltas_sucursal)
+            _aplicar_deltas(Lote.objects, 'cantidad', deltas_lote, 'deltas_lote')
+            for sucursal_id, deltas_sucursal in deltas.items():
+                publicar_stock({pk: delta for pk, delta in deltas_sucursal.items() if delta}, sucursal_id)
+    return creados
+
+
+def _aplicar_deltas(manager, campo, deltas, sentencia, **extra):
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    try:
+        # Savepoint propio: el CHECK (campo >= 0) de la BD hace de control de stock
+        with transaction.atomic():
+            if sentencias.habilitadas():
+                sentencias.aplicar_deltas(sentencia, deltas, *extra.values())
+                return
+            incremento = Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            manager.filter(pk__in=deltas.keys()).update(**{campo: F(campo) + incremento}, **extra)
+    except IntegrityError:
+        raise StockInsuficiente("Stock insuficiente para completar la operación.")
+
+
+def _aplicar_deltas_sucursal(sucursal_id, deltas):
+    """Como _aplicar_deltas, sobre las filas de StockSucursal de un solo local."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    filas = StockSucursal.objects.filter(sucursal_id=sucursal_id)
+    try:
+        with transaction.atomic():
+            # El local recibe por primera vez el producto: fila en cero y luego el delta
+            existentes = set(filas.filter(producto_id__in=deltas.keys()).values_list('producto_id', flat=True))
+            if len(existentes) < len(deltas):
+                StockSucursal.objects.bulk_create(
+                    [StockSucursal(sucursal_id=sucursal_id, producto_id=pk) for pk in deltas.keys() - existentes],
+                    ignore_conflicts=True,
+                )
+            if sentencias.habilitadas():
+                sentencias.aplicar_deltas('deltas_stock_sucursal', deltas, sucursal_id, timezone.now())
+                return
+            incremento = Case(
+                *[When(producto_id=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            filas.filter(producto_id__in=deltas.keys()).update(stock=F('stock') + incremento, actualizado=timezone.now())
+    except IntegrityError:
+        raise StockInsuficiente("Stock insuficiente en la sucursal para completar la operación.")
+
+
+def ingresar_pedidos(pedidos):
+    """Crea un lote por cada pedido recibido y registra su entrada en el kardex."""
+    pedidos = [p for p in pedidos if p.producto_id and p.cantidad]
+    if not pedidos:
+        return []
+
+    lotes = Lote.objects.bulk_create([
+        Lote(
+            producto_id=pedido.producto_id,
+            pedido=pedido,
+            codigo=pedido.lote or f"PED-{pedido.pk}",
+            fecha_vencimiento=pedido.fecha_vencimiento or pedido.producto.fecha_vencimiento,
+            cantidad_inicial=pedido.cantidad,
+            sucursal_id=pedido.sucursal_id,
+        )
+        for pedido in pedidos
+    ])
+    return registrar_movimientos([
+        MovimientoStock(
+            producto_id=pedido.producto_id, cantidad=pedido.cantidad, motivo='PEDIDO',
+            pedido=pedido, lote=lote, sucursal_id=pedido.sucursal_id,
+        )
+        for pedido, lote in zip(pedidos, lotes)
+    ])
+
+
+class LotesFefo(defaultdict):
+    """
+    Lotes vigentes con existencias por producto, en orden FEFO, y las unidades
+    sin lote de cada producto. Las unidades de lotes vencidos siguen en el stock
+    pero no se venden ni se trasladan: no cuentan como sin lote.
+    """
+
+    def __init__(self):
+        super().__init__(list)
+        self.sin_lote = {}
+
+    def disponible(self, producto_id):
+        """Unidades que se pueden sacar del producto: lotes vigentes más stock sin lote."""
+        return self.sin_lote.get(producto_id, 0) + sum(lote.cantidad for lote in self.get(producto_id, ()))
+
+
+def lotes_fefo(producto_ids, sucursal_id=None):
+    """
+    Bloquea el stock de los productos en el local (o en el almacén central si
+    sucursal_id es None) y sus lotes con existencias, y devuelve un LotesFefo.
+    """
+    producto_ids = sorted(set(producto_ids))
+    if sucursal_id is None:
+        stocks = Producto.objects.select_for_update().filter(pk__in=producto_ids).order_by('pk').values_list('pk', 'stock')
+    else:
+        stocks = (
+            StockSucursal.objects.select_for_update()
+            .filter(sucursal_id=sucursal_id, producto_id__in=producto_ids)
+            .order_by('producto_id')
+            .values_list('producto_id', 'stock')
+        )
+    stocks = dict(stocks)
+
+    hoy = timezone.localdate()
+    lotes = LotesFefo()
+    en_lotes = defaultdict(int)
+    con_existencias = (
+        Lote.objects
+        .select_for_update()
+        .filter(sucursal_id=sucursal_id, producto_id__in=producto_ids, cantidad__gt=0)
+        .order_by('producto_id', 'fecha_vencimiento', 'id')
+    )
+    for lote in con_existencias:
+        en_lotes[lote.producto_id] += lote.cantidad
+        if lote.fecha_vencimiento >= hoy:
+            lotes[lote.producto_id].append(lote)
+    lotes.sin_lote = {pk: stocks.get(pk, 0) - en_lotes[pk] for pk in producto_ids}
+    return lotes
+
+
+def repartir_fefo(lotes, lineas, motivo, **referencia):
+    """
+    Reparte las salidas `lineas` [(producto_id, cantidad), ...] entre los `lotes`
+    de lotes_fefo(), primero el de vencimiento más próximo. Lo que no cubren los
+    lotes sale del stock sin lote; si no alcanza, lanza StockInsuficiente.
+    Descuenta en memoria lo asignado a cada lote y al stock sin lote.
+    """
+    movimientos = []
+    for producto_id, cantidad in lineas:
+        pendiente = cantidad
+        for lote in lotes.get(producto_id, ()):
+            if not pendiente:
+                break
+            tomado = min(lote.cantidad, pendiente)
+            if not tomado:
+                continue
+            lote.cantidad -= tomado  # Solo en memoria, para las siguientes líneas
+            pendiente -= tomado
+            movimientos.append(MovimientoStock(
+                producto_id=producto_id, cantidad=-tomado, motivo=motivo, lote=lote, **referencia
+            ))
+        if pendiente:
+            if pendiente > lotes.sin_lote.get(producto_id, 0):
+                raise StockInsuficiente(
+                    f"Stock insuficiente para el producto {producto_id}: las unidades de lotes vencidos no se pueden vender."
+                )
+            lotes.sin_lote[producto_id] -= pendiente
+            movimientos.append(MovimientoStock(
+                producto_id=producto_id, cantidad=-pendiente, motivo=motivo, **referencia
+            ))
+    return movimientos
+
+
+def movimientos_fefo(lineas, motivo, **referencia):
+    """
+    Reparte las salidas `lineas` [(producto_id, cantidad), ...] entre los lotes
+    vigentes, primero el de vencimiento más próximo (FEFO). Lo que no cubren los
+    lotes sale del stock sin lote, nunca de lotes vencidos. Con `sucursal_id` en
+    la referencia se usan los lotes de ese local. Devuelve los movimientos sin guardar.
+    """
+    lotes = lotes_fefo((producto_id for producto_id, _ in lineas), referencia.get('sucursal_id'))
+    return repartir_fefo(lotes, lineas, motivo, **referencia)
+
+
+def transferir_stock(origen_id, destino_id, lineas, usuario=None, nota=''):
+    """
+    Traslada las `lineas` [(producto_id, cantidad), ...] de un local a otro (None
+    es el almacén central). Las salidas siguen FEFO y cada lote tomado se replica
+    en el destino con su código y vencimiento. Devuelve la TransferenciaStock.
+    """
+    if origen_id == destino_id:
+        raise ValueError("El origen y el destino deben ser distintos.")
+    with transaction.atomic():
+        transferencia = TransferenciaStock.objects.create(
+            origen_id=origen_id, destino_id=destino_id, usuario=usuario, nota=nota
+        )
+        salidas = movimientos_fefo(lineas, 'TRANSFERENCIA', transferencia=transferencia, sucursal_id=origen_id)
+        con_lote = [m for m in salidas if m.lote_id]
+        copias = Lote.objects.bulk_create([
+            Lote(
+                producto_id=m.producto_id,
+                pedido_id=m.lote.pedido_id,
+                codigo=m.lote.codigo,
+                fecha_vencimiento=m.lote.fecha_vencimiento,
+                cantidad_inicial=-m.cantidad,
+                sucursal_id=destino_id,
+            )
+            for m in con_lote
+        ])
+        lote_destino = {id(m): copia for m, copia in zip(con_lote, copias)}
+        entradas = [
+            MovimientoStock(
+                producto_id=m.producto_id, cantidad=-m.cantidad, motivo='TRANSFERENCIA',
+                transferencia=transferencia, sucursal_id=destino_id, lote=lote_destino.get(id(m)),
+            )
+            for m in salidas
+        ]
+        registrar_movimientos(salidas + entradas)
+    return transferencia
+
+
+def stock_sucursal(sucursal_id, producto_ids):
+    """{producto_id: stock} del local (o de Producto.stock si sucursal_id es None)."""
+    producto_ids = set(producto_ids)
+    if sucursal_id is None:
+        return dict(Producto.objects.filter(pk__in=producto_ids).values_list('pk', 'stock'))
+    return dict(
+        StockSucursal.objects
+        .filter(sucursal_id=sucursal_id, producto_id__in=producto_ids)
+        .values_list('producto_id', 'stock')
+    )
+
+
+def lotes_por_vencer(dias):
+    """Lotes con existencias que vencen en los próximos `dias` días."""
+    hoy = timezone.localdate()
+    return (
+        Lote.objects
+        .filter(cantidad__gt=0, fecha_vencimiento__range=(hoy, hoy + timedelta(days=dias)))
+        .select_related('producto')
+        .order_by('fecha_vencimiento', 'id')
+    )
+
+
+def _ultimo_corte(producto_ref, campo):
+    return Subquery(
+        CorteStock.objects
+        .filter(producto=producto_ref)
+        .order_by('-ultimo_movimiento', '-id')
+        .values(campo)[:1]
+    )
+
+
+def stock_a_fecha(producto_id, fecha, sucursal_id=None):
+    """
+    Reconstruye el stock de un producto a una fecha. En el almacén central parte
+    del último corte previo; los locales no tienen cortes y suman su kardex.
+    """
+    base, desde_id = 0, 0
+    if sucursal_id is None:
+        corte = (
+            CorteStock.objects
+            .filter(producto_id=producto_id, fecha__lte=fecha)
+            .order_by('-ultimo_movimiento', '-id')
+            .first()
+        )
+        if corte:
+            base, desde_id = corte.stock, corte.ultimo_movimiento
+    movido = MovimientoStock.objects.filter(
+        producto_id=producto_id, sucursal_id=sucursal_id, id__gt=desde_id, fecha__lte=fecha
+    ).aggregate(total=Sum('cantidad'))['total'] or 0
+    return base + movido
+
+
+def saldos_kardex(producto_ids=None):
+    """Stock central según el kardex (último corte + movimientos posteriores) por producto."""
+    productos = Producto.objects.all()
+    if producto_ids is not None:
+        productos = productos.filter(pk__in=producto_ids)
+
+    movido = (
+        MovimientoStock.objects
+        .filter(
+            producto=OuterRef('pk'),
+            sucursal__isnull=True,
+            id__gt=Coalesce(_ultimo_corte(OuterRef('producto'), 'ultimo_movimiento'), Value(0)),
+        )
+        .values('producto')
+        .annotate(total=Sum('cantidad'))
+        .values('total')
+    )
+    filas = productos.annotate(
+        base=Coalesce(_ultimo_corte(OuterRef('pk'), 'stock'), Value(0)),
+        movido=Coalesce(Subquery(movido), Value(0)),
+    ).values_list('pk', 'stock', 'base', 'movido')
+    return {pk: (stock, base + movido) for pk, stock, base, movido in filas}
+
+
+def _huecos(desde, hasta):
+    """Rangos [a, b] de ids sin movimiento visible dentro de (desde, hasta]."""
+    ids = MovimientoStock.objects.filter(id__gt=desde, id__lte=hasta)
+    saltos = (
+        ids.annotate(anterior=Window(Lag('id'), order_by=F('id').asc()))
+        .filter(anterior__isnull=False, id__gt=F('anterior') + 1)
+        .values_list('anterior', 'id')
+    )
+    huecos = sorted([anterior + 1, siguiente - 1] for anterior, siguiente in saltos)
+    primero = ids.aggregate(m=Min('id'))['m']
+    if primero and primero > desde + 1:
+        huecos.insert(0, [desde + 1, primero - 1])
+    return huecos
+
+
+def _restar(hueco, ids):
+    """Parte el rango [a, b] quitando los ids ya visibles."""
+    desde, hasta = hueco
+    partes = []
+    for pk in sorted(ids):
+        if pk > desde:
+            partes.append([desde, pk - 1])
+        desde = pk + 1
+    if desde <= hasta:
+        partes.append([desde, hasta])
+    return partes
+
+
+def generar_cortes():
+    """
+    Crea un corte por cada producto con movimientos del almacén central desde el
+    corte anterior. Devuelve la cantidad de cortes creados.
+
+    El corte se acota por id y no por reloj: un hueco en la secuencia de ids es una
+    transacción que aún no confirma o que se revirtió. Un hueco nuevo detiene el
+    corte justo antes; en la corrida siguiente se cruza y queda pendiente, y los
+    movimientos que aparezcan después dentro de él se suman al siguiente corte.
+    """
+    with transaction.atomic():
+        marca_proceso, _ = MarcaProceso.objects.select_for_update().get_or_create(nombre=MARCA_CORTES)
+        ahora = timezone.now()
+        marca = CorteStock.objects.aggregate(m=Max('ultimo_movimiento'))['m'] or 0
+        maximo = MovimientoStock.objects.aggregate(m=Max('id'))['m'] or 0
+        anteriores = marca_proceso.datos.get('huecos', [])
+
+        # Huecos ya cruzados: lo que se confirmó tarde entra en este corte
+        pendientes, tardios = [], []
+        for desde, hasta, visto in anteriores:
+            if hasta > marca:
+                continue
+            encontrados = list(MovimientoStock.objects.filter(id__range=(desde, hasta)).values_list('id', flat=True))
+            tardios += encontrados
+            if datetime.fromisoformat(visto) > ahora - RETENCION_HUECOS:
+                pendientes += [[a, b, visto] for a, b in _restar([desde, hasta], encontrados)]
+
+        # Huecos por delante de la marca: solo se cruzan los vistos en una corrida anterior
+        tope, siguientes = maximo, []
+        for desde, hasta in _huecos(marca, maximo):
+            previo = [v for a, b, v in anteriores if a <= desde and hasta <= b and b > marca]
+            visto = min(previo) if previo else ahora.isoformat()
+            if not previo and desde <= tope:
+                tope = desde - 1
+            (pendientes if hasta <= tope else siguientes).append([desde, hasta, visto])
+
+        marca_proceso.datos = {'huecos': pendientes + siguientes}
+        marca_proceso.save(update_fields=['datos', 'actualizado'])
+        if tope <= marca and not tardios:
+            return 0
+
+        deltas = dict(
+            MovimientoStock.objects
+            .filter(Q(id__gt=marca, id__lte=tope) | Q(id__in=tardios), sucursal__isnull=True)
+            .values('producto')
+            .annotate(total=Sum('cantidad'))
+            .values_list('producto', 'total')
+        )
+        previos = dict(
+            Producto.objects
+            .filter(pk__in=deltas.keys())
+            .annotate(stock_corte=Coalesce(_ultimo_corte(OuterRef('pk'), 'stock'), Value(0)))
+            .values_list('pk', 'stock_corte')
+        )
+        cortes = [
+            CorteStock(producto_id=pk, fecha=ahora, ultimo_movimiento=max(tope, marca), stock=previos.get(pk, 0) + delta)
+            for pk, delta in deltas.items()
+        ]
+        CorteStock.objects.bulk_create(cortes, batch_size=1000)
+        return len(cortes)
+
+
+def conciliar_stock(corregir=False):
+    """
+    Compara Producto.stock con el kardex. Con corregir=True registra un AJUSTE
+    por la diferencia para que el kardex vuelva a cuadrar con el snapshot.
+    """
+    diferencias = {
+        pk: stock - saldo
+        for pk, (stock, saldo) in saldos_kardex().items()
+        if stock != saldo
+    }
+    if corregir and diferencias:
+        registrar_movimientos(
+            [MovimientoStock(producto_id=pk, cantidad=delta, motivo='AJUSTE') for pk, delta in diferencias.items()],
+            actualizar_stock=False,
+        )
+    return diferencias
@@ -0,0 +1,55 @@
+"""
+Lecturas rápidas para endpoints de alto volumen.
+
+Proyectan con values() solo las columnas que se devuelven (con los nombres de
+categoría y proveedor en el mismo JOIN) y arman los diccionarios directamente,
+sin instanciar modelos ni recorrer los campos del serializer. La salida es la
+misma que la de ProductoSerializer con `request` en el contexto.
+"""
+from decimal import Decimal
+
+from .models import Producto
+
+CENTIMO = Decimal('0.01')
+
+CAMPOS_PRODUCTO = (
+    'id', 'nombre', 'descripcion', 'precio_sin_igv', 'precio', 'stock', 'fecha_vencimiento',
+    'presentacion', 'categoria', 'categoria__nombre', 'proveedor', 'proveedor__nombre', 'imagen',
+)
+
+
+def _decimal(valor):
+    # Igual que DecimalField de DRF: dos decimales, sin notación científica
+    return f"{valor.quantize(CENTIMO):f}" if valor is not None else None
+
+
+def productos(queryset=None, request=None):
+    """Los productos de `queryset` como los serializa ProductoSerializer, en una consulta."""
+    if queryset is None:
+        queryset = Producto.objects.all()
+    almacenamiento = Producto._meta.get_field('imagen').storage
+    resultado = []
+    for (pk, nombre, descripcion, precio_sin_igv, precio, stock, vencimiento, presentacion,
+         categoria, categoria_nombre, proveedor, proveedor_nombre, imagen) in queryset.values_list(*CAMPOS_PRODUCTO):
+        url = None
+        if imagen:
+            url = almacenamiento.url(imagen)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+        resultado.append({
+            'id': pk,
+            'nombre': nombre,
+            'descripcion': descripcion,
+            'precio_sin_igv': _decimal(precio_sin_igv),
+            'precio': _decimal(precio),
+            'stock': stock,
+            'fecha_vencimiento': vencimiento.isoformat() if vencimiento else None,
+            'presentacion': presentacion,
+            'categoria': categoria,
+            'categoria_nombre': categoria_nombre,
+            'proveedor': proveedor,
+            'proveedor_nombre': proveedor_nombre,
+            'imagen': url,
+            'imagen_url': url if request is not None else None,
+        })
+    return resultado
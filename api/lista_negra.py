@@ -0,0 +1,156 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .autenticacion import claims_de_usuario
+
+
+class FiltroBloom:
+    """Conjunto probabilístico: sin falsos negativos, con falsos positivos acotados."""
+
+    def __init__(self, capacidad, tasa_error):
+        capacidad = max(capacidad, 1)
+        self.bits = max(int(-capacidad * math.log(tasa_error) / (math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.bits / capacidad * math.log(2))), 1)
+        self._arreglo = bytearray((self.bits + 7) // 8)
+
+    def _posiciones(self, valor):
+        digest = hashlib.blake2b(valor.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def agregar(self, valor):
+        for posicion in self._posiciones(valor):
+            self._arreglo[posicion >> 3] |= 1 << (posicion & 7)
+
+    def __contains__(self, valor):
+        return all(self._arreglo[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(valor))
+
+
+class ListaNegra:
+    """
+    Filtro de Bloom con los jti revocados y vigentes, reconstruido periódicamente
+    desde la BD para descartar los expirados.
+    """
+
+    def __init__(self):
+        self._filtro = None
+        self._construido = 0.0
+        self._lock = threading.Lock()
+
+    def _configuracion(self):
+        return getattr(settings, 'LISTA_NEGRA', {})
+
+    def _construir(self):
+        config = self._configuracion()
+        jtis = list(
+            BlacklistedToken.objects
+            .filter(token__expires_at__gt=timezone.now())
+            .values_list('token__jti', flat=True)
+        )
+        filtro = FiltroBloom(
+            max(config.get('CAPACIDAD', 100000), 2 * len(jtis)),
+            config.get('TASA_ERROR', 0.001),
+        )
+        for jti in jtis:
+            filtro.agregar(jti)
+        return filtro
+
+    def _vigente(self):
+        reconstruir = self._configuracion().get('RECONSTRUIR_SEGUNDOS', 3600)
+        with self._lock:
+            if self._filtro is None or time.monotonic() - self._construido > reconstruir:
+                self._filtro = self._construir()
+                self._construido = time.monotonic()
+            return self._filtro
+
+    def posiblemente_revocado(self, jti):
+        return jti in self._vigente()
+
+    def agregar(self, jti):
+        self._vigente().agregar(jti)
+
+
+lista_negra = ListaNegra()
+
+
+def rotacion_con_lista_negra():
+    return api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION
+
+
+class RefreshTokenConFiltro(RefreshToken):
+    """
+    Refresh token que consulta la tabla de revocados solo cuando el filtro de
+    Bloom indica una posible coincidencia.
+
+    Un negativo del filtro puede deberse a una revocación hecha en otro proceso;
+    en ese caso `blacklist()` falla al insertar el jti por la restricción única de
+    BlacklistedToken, de modo que un token rotado nunca se acepta dos veces.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if rotacion_con_lista_negra() and not lista_negra.posiblemente_revocado(jti):
+            return
+        super().check_blacklist()
+
+    def blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        token, _ = OutstandingToken.objects.get_or_create(
+            jti=jti,
+            defaults={
+                "token": str(self),
+                "expires_at": datetime_from_epoch(self.payload["exp"]),
+            },
+        )
+        try:
+            with transaction.atomic():
+                revocado = BlacklistedToken.objects.create(token=token)
+        except IntegrityError:
+            raise TokenError("Token is blacklisted")
+        lista_negra.agregar(jti)
+        return revocado
+
+
+class TokenRefreshConFiltroSerializer(TokenRefreshSerializer):
+    token_class = RefreshTokenConFiltro
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+
+        # Los claims se recalculan desde la BD: un usuario degradado no conserva
+        # sus permisos anteriores refrescando el token
+        user = (
+            User.objects.select_related('clientes')
+            .filter(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]})
+            .first()
+        )
+        if user is None or not user.is_active:
+            raise AuthenticationFailed("No active account found for the given token.", code="no_active_account")
+        for claim, valor in claims_de_usuario(user).items():
+            refresh[claim] = valor
+
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+
+        return data
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.archivo import archivar_periodo, limite_archivable
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve al archivo las facturas de tienda y de clientes de los meses cerrados "
+        "y acumula sus totales en los resúmenes mensuales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasta', help="Mes YYYY-MM (excluido); por defecto, el límite archivable.")
+        parser.add_argument('--lote', type=int, help="Facturas por transacción.")
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options['hasta']:
+            hasta = parse_date(f"{options['hasta']}-01")
+            if hasta is None:
+                raise CommandError("--hasta debe tener el formato YYYY-MM.")
+        try:
+            archivadas = archivar_periodo(hasta, options['lote'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"{archivadas['tienda']} facturas de tienda y {archivadas['cliente']} de clientes archivadas "
+            f"(límite {limite_archivable():%Y-%m})."
+        ))
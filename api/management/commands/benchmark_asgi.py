@@ -0,0 +1,107 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+SERVIDORES = {
+    'wsgi': ['-m', 'gunicorn', 'farmavida.wsgi:application', '-k', 'sync'],
+    'asgi': ['-m', 'gunicorn', 'farmavida.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Levanta gunicorn con workers sync (WSGI) y con uvicorn (ASGI, vistas async) y "
+        "mide peticiones por segundo y latencias con muchos clientes concurrentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ruta', default='/api/v1/productos/')
+        parser.add_argument('--concurrencia', type=int, default=200)
+        parser.add_argument('--duracion', type=float, default=10.0, help="Segundos de carga por servidor.")
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--puerto', type=int, default=8765)
+        parser.add_argument(
+            '--cliente-lento', type=float, default=0.0,
+            help="Segundos que cada cliente tarda en terminar de enviar su petición.",
+        )
+        parser.add_argument('--token', default='', help="Access token JWT para rutas autenticadas.")
+
+    def handle(self, *args, **options):
+        for nombre, argumentos in SERVIDORES.items():
+            entorno = dict(os.environ, VISTAS_ASYNC='True' if nombre == 'asgi' else 'False')
+            proceso = subprocess.Popen(
+                [sys.executable, *argumentos, '--workers', str(options['workers']),
+                 '--bind', f"127.0.0.1:{options['puerto']}", '--log-level', 'warning'],
+                env=entorno,
+            )
+            try:
+                self._esperar_puerto(options['puerto'])
+                latencias, errores, transcurrido = asyncio.run(self._carga(options))
+            finally:
+                proceso.terminate()
+                proceso.wait()
+            self._informar(nombre, latencias, errores, transcurrido)
+
+    def _esperar_puerto(self, puerto, limite=30):
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            with socket.socket() as s:
+                if s.connect_ex(('127.0.0.1', puerto)) == 0:
+                    return
+            time.sleep(0.2)
+        raise CommandError(f"El servidor no respondió en el puerto {puerto}.")
+
+    async def _carga(self, options):
+        cabeceras = "Host: localhost\r\nConnection: close\r\n"
+        if options['token']:
+            cabeceras += f"Authorization: Bearer {options['token']}\r\n"
+        primera_linea = f"GET {options['ruta']} HTTP/1.1\r\n".encode()
+        resto = (cabeceras + "\r\n").encode()
+
+        latencias = []
+        errores = 0
+        fin = time.monotonic() + options['duracion']
+
+        async def cliente():
+            nonlocal errores
+            while time.monotonic() < fin:
+                inicio = time.perf_counter()
+                try:
+                    lector, escritor = await asyncio.open_connection('127.0.0.1', options['puerto'])
+                    escritor.write(primera_linea)
+                    await escritor.drain()
+                    if options['cliente_lento']:
+                        await asyncio.sleep(options['cliente_lento'])
+                    escritor.write(resto)
+                    await escritor.drain()
+                    respuesta = await lector.read()
+                    escritor.close()
+                    if not respuesta.startswith((b'HTTP/1.1 200', b'HTTP/1.0 200')):
+                        errores += 1
+                        continue
+                except OSError:
+                    errores += 1
+                    continue
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.monotonic()
+        await asyncio.gather(*(cliente() for _ in range(options['concurrencia'])))
+        return latencias, errores, time.monotonic() - inicio
+
+    def _informar(self, nombre, latencias, errores, transcurrido):
+        if not latencias:
+            self.stdout.write(self.style.ERROR(f"{nombre}: sin respuestas correctas ({errores} errores)."))
+            return
+        latencias.sort()
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        self.stdout.write(
+            f"{nombre}: {len(latencias) / transcurrido:8.1f} req/s  "
+            f"p50 {statistics.median(latencias) * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms  "
+            f"errores {errores}"
+        )
@@ -0,0 +1,81 @@
+import re
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api import sentencias
+from api.models import Empleado, Factura, Producto
+
+# Sentencias que ejecuta cada venta (FacturaViewSet.create)
+VENTA = ('productos_por_id', 'insertar_detalle_factura', 'deltas_stock')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara en PostgreSQL cada sentencia frecuente ejecutada como SQL ad hoc "
+        "(análisis y plan en cada llamada) contra su versión preparada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=500)
+        parser.add_argument('--lineas', type=int, default=3, help="Líneas por venta simulada.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Las sentencias preparadas requieren PostgreSQL.")
+        ids = list(Producto.objects.order_by('id').values_list('id', flat=True)[:options['lineas']])
+        empleado = Empleado.objects.first()
+        if not ids or empleado is None:
+            raise CommandError("Se necesitan productos y al menos un empleado para la prueba.")
+
+        hoy = timezone.localdate()
+        with transaction.atomic():
+            factura = Factura.objects.create(empleado=empleado, fecha=hoy)
+            cantidades = [1] * len(ids)
+            precios = [Decimal('1.00')] * len(ids)
+            parametros = {
+                'productos_por_id': [ids],
+                'insertar_detalle_factura': [factura.pk, ids, cantidades, precios, precios],
+                'deltas_stock': [ids, cantidades, timezone.now()],
+                'totales_factura': [hoy.replace(day=1), hoy],
+            }
+
+            resultados = {}
+            with connection.cursor() as cursor:
+                for nombre, valores in parametros.items():
+                    ad_hoc = self._medir(cursor, self._sql_ad_hoc(nombre), valores, options['iteraciones'])
+                    sentencias.ejecutar(cursor, nombre, valores)  # Preparar fuera de la medición
+                    marcadores = ', '.join(['%s'] * len(valores))
+                    preparada = self._medir(cursor, f"EXECUTE {nombre} ({marcadores})", valores, options['iteraciones'])
+                    plan = self._tiempo_planificacion(cursor, nombre, valores)
+                    resultados[nombre] = (ad_hoc, preparada)
+                    self.stdout.write(
+                        f"{nombre:28} ad hoc {ad_hoc:8.1f} µs  preparada {preparada:8.1f} µs  "
+                        f"ahorro {ad_hoc - preparada:8.1f} µs  (planificación {plan} ms)"
+                    )
+            # La prueba no deja datos: se deshace toda la transacción
+            transaction.set_rollback(True)
+
+        ahorro = sum(resultados[n][0] - resultados[n][1] for n in VENTA)
+        self.stdout.write(self.style.SUCCESS(f"Ahorro estimado por venta: {ahorro:.1f} µs"))
+
+    def _sql_ad_hoc(self, nombre):
+        """La misma sentencia con parámetros del cliente, que el servidor planifica en cada llamada."""
+        tipos, sql = sentencias.SENTENCIAS[nombre]
+        return re.sub(r'\$(\d+)(::[\w\[\]]+)?', lambda m: f"%s::{tipos[int(m.group(1)) - 1]}", sql)
+
+    def _medir(self, cursor, sql, valores, iteraciones):
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            cursor.execute(sql, valores)
+        return (time.perf_counter() - inicio) / iteraciones * 1e6
+
+    def _tiempo_planificacion(self, cursor, nombre, valores):
+        cursor.execute(f"EXPLAIN (ANALYZE, SUMMARY) {self._sql_ad_hoc(nombre)}", valores)
+        for (linea,) in cursor.fetchall():
+            if linea.startswith('Planning Time'):
+                return linea.split(':')[1].split()[0]
+        return '?'
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from api import lecturas
+from api.models import Producto
+from api.serializers import ProductoSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el listado de productos serializado con ProductoSerializer contra "
+        "la lectura rápida con values() (api.lecturas), y verifica que la salida sea igual."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=20)
+        parser.add_argument('--limite', type=int, default=None, help="Cantidad de productos a leer (por defecto, todos).")
+
+    def handle(self, *args, **options):
+        queryset = Producto.objects.select_related('proveedor', 'categoria').order_by('id')
+        if options['limite']:
+            queryset = queryset[:options['limite']]
+        cantidad = queryset.count()
+        if not cantidad:
+            raise CommandError("Se necesitan productos para la prueba.")
+        request = RequestFactory().get('/api/v1/productos/')
+
+        def serializer():
+            return ProductoSerializer(queryset.all(), many=True, context={'request': request}).data
+
+        def rapida():
+            return lecturas.productos(queryset.all(), request)
+
+        if [dict(fila) for fila in serializer()] != rapida():
+            raise CommandError("La lectura rápida no produce la misma salida que ProductoSerializer.")
+
+        lento = self._medir(serializer, options['iteraciones'])
+        rapido = self._medir(rapida, options['iteraciones'])
+        self.stdout.write(
+            f"{cantidad} productos  serializer {lento:8.2f} ms  values() {rapido:8.2f} ms  "
+            f"({lento / cantidad * 1000:.1f} vs {rapido / cantidad * 1000:.1f} µs por fila)"
+        )
+        self.stdout.write(self.style.SUCCESS(f"La lectura rápida es {lento / rapido:.1f}x más rápida"))
+
+    def _medir(self, funcion, iteraciones):
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            funcion()
+        return (time.perf_counter() - inicio) / iteraciones * 1000
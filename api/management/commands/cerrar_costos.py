@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.valoracion import cerrar_meses
+
+
+class Command(BaseCommand):
+    help = "Cierra al costo promedio ponderado los meses completos que aún no tienen cierre."
+
+    def handle(self, *args, **options):
+        creados = cerrar_meses()
+        self.stdout.write(self.style.SUCCESS(f"{creados} cierres de costo creados."))
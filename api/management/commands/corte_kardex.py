@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.inventario import conciliar_stock, generar_cortes
+
+
+class Command(BaseCommand):
+    help = "Genera los cortes periódicos del kardex y, opcionalmente, concilia el stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conciliar', action='store_true', help="Compara Producto.stock contra el kardex.")
+        parser.add_argument('--corregir', action='store_true', help="Registra ajustes por las diferencias encontradas.")
+
+    def handle(self, *args, **options):
+        if options['conciliar'] or options['corregir']:
+            diferencias = conciliar_stock(corregir=options['corregir'])
+            for producto_id, diferencia in diferencias.items():
+                self.stdout.write(f"Producto {producto_id}: diferencia {diferencia:+d}")
+            self.stdout.write(f"{len(diferencias)} productos con diferencias.")
+
+        creados = generar_cortes()
+        self.stdout.write(self.style.SUCCESS(f"{creados} cortes generados."))
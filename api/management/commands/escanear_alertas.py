@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.alertas import escanear
+
+
+class Command(BaseCommand):
+    help = "Escanea de forma incremental los productos con stock bajo (central o por local) o próximos a vencer, con sus lotes."
+
+    def handle(self, *args, **options):
+        creadas, resueltas = escanear()
+        self.stdout.write(self.style.SUCCESS(f"{creadas} alertas nuevas, {resueltas} resueltas."))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.recomendaciones import actualizar, reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        "Actualiza el índice de co-compra con las facturas nuevas. Con --completo lo "
+        "reconstruye desde todo el historial (corrida nocturna)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        filas = reconstruir() if options['completo'] else actualizar()
+        self.stdout.write(self.style.SUCCESS(
+            f"{filas} pares escritos en {time.perf_counter() - inicio:.1f} s."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.reposicion import generar_sugerencias
+
+
+class Command(BaseCommand):
+    help = "Calcula las órdenes de compra sugeridas según la velocidad de venta."
+
+    def handle(self, *args, **options):
+        sugerencias = generar_sugerencias()
+        proveedores = {s.proveedor_id for s in sugerencias}
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(sugerencias)} productos a reponer en {len(proveedores)} proveedores."
+        ))
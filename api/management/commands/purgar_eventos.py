@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import EventoInventario
+
+
+class Command(BaseCommand):
+    help = "Elimina por lotes los eventos del feed SSE más antiguos que la retención configurada."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help="Cantidad de eventos por lote.")
+
+    def handle(self, *args, **options):
+        horas = getattr(settings, 'EVENTOS', {}).get('RETENCION_HORAS', 24)
+        limite = timezone.now() - timedelta(hours=horas)
+        total = 0
+        while True:
+            ids = list(
+                EventoInventario.objects
+                .filter(creado__lt=limite)
+                .order_by('id')
+                .values_list('id', flat=True)[:options['lote']]
+            )
+            if not ids:
+                break
+            total += EventoInventario.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"{total} eventos eliminados."))
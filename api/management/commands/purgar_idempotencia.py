@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ClaveIdempotencia
+
+
+class Command(BaseCommand):
+    help = "Elimina por lotes las claves de idempotencia expiradas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help="Cantidad de claves por lote.")
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        total = 0
+        while True:
+            ids = list(
+                ClaveIdempotencia.objects
+                .filter(expira__lt=ahora)
+                .order_by('id')
+                .values_list('id', flat=True)[:options['lote']]
+            )
+            if not ids:
+                break
+            total += ClaveIdempotencia.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"{total} claves de idempotencia eliminadas."))
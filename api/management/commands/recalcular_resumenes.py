@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.resumenes import recalcular
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los resúmenes de compra de los clientes a partir de sus facturas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cliente', type=int, action='append', help="Id de usuario; se puede repetir.")
+
+    def handle(self, *args, **options):
+        total = recalcular(options['cliente'])
+        self.stdout.write(self.style.SUCCESS(f"{total} resúmenes recalculados."))
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def crear_saldos_apertura(apps, schema_editor):
+    Producto = apps.get_model('api', 'Producto')
+    MovimientoStock = apps.get_model('api', 'MovimientoStock')
+    MovimientoStock.objects.bulk_create(
+        [
+            MovimientoStock(producto_id=pk, cantidad=stock, motivo='APERTURA')
+            for pk, stock in Producto.objects.filter(stock__gt=0).values_list('pk', 'stock')
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_movimientostock_cortestock'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_saldos_apertura, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_saldos_apertura'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedidos',
+            name='fecha_vencimiento',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pedidos',
+            name='lote',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='Lote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(blank=True, default='', max_length=50)),
+                ('fecha_vencimiento', models.DateField()),
+                ('fecha_ingreso', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cantidad_inicial', models.PositiveIntegerField()),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lotes', to='api.pedidos')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='api.producto')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='lote',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='movimientos', to='api.lote'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(condition=models.Q(('cantidad__gt', 0)), fields=['producto', 'fecha_vencimiento'], name='lote_fefo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(condition=models.Q(('cantidad__gt', 0)), fields=['fecha_vencimiento'], name='lote_vencimiento_idx'),
+        ),
+    ]
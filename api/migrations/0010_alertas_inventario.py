@@ -0,0 +1,56 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_lote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaProceso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('datos', models.JSONField(default=dict)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='fecha_vencimiento',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='stock',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.CreateModel(
+            name='AlertaInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('AGOTADO', 'Agotado'), ('STOCK_BAJO', 'Stock bajo'), ('VENCIDO', 'Vencido'), ('POR_VENCER', 'Próximo a vencer')], max_length=20)),
+                ('mensaje', models.CharField(max_length=255)),
+                ('activa', models.BooleanField(default=True)),
+                ('creada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('resuelta', models.DateTimeField(blank=True, null=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='api.producto')),
+            ],
+            options={
+                'ordering': ['-creada', '-id'],
+                'indexes': [models.Index(fields=['activa', '-creada'], name='alerta_activa_creada_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('activa', True)), fields=('producto', 'tipo'), name='alerta_activa_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_alertas_inventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proveedor',
+            name='dias_entrega',
+            field=models.PositiveIntegerField(default=7),
+        ),
+        migrations.CreateModel(
+            name='SugerenciaReposicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('velocidad', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('stock', models.PositiveIntegerField()),
+                ('en_camino', models.PositiveIntegerField(default=0)),
+                ('precio_compra', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sugerencias', to='api.producto')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sugerencias', to='api.proveedor')),
+            ],
+            options={
+                'ordering': ['proveedor_id', 'producto_id'],
+                'indexes': [models.Index(fields=['proveedor', 'producto'], name='sugerencia_proveedor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_reposicion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrdenCompra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(default=django.utils.timezone.localdate)),
+                ('estado', models.CharField(choices=[('Borrador', 'Borrador'), ('Enviada', 'Enviada'), ('Recibida', 'Recibida')], default='Borrador', max_length=20)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('igv', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('recibida', models.DateTimeField(blank=True, null=True)),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ordenes', to='api.proveedor')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pedidos',
+            name='orden',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='api.ordencompra'),
+        ),
+    ]
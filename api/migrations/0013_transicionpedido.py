@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_ordencompra'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionPedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado_anterior', models.CharField(max_length=50)),
+                ('estado_nuevo', models.CharField(max_length=50)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transiciones', to='api.pedidos')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado_nuevo', 'fecha'], name='transicion_estado_fecha_idx')],
+            },
+        ),
+    ]
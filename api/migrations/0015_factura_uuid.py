@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_claveidempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_eventoinventario'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCliente',
+            fields=[
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen_compras', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_gastado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('compras', models.PositiveIntegerField(default=0)),
+                ('ultima_compra', models.DateTimeField(blank=True, null=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='facturacliente',
+            index=models.Index(fields=['cliente', '-fecha', '-id'], name='facturacliente_historial_idx'),
+        ),
+    ]
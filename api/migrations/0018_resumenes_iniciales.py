@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, Max, Sum
+
+
+def crear_resumenes(apps, schema_editor):
+    FacturaCliente = apps.get_model('api', 'FacturaCliente')
+    ResumenCliente = apps.get_model('api', 'ResumenCliente')
+    filas = (
+        FacturaCliente.objects
+        .values('cliente')
+        .annotate(total=Sum('total'), compras=Count('id'), ultima=Max('fecha'))
+        .order_by()
+    )
+    ResumenCliente.objects.bulk_create(
+        [
+            ResumenCliente(
+                cliente_id=fila['cliente'], total_gastado=fila['total'] or 0,
+                compras=fila['compras'], ultima_compra=fila['ultima'],
+            )
+            for fila in filas
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_resumencliente'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_resumenes, migrations.RunPython.noop),
+    ]
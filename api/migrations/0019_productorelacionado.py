@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_resumenes_iniciales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoRelacionado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('veces', models.PositiveIntegerField()),
+                ('puntuacion', models.FloatField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relacionados', to='api.producto')),
+                ('relacionado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', '-puntuacion'], name='relacionado_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'relacionado'), name='relacionado_par_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_productorelacionado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronosticoVenta',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pronostico', serialize=False, to='api.producto')),
+                ('generado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('desde', models.DateField()),
+                ('diario', models.JSONField(default=list)),
+                ('total_semana', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_horizonte', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('error', models.DecimalField(decimal_places=3, max_digits=12)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_pronosticoventa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreCosto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('cantidad', models.IntegerField()),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('costo_promedio', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('unidades_vendidas', models.IntegerField(default=0)),
+                ('ventas_sin_igv', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('costo_ventas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierres_costo', to='api.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['mes'], name='cierre_mes_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'mes'), name='cierre_producto_mes_unico')],
+            },
+        ),
+    ]
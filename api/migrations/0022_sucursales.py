@@ -0,0 +1,125 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_cierrecosto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSucursal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Sucursal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('direccion', models.CharField(blank=True, default='', max_length=200)),
+                ('activa', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransferenciaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('nota', models.CharField(blank=True, default='', max_length=200)),
+            ],
+            options={
+                'ordering': ['-fecha', '-id'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='lote',
+            name='lote_fefo_idx',
+        ),
+        migrations.AlterField(
+            model_name='movimientostock',
+            name='motivo',
+            field=models.CharField(choices=[('APERTURA', 'Saldo de apertura'), ('VENTA', 'Venta en tienda'), ('VENTA_CLIENTE', 'Venta a cliente'), ('PEDIDO', 'Pedido recibido'), ('AJUSTE', 'Ajuste manual'), ('TRANSFERENCIA', 'Transferencia entre locales')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='stocksucursal',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocks_sucursal', to='api.producto'),
+        ),
+        migrations.AddField(
+            model_name='stocksucursal',
+            name='sucursal',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocks', to='api.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='empleado',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='empleados', to='api.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='facturas', to='api.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='lote',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='lotes', to='api.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='pedidos',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.sucursal'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['sucursal', 'fecha'], name='factura_sucursal_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(condition=models.Q(('cantidad__gt', 0)), fields=['sucursal', 'producto', 'fecha_vencimiento'], name='lote_fefo_idx'),
+        ),
+        migrations.AddField(
+            model_name='transferenciastock',
+            name='destino',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transferencias_entrada', to='api.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='transferenciastock',
+            name='origen',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transferencias_salida', to='api.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='transferenciastock',
+            name='usuario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='transferencia',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='movimientos', to='api.transferenciastock'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['sucursal', 'producto', 'id'], name='movimiento_sucursal_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='stocksucursal',
+            constraint=models.UniqueConstraint(fields=('sucursal', 'producto'), name='stock_sucursal_unico'),
+        ),
+    ]
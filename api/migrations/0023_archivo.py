@@ -0,0 +1,124 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_sucursales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacturaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('cliente', models.CharField(max_length=200)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('igv', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('uuid', models.UUIDField(blank=True, null=True)),
+                ('archivada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('empleado', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.empleado')),
+                ('sucursal', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.sucursal')),
+            ],
+            options={
+                'ordering': ['-fecha', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetalleFacturaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.IntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('producto', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.producto')),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='api.facturaarchivada')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FacturacionMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('origen', models.CharField(choices=[('tienda', 'Tienda'), ('cliente', 'Clientes')], max_length=10)),
+                ('facturas', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('igv', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sucursal', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.sucursal')),
+            ],
+            options={
+                'ordering': ['mes', 'origen'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FacturaClienteArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateTimeField()),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('igv', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('archivada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cliente', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetalleFacturaClienteArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('producto', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.producto')),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='api.facturaclientearchivada')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VentaProductoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('origen', models.CharField(choices=[('tienda', 'Tienda'), ('cliente', 'Clientes')], max_length=10)),
+                ('unidades', models.IntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.producto')),
+                ('sucursal', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.sucursal')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='facturaarchivada',
+            index=models.Index(fields=['fecha'], name='facturaarch_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaarchivada',
+            index=models.Index(fields=['sucursal', 'fecha'], name='facturaarch_sucursal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturacionmensual',
+            index=models.Index(fields=['origen', 'mes'], name='facturacion_mensual_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaclientearchivada',
+            index=models.Index(fields=['cliente', '-fecha', '-id'], name='facturaclientearch_hist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaclientearchivada',
+            index=models.Index(fields=['fecha'], name='facturaclientearch_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventaproductomensual',
+            index=models.Index(fields=['origen', 'mes'], name='venta_producto_mensual_idx'),
+        ),
+    ]
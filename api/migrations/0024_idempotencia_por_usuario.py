@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-19 05:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_archivo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='claveidempotencia',
+            name='idempotencia_ruta_clave_unica',
+        ),
+        migrations.AddConstraint(
+            model_name='claveidempotencia',
+            constraint=models.UniqueConstraint(condition=models.Q(('usuario__isnull', False)), fields=('usuario', 'ruta', 'clave'), name='idempotencia_usuario_clave_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='claveidempotencia',
+            constraint=models.UniqueConstraint(condition=models.Q(('usuario__isnull', True)), fields=('ruta', 'clave'), name='idempotencia_anonima_clave_unica'),
+        ),
+    ]
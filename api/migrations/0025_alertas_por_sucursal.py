@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-19 05:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_idempotencia_por_usuario'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='alertainventario',
+            name='alerta_activa_unica',
+        ),
+        migrations.AddField(
+            model_name='alertainventario',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='api.sucursal'),
+        ),
+        migrations.AddConstraint(
+            model_name='alertainventario',
+            constraint=models.UniqueConstraint(condition=models.Q(('activa', True), ('sucursal__isnull', True)), fields=('producto', 'tipo'), name='alerta_activa_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='alertainventario',
+            constraint=models.UniqueConstraint(condition=models.Q(('activa', True), ('sucursal__isnull', False)), fields=('producto', 'sucursal', 'tipo'), name='alerta_sucursal_activa_unica'),
+        ),
+    ]
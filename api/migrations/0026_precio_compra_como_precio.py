@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-19 05:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_alertas_por_sucursal'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pedidos',
+            name='precio_compra',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='sugerenciareposicion',
+            name='precio_compra',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+    ]
@@ -1,8 +1,11 @@
 from django.contrib.auth.models import User  # type: ignore
 from django.utils import timezone
 from django.db import models, transaction
+from django.db.models import Q
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
-from decimal import Decimal
+
+from .precios import calcular_igv, precio_con_igv
 
 
 def get_default_user():
@@ -35,12 +38,23 @@ class Persona(models.Model):
     def __str__(self):
         return f"{self.nombre} {self.apellidos}"
 
+class Sucursal(models.Model):
+    """Local de la cadena; cada uno lleva su propio stock en StockSucursal."""
+    nombre = models.CharField(max_length=100, unique=True)
+    direccion = models.CharField(max_length=200, blank=True, default='')
+    activa = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.nombre
+
 class Empleado(models.Model):
     persona = models.OneToOneField(Persona, on_delete=models.CASCADE)
     usuario = models.OneToOneField(User, on_delete=models.CASCADE)  # Relación con el usuario
     cargo = models.CharField(max_length=100)
     fecha_contratacion = models.DateField()
     salario = models.DecimalField(max_digits=10, decimal_places=2)
+    # Local donde vende; sin sucursal sus ventas salen del almacén central (Producto.stock)
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.PROTECT, null=True, blank=True, related_name='empleados')
 
     def __str__(self):
         return self.persona.nombre
@@ -58,6 +72,7 @@ class Proveedor(models.Model):
     direccion = models.CharField(max_length=200,)
     telefono = models.CharField(max_length=20)
     email = models.EmailField()
+    dias_entrega = models.PositiveIntegerField(default=7)  # Tiempo de reposición del proveedor
 
     def __str__(self):
         return self.nombre
@@ -72,17 +87,23 @@ class Producto(models.Model):
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField()
     presentacion = models.CharField(max_length=100)
-    fecha_vencimiento = models.DateField()
+    fecha_vencimiento = models.DateField(db_index=True)
     proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
     imagen = models.ImageField(max_length=500, blank=True, null=True)
-    stock = models.PositiveIntegerField(default=0)
+    stock = models.PositiveIntegerField(default=0, db_index=True)  # Almacén central; cada local en StockSucursal
     precio_sin_igv = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     precio = models.DecimalField(max_digits=10, decimal_places=2, editable=False, default=0)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Marca para procesos incrementales
 
     def save(self, *args, **kwargs):
-        igv_rate = Decimal('0.18')  
-        self.precio = self.precio_sin_igv + (self.precio_sin_igv * igv_rate)
+        self.precio = precio_con_igv(self.precio_sin_igv)
+        # Solo el kardex escribe el stock (UPDATE con F()): al modificar el producto no
+        # se reescribe el valor en memoria, que puede estar desactualizado
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields if not campo.primary_key and campo.name != 'stock'
+            ]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -102,6 +123,15 @@ class Factura(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     igv = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Identificador generado por el punto de venta para facturas emitidas sin conexión
+    uuid = models.UUIDField(unique=True, null=True, blank=True, editable=False)
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.PROTECT, null=True, blank=True, related_name='facturas')
+
+    class Meta:
+        indexes = [
+            # Reportes por local: cada sucursal recorre solo su rango de fechas
+            models.Index(fields=['sucursal', 'fecha'], name='factura_sucursal_fecha_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         """Sobrescribe el método save para no calcular los totales automáticamente."""
@@ -120,6 +150,34 @@ class DetalleFactura(models.Model):
         self.subtotal = self.precio_unitario * self.cantidad  # Calcular el subtotal
         super().save(*args, **kwargs)  # Guardar el detalle
 
+class OrdenCompra(models.Model):
+    """Cabecera de una orden de compra; sus líneas son Pedidos."""
+    ESTADOS = [
+        ('Borrador', 'Borrador'),
+        ('Enviada', 'Enviada'),
+        ('Recibida', 'Recibida'),
+    ]
+
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, related_name='ordenes')
+    fecha = models.DateField(default=timezone.localdate)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='Borrador')
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    igv = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    recibida = models.DateTimeField(null=True, blank=True)
+
+    def recalcular_totales(self):
+        totales = self.lineas.aggregate(
+            subtotal=models.Sum('subtotal'), igv=models.Sum('igv'), total=models.Sum('total_pedido')
+        )
+        self.subtotal = totales['subtotal'] or 0
+        self.igv = totales['igv'] or 0
+        self.total = totales['total'] or 0
+        self.save(update_fields=['subtotal', 'igv', 'total'])
+
+    def __str__(self):
+        return f"Orden {self.id} - {self.proveedor}"
+
 class Pedidos(models.Model):
     ESTADOS = [
         ('Pendiente', 'Pendiente'),
@@ -131,23 +189,32 @@ class Pedidos(models.Model):
     proveedor = models.ForeignKey('Proveedor', on_delete=models.CASCADE, default=1, related_name='pedidos')
     producto = models.ForeignKey('Producto', on_delete=models.CASCADE, null=True, blank=True)
     cantidad = models.PositiveIntegerField(default=1)
-    precio_compra = models.DecimalField(max_digits=7, decimal_places=2)
+    precio_compra = models.DecimalField(max_digits=10, decimal_places=2)  # Mismo rango que Producto.precio
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     igv = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # Campo para IGV
     total_pedido = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     estado = models.CharField(max_length=50, choices=ESTADOS)
-
-    IGV_RATE = Decimal('0.18')  # Tasa fija del 18%
+    lote = models.CharField(max_length=50, blank=True, default='')  # Código de lote del proveedor
+    orden = models.ForeignKey(OrdenCompra, on_delete=models.CASCADE, null=True, blank=True, related_name='lineas')
+    fecha_vencimiento = models.DateField(null=True, blank=True)  # Vencimiento del lote recibido
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.PROTECT, null=True, blank=True, related_name='+')  # Local que recibe
 
     def calcular_subtotal(self):
         return self.cantidad * self.precio_compra
 
     def calcular_igv(self):
-        return self.subtotal * self.IGV_RATE
+        return calcular_igv(self.subtotal)
 
     def calcular_total(self):
         return self.subtotal + self.igv
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado con el que se leyó la fila, para detectar transiciones sin otra consulta
+        instance._estado_cargado = instance.__dict__.get('estado')
+        return instance
+
     def save(self, *args, **kwargs):
 
         if self.subtotal is None:
@@ -157,17 +224,36 @@ class Pedidos(models.Model):
         if self.total_pedido is None:
             self.total_pedido = self.calcular_total()
 
-        if self.pk:  
-            previous = Pedidos.objects.get(pk=self.pk)
+        if not self._state.adding and self.estado != getattr(self, '_estado_cargado', None):
+            from .pedidos import transicionar_pedidos
+
+            # El estado no se escribe con el resto de campos: lo aplica la transición
+            # con un UPDATE condicional, que también ingresa el stock una sola vez
+            campos = kwargs.pop('update_fields', None)
+            if campos is None:
+                campos = [f.attname for f in self._meta.concrete_fields if not f.primary_key]
+            campos = [campo for campo in campos if campo != 'estado']
+            with transaction.atomic():
+                if campos:
+                    super().save(*args, update_fields=campos, **kwargs)
+                transicionar_pedidos(Pedidos.objects.filter(pk=self.pk), self.estado)
+        else:
+            super().save(*args, **kwargs)
+        self._estado_cargado = self.estado
+
+class TransicionPedido(models.Model):
+    pedido = models.ForeignKey(Pedidos, on_delete=models.CASCADE, related_name='transiciones')
+    estado_anterior = models.CharField(max_length=50)
+    estado_nuevo = models.CharField(max_length=50)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado_nuevo', 'fecha'], name='transicion_estado_fecha_idx'),
+        ]
 
-            if previous.estado != 'Completado' and self.estado == 'Completado':
-                with transaction.atomic():
-                    # Incrementar el stock del producto
-                    if self.producto:
-                        self.producto.stock += self.cantidad
-                        self.producto.save()
-
-        super().save(*args, **kwargs)
+    def __str__(self):
+        return f"Pedido {self.pedido_id}: {self.estado_anterior} -> {self.estado_nuevo}"
 
 class FacturaCliente(models.Model):
     cliente = models.ForeignKey(
@@ -180,9 +266,32 @@ class FacturaCliente(models.Model):
     igv = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            # Historial del cliente, del más reciente al más antiguo
+            models.Index(fields=['cliente', '-fecha', '-id'], name='facturacliente_historial_idx'),
+        ]
+
     def __str__(self):
         return f"FacturaCliente {self.id} - Cliente: {self.cliente.username}"
 
+
+class ResumenCliente(models.Model):
+    """Acumulados de compra de un cliente, actualizados al registrar cada factura."""
+    cliente = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='resumen_compras'
+    )
+    total_gastado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    compras = models.PositiveIntegerField(default=0)
+    ultima_compra = models.DateTimeField(null=True, blank=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Resumen de {self.cliente_id}: {self.compras} compras"
+
 class DetalleFacturaCliente(models.Model):
     factura = models.ForeignKey(
         FacturaCliente,
@@ -198,4 +307,388 @@ class DetalleFacturaCliente(models.Model):
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
-        return f"Detalle {self.id} - FacturaCliente {self.factura.id}"
\ No newline at end of file
+        return f"Detalle {self.id} - FacturaCliente {self.factura.id}"
+
+class MovimientoStock(models.Model):
+    """Kardex: registro inmutable de cada entrada/salida de stock."""
+    MOTIVOS = [
+        ('APERTURA', 'Saldo de apertura'),
+        ('VENTA', 'Venta en tienda'),
+        ('VENTA_CLIENTE', 'Venta a cliente'),
+        ('PEDIDO', 'Pedido recibido'),
+        ('AJUSTE', 'Ajuste manual'),
+        ('TRANSFERENCIA', 'Transferencia entre locales'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
+    cantidad = models.IntegerField()  # Positivo = entrada, negativo = salida
+    motivo = models.CharField(max_length=20, choices=MOTIVOS)
+    fecha = models.DateTimeField(default=timezone.now)
+    # Referencias al documento de origen; sin restricción de BD para que el kardex sobreviva a su borrado
+    factura = models.ForeignKey(Factura, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    factura_cliente = models.ForeignKey('FacturaCliente', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    pedido = models.ForeignKey(Pedidos, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    lote = models.ForeignKey('Lote', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='movimientos')
+    transferencia = models.ForeignKey('TransferenciaStock', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='movimientos')
+    # Stock afectado: el del local o, sin sucursal, el del almacén central
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['producto', 'id'], name='movimiento_producto_idx'),
+            models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'),
+            models.Index(fields=['sucursal', 'producto', 'id'], name='movimiento_sucursal_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.motivo} {self.cantidad:+d} - {self.producto_id}"
+
+class CorteStock(models.Model):
+    """Punto de control del kardex: stock central acumulado de un producto hasta un movimiento."""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='cortes')
+    fecha = models.DateTimeField(default=timezone.now)
+    ultimo_movimiento = models.BigIntegerField()  # Id del último movimiento incluido en el corte
+    stock = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='corte_producto_fecha_idx'),
+            models.Index(fields=['ultimo_movimiento'], name='corte_ultimo_movimiento_idx'),
+        ]
+
+    def __str__(self):
+        return f"Corte {self.producto_id} @ {self.ultimo_movimiento}: {self.stock}"
+
+class Lote(models.Model):
+    """Lote recibido de un proveedor; su cantidad solo cambia a través del kardex."""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='lotes')
+    pedido = models.ForeignKey(Pedidos, on_delete=models.SET_NULL, null=True, blank=True, related_name='lotes')
+    codigo = models.CharField(max_length=50, blank=True, default='')
+    fecha_vencimiento = models.DateField()
+    fecha_ingreso = models.DateTimeField(default=timezone.now)
+    cantidad_inicial = models.PositiveIntegerField()
+    cantidad = models.PositiveIntegerField(default=0)  # Unidades disponibles
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.PROTECT, null=True, blank=True, related_name='lotes')
+
+    class Meta:
+        indexes = [
+            # Solo lotes con existencias: asignación FEFO (por local) y consulta de próximos a vencer
+            models.Index(fields=['sucursal', 'producto', 'fecha_vencimiento'], condition=Q(cantidad__gt=0), name='lote_fefo_idx'),
+            models.Index(fields=['fecha_vencimiento'], condition=Q(cantidad__gt=0), name='lote_vencimiento_idx'),
+        ]
+
+    def __str__(self):
+        return f"Lote {self.codigo or self.id} - {self.producto_id} ({self.fecha_vencimiento})"
+
+class StockSucursal(models.Model):
+    """
+    Stock de un producto en un local. Cada local actualiza solo sus propias filas,
+    así las ventas de distintas sucursales no compiten por el mismo registro.
+    """
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, related_name='stocks')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='stocks_sucursal')
+    stock = models.PositiveIntegerField(default=0)  # El CHECK (stock >= 0) hace de control de stock
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sucursal', 'producto'], name='stock_sucursal_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.sucursal_id}/{self.producto_id}: {self.stock}"
+
+class TransferenciaStock(models.Model):
+    """Traslado entre locales; sus líneas son los movimientos TRANSFERENCIA del kardex."""
+    # Sin sucursal de origen o destino se trata del almacén central
+    origen = models.ForeignKey(Sucursal, on_delete=models.PROTECT, null=True, blank=True, related_name='transferencias_salida')
+    destino = models.ForeignKey(Sucursal, on_delete=models.PROTECT, null=True, blank=True, related_name='transferencias_entrada')
+    fecha = models.DateTimeField(default=timezone.now)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    nota = models.CharField(max_length=200, blank=True, default='')
+
+    class Meta:
+        ordering = ['-fecha', '-id']
+
+    def __str__(self):
+        return f"Transferencia {self.id}: {self.origen_id or 'central'} -> {self.destino_id or 'central'}"
+
+class AlertaInventario(models.Model):
+    TIPOS = [
+        ('AGOTADO', 'Agotado'),
+        ('STOCK_BAJO', 'Stock bajo'),
+        ('VENCIDO', 'Vencido'),
+        ('POR_VENCER', 'Próximo a vencer'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='alertas')
+    # Local del stock alertado; None para el almacén central y los vencimientos
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, null=True, blank=True, related_name='alertas')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    mensaje = models.CharField(max_length=255)
+    activa = models.BooleanField(default=True)
+    creada = models.DateTimeField(default=timezone.now)
+    resuelta = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-creada', '-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'tipo'], condition=Q(activa=True, sucursal__isnull=True), name='alerta_activa_unica'
+            ),
+            models.UniqueConstraint(
+                fields=['producto', 'sucursal', 'tipo'], condition=Q(activa=True, sucursal__isnull=False),
+                name='alerta_sucursal_activa_unica',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['activa', '-creada'], name='alerta_activa_creada_idx'),
+        ]
+
+    def __str__(self):
+        if self.sucursal_id:
+            return f"{self.get_tipo_display()} - {self.producto_id} (sucursal {self.sucursal_id})"
+        return f"{self.get_tipo_display()} - {self.producto_id}"
+
+class MarcaProceso(models.Model):
+    """Marca de agua de los procesos incrementales (último punto procesado)."""
+    nombre = models.CharField(max_length=50, unique=True)
+    datos = models.JSONField(default=dict)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.nombre
+
+class SugerenciaReposicion(models.Model):
+    """Línea de la orden de compra sugerida por el motor de reposición."""
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, related_name='sugerencias')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='sugerencias')
+    generada = models.DateTimeField(default=timezone.now)
+    cantidad = models.PositiveIntegerField()
+    velocidad = models.DecimalField(max_digits=10, decimal_places=3)  # Unidades vendidas por día
+    stock = models.PositiveIntegerField()
+    en_camino = models.PositiveIntegerField(default=0)  # Unidades de pedidos aún no recibidos
+    precio_compra = models.DecimalField(max_digits=10, decimal_places=2)  # Cae en precio_sin_igv si no hay compras
+
+    class Meta:
+        ordering = ['proveedor_id', 'producto_id']
+        indexes = [
+            models.Index(fields=['proveedor', 'producto'], name='sugerencia_proveedor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} x{self.cantidad} - {self.proveedor_id}"
+
+class ClaveIdempotencia(models.Model):
+    """Respuesta registrada para una cabecera Idempotency-Key de un endpoint."""
+    ESTADOS = [
+        ('EN_CURSO', 'En curso'),
+        ('COMPLETADA', 'Completada'),
+    ]
+
+    clave = models.CharField(max_length=255)
+    ruta = models.CharField(max_length=255)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    huella = models.CharField(max_length=64)  # SHA-256 del cuerpo de la petición
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='EN_CURSO')
+    codigo = models.PositiveSmallIntegerField(null=True, blank=True)
+    respuesta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    creada = models.DateTimeField(default=timezone.now)
+    expira = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            # Cada usuario tiene su propio espacio de claves; las peticiones anónimas comparten uno
+            models.UniqueConstraint(
+                fields=['usuario', 'ruta', 'clave'], condition=models.Q(usuario__isnull=False),
+                name='idempotencia_usuario_clave_unica',
+            ),
+            models.UniqueConstraint(
+                fields=['ruta', 'clave'], condition=models.Q(usuario__isnull=True),
+                name='idempotencia_anonima_clave_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ruta} {self.clave} ({self.estado})"
+
+class EventoInventario(models.Model):
+    """Evento del feed en vivo (SSE); el id sirve de Last-Event-ID para reanudar."""
+    TIPOS = [
+        ('stock', 'Cambio de stock'),
+        ('venta', 'Venta'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    datos = models.JSONField(encoder=DjangoJSONEncoder)
+    creado = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id}"
+
+class ProductoRelacionado(models.Model):
+    """
+    Celda de la matriz de co-compra: facturas en que `producto` y `relacionado`
+    aparecen juntos. La diagonal (relacionado == producto) guarda en cuántas
+    facturas aparece el producto, necesaria para la puntuación.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='relacionados')
+    relacionado = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+')
+    veces = models.PositiveIntegerField()
+    puntuacion = models.FloatField()  # Similitud coseno: veces / sqrt(n_producto * n_relacionado)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'relacionado'], name='relacionado_par_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['producto', '-puntuacion'], name='relacionado_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} -> {self.relacionado_id} ({self.puntuacion:.3f})"
+
+class PronosticoVenta(models.Model):
+    """Pronóstico de unidades vendidas por día de un producto, desde `desde`."""
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='pronostico')
+    generado = models.DateTimeField(default=timezone.now)
+    desde = models.DateField()
+    diario = models.JSONField(default=list)  # Unidades por día para el horizonte completo
+    total_semana = models.DecimalField(max_digits=12, decimal_places=2)
+    total_horizonte = models.DecimalField(max_digits=12, decimal_places=2)
+    error = models.DecimalField(max_digits=12, decimal_places=3)  # RMSE a un paso sobre la historia
+
+    def __str__(self):
+        return f"Pronóstico {self.producto_id} desde {self.desde}"
+
+class CierreCosto(models.Model):
+    """
+    Cierre mensual del costo promedio ponderado de un producto: saldo valorizado
+    al final del mes y costo de lo vendido en el mes.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='cierres_costo')
+    mes = models.DateField()  # Primer día del mes
+    cantidad = models.IntegerField()  # Stock al cierre según el kardex
+    valor = models.DecimalField(max_digits=14, decimal_places=2)
+    costo_promedio = models.DecimalField(max_digits=12, decimal_places=4)
+    unidades_vendidas = models.IntegerField(default=0)
+    ventas_sin_igv = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo_ventas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'mes'], name='cierre_producto_mes_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['mes'], name='cierre_mes_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cierre {self.producto_id} {self.mes:%Y-%m}"
+
+class FacturaArchivada(models.Model):
+    """
+    Factura de tienda de un periodo archivado. Conserva el id original para que
+    las referencias del kardex sigan resolviendo; no participa en las ventas.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    empleado = models.ForeignKey(Empleado, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    fecha = models.DateField()
+    cliente = models.CharField(max_length=200)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    igv = models.DecimalField(max_digits=10, decimal_places=2)
+    uuid = models.UUIDField(null=True, blank=True)
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    archivada = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-fecha', '-id']
+        indexes = [
+            models.Index(fields=['fecha'], name='facturaarch_fecha_idx'),
+            models.Index(fields=['sucursal', 'fecha'], name='facturaarch_sucursal_idx'),
+        ]
+
+    def __str__(self):
+        return f"Factura archivada {self.id}"
+
+class DetalleFacturaArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    factura = models.ForeignKey(FacturaArchivada, on_delete=models.CASCADE, related_name='detalles')
+    producto = models.ForeignKey(Producto, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    cantidad = models.IntegerField()
+    precio_unitario = models.DecimalField(max_digits=7, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+
+class FacturaClienteArchivada(models.Model):
+    """Factura de cliente de un periodo archivado, con su id original."""
+    id = models.BigIntegerField(primary_key=True)
+    cliente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    fecha = models.DateTimeField()
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    igv = models.DecimalField(max_digits=10, decimal_places=2)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    archivada = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-fecha', '-id']
+        indexes = [
+            models.Index(fields=['cliente', '-fecha', '-id'], name='facturaclientearch_hist_idx'),
+            models.Index(fields=['fecha'], name='facturaclientearch_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"FacturaCliente archivada {self.id}"
+
+class DetalleFacturaClienteArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    factura = models.ForeignKey(FacturaClienteArchivada, on_delete=models.CASCADE, related_name='detalles')
+    producto = models.ForeignKey(Producto, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    cantidad = models.PositiveIntegerField()
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+
+class FacturacionMensual(models.Model):
+    """Totales por mes de las facturas archivadas, para que los reportes no lean el archivo."""
+    ORIGENES = [
+        ('tienda', 'Tienda'),
+        ('cliente', 'Clientes'),
+    ]
+
+    mes = models.DateField()  # Primer día del mes
+    origen = models.CharField(max_length=10, choices=ORIGENES)
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    facturas = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    igv = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['mes', 'origen']
+        indexes = [
+            models.Index(fields=['origen', 'mes'], name='facturacion_mensual_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.origen} {self.mes:%Y-%m}: {self.total}"
+
+class VentaProductoMensual(models.Model):
+    """Unidades e importe vendidos por producto y mes de las facturas archivadas."""
+    mes = models.DateField()
+    origen = models.CharField(max_length=10, choices=FacturacionMensual.ORIGENES)
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    producto = models.ForeignKey(Producto, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    unidades = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['origen', 'mes'], name='venta_producto_mensual_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.origen} {self.mes:%Y-%m} {self.producto_id}: {self.unidades}"
@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .inventario import ingresar_pedidos
+from .models import Pedidos, TransicionPedido
+
+# Transiciones permitidas por estado; 'Completado' es final
+TRANSICIONES = {
+    'Pendiente': {'En Proceso', 'Completado'},
+    'En Proceso': {'Pendiente', 'Completado'},
+    'Completado': set(),
+}
+
+
+class TransicionInvalida(Exception):
+    pass
+
+
+def validar_transicion(estado_anterior, estado_nuevo):
+    if estado_nuevo not in TRANSICIONES:
+        raise TransicionInvalida(f"Estado desconocido: {estado_nuevo}.")
+    if estado_anterior != estado_nuevo and estado_nuevo not in TRANSICIONES.get(estado_anterior, set()):
+        raise TransicionInvalida(f"No se puede pasar de '{estado_anterior}' a '{estado_nuevo}'.")
+
+
+def _aplicar(cambian, estado_nuevo):
+    """Aplica en bloque una transición ya validada sobre pedidos bloqueados."""
+    actualizados = (
+        Pedidos.objects
+        .filter(pk__in=[pedido.pk for pedido in cambian])
+        .exclude(estado='Completado')
+        .update(estado=estado_nuevo)
+    )
+    if actualizados != len(cambian):
+        raise TransicionInvalida("Otro proceso modificó los pedidos; intente nuevamente.")
+
+    ahora = timezone.now()
+    TransicionPedido.objects.bulk_create([
+        TransicionPedido(pedido=pedido, estado_anterior=pedido.estado, estado_nuevo=estado_nuevo, fecha=ahora)
+        for pedido in cambian
+    ])
+    for pedido in cambian:
+        pedido.estado = estado_nuevo
+        pedido._estado_cargado = estado_nuevo
+
+    if estado_nuevo == 'Completado':
+        ingresar_pedidos(cambian)
+
+
+def transicionar_pedidos(pedidos, estado_nuevo):
+    """
+    Lleva los pedidos del queryset a `estado_nuevo` y registra la transición.
+    Al pasar a 'Completado' ingresa la mercadería; el UPDATE condicional sobre
+    estado != 'Completado' garantiza que eso ocurra una sola vez por pedido.
+    Devuelve los pedidos que cambiaron de estado.
+    """
+    with transaction.atomic():
+        filas = list(pedidos.select_related('producto').select_for_update(of=('self',)))
+        for pedido in filas:
+            validar_transicion(pedido.estado, estado_nuevo)
+
+        cambian = [pedido for pedido in filas if pedido.estado != estado_nuevo]
+        if cambian:
+            _aplicar(cambian, estado_nuevo)
+    return cambian
+
+
+def transicionar_por_id(ids, estado_nuevo):
+    """
+    Variante por lote tolerante a errores: aplica la transición a los pedidos que
+    la admiten y devuelve el resultado de cada id: 'ok', 'sin_cambio',
+    'no_encontrado' o 'transicion_invalida'.
+    """
+    if estado_nuevo not in TRANSICIONES:
+        raise TransicionInvalida(f"Estado desconocido: {estado_nuevo}.")
+
+    resultados = {}
+    with transaction.atomic():
+        filas = {
+            pedido.pk: pedido
+            for pedido in Pedidos.objects
+            .filter(pk__in=ids)
+            .select_related('producto')
+            .select_for_update(of=('self',))
+        }
+        cambian = []
+        for pk in ids:
+            pedido = filas.get(pk)
+            if pedido is None:
+                resultados[pk] = 'no_encontrado'
+            elif pedido.estado == estado_nuevo:
+                resultados[pk] = 'sin_cambio'
+            elif estado_nuevo not in TRANSICIONES[pedido.estado]:
+                resultados[pk] = 'transicion_invalida'
+            elif pk not in resultados:
+                resultados[pk] = 'ok'
+                cambian.append(pedido)
+        if cambian:
+            _aplicar(cambian, estado_nuevo)
+    return resultados
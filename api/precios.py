@@ -0,0 +1,67 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Round
+from django.utils import timezone
+
+CENTIMO = Decimal('0.01')
+
+
+def tasa_igv():
+    return Decimal(str(getattr(settings, 'IGV_TASA', '0.18')))
+
+
+def _decimal(valor):
+    # str() evita arrastrar el error binario de un float (Decimal(0.18) != Decimal('0.18'))
+    return valor if isinstance(valor, Decimal) else Decimal(str(valor))
+
+
+def redondear(valor):
+    """Redondeo comercial a céntimos."""
+    return _decimal(valor).quantize(CENTIMO, rounding=ROUND_HALF_UP)
+
+
+def calcular_igv(base):
+    """IGV de un importe sin impuesto."""
+    return redondear(_decimal(base) * tasa_igv())
+
+
+def precio_con_igv(precio_sin_igv):
+    return redondear(_decimal(precio_sin_igv) * (1 + tasa_igv()))
+
+
+def desglosar(total):
+    """
+    Separa un importe con IGV incluido en (subtotal, igv). El IGV se obtiene por
+    diferencia para que subtotal + igv coincida siempre con el total.
+    """
+    total = redondear(total)
+    subtotal = redondear(total / (1 + tasa_igv()))
+    return subtotal, total - subtotal
+
+
+def repreciar(productos, precio_sin_igv=None, porcentaje=None):
+    """
+    Cambia el precio de todos los productos del queryset con un único UPDATE: fija
+    `precio_sin_igv` o lo ajusta en `porcentaje` (10 sube un 10 %), y recalcula el
+    precio con IGV en la misma sentencia. Devuelve la cantidad de productos.
+    Lanza ValueError si el precio resultante no sería positivo.
+    """
+    if (precio_sin_igv is None) == (porcentaje is None):
+        raise ValueError("Indique 'precio_sin_igv' o 'porcentaje' (solo uno).")
+
+    if precio_sin_igv is not None:
+        base = redondear(precio_sin_igv)
+        if base <= 0:
+            raise ValueError("'precio_sin_igv' debe ser mayor que cero.")
+        precio = precio_con_igv(base)
+    else:
+        porcentaje = _decimal(porcentaje)
+        if porcentaje <= -100:
+            raise ValueError("'porcentaje' debe ser mayor que -100.")
+        factor = 1 + porcentaje / 100
+        base = Round(F('precio_sin_igv') * factor, 2)
+        precio = Round(Round(F('precio_sin_igv') * factor, 2) * (1 + tasa_igv()), 2)
+    # update() no dispara auto_now: se marca a mano para los procesos incrementales
+    return productos.update(precio_sin_igv=base, precio=precio, actualizado=timezone.now())
@@ -0,0 +1,170 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DetalleFactura, DetalleFacturaCliente, Producto, PronosticoVenta
+
+ESTACION = 7  # Estacionalidad semanal
+
+
+def _configuracion():
+    config = {
+        'DIAS_HISTORIA': 182,
+        'HORIZONTE': 28,
+        'ALFAS': (0.1, 0.3, 0.5),
+        'GAMMAS': (0.05, 0.2),
+        'BETA': 0.02,
+        'AMORTIGUAMIENTO': 0.9,
+    }
+    config.update(getattr(settings, 'PRONOSTICOS', {}))
+    return config
+
+
+def _series(hoy, dias):
+    """
+    Ventas diarias de todo el catálogo en una sola consulta (tienda UNION ALL
+    clientes), como matriz (productos x días) y los ids de producto de cada fila.
+    """
+    desde = hoy - timedelta(days=dias)
+    tienda = (
+        DetalleFactura.objects
+        .filter(factura__fecha__gte=desde, factura__fecha__lt=hoy)
+        .order_by()
+        .values('producto_id', dia=F('factura__fecha'))
+        .annotate(unidades=Sum('cantidad'))
+        .values_list('producto_id', 'dia', 'unidades')
+    )
+    inicio, fin = (timezone.make_aware(datetime.combine(d, time.min)) for d in (desde, hoy))
+    clientes = (
+        DetalleFacturaCliente.objects
+        .filter(factura__fecha__gte=inicio, factura__fecha__lt=fin)
+        .order_by()
+        .values('producto_id', dia=TruncDate('factura__fecha'))
+        .annotate(unidades=Sum('cantidad'))
+        .values_list('producto_id', 'dia', 'unidades')
+    )
+    filas = list(tienda.union(clientes, all=True))
+    ids = np.array(Producto.objects.order_by('pk').values_list('pk', flat=True), dtype=np.int64)
+    ventas = np.zeros((len(ids), dias), dtype=np.float64)
+    if filas:
+        producto, dia, unidades = zip(*filas)
+        base = desde.toordinal()
+        filas_matriz = np.searchsorted(ids, np.array(producto, dtype=np.int64))
+        columnas = np.array([d.toordinal() - base for d in dia], dtype=np.int64)
+        validas = (filas_matriz < len(ids)) & (ids[np.minimum(filas_matriz, len(ids) - 1)] == np.array(producto))
+        np.add.at(ventas, (filas_matriz[validas], columnas[validas]), np.array(unidades, dtype=np.float64)[validas])
+    return ids, ventas
+
+
+def ajustar(ventas, horizonte, alfas, gammas, beta, amortiguamiento):
+    """
+    Holt-Winters aditivo con tendencia amortiguada y estacionalidad semanal para
+    todas las series (filas de `ventas`) a la vez. Cada combinación de (alfa,
+    gamma) se ajusta en paralelo y cada producto se queda con la de menor error a
+    un paso. El bucle recorre los días, nunca los productos.
+    Devuelve (pronóstico productos x horizonte, RMSE por producto).
+    """
+    productos, dias = ventas.shape
+    m = ESTACION
+    rejilla = [(a, g) for a in alfas for g in gammas]
+    alfa = np.array([a for a, _ in rejilla])[:, None]
+    gamma = np.array([g for _, g in rejilla])[:, None]
+    k = len(rejilla)
+
+    primera = ventas[:, :m].mean(axis=1)
+    nivel = np.tile(primera, (k, 1))
+    tendencia = np.tile((ventas[:, m:2 * m].mean(axis=1) - primera) / m, (k, 1))
+    estacion = np.tile(ventas[:, :m] - primera[:, None], (k, 1, 1))
+    error = np.zeros((k, productos))
+
+    for t in range(m, dias):
+        real = ventas[:, t]
+        j = t % m
+        anterior = estacion[:, :, j]
+        error += (real - (nivel + amortiguamiento * tendencia + anterior)) ** 2
+        nuevo = alfa * (real - anterior) + (1 - alfa) * (nivel + amortiguamiento * tendencia)
+        tendencia = beta * (nuevo - nivel) + (1 - beta) * amortiguamiento * tendencia
+        estacion[:, :, j] = gamma * (real - nuevo) + (1 - gamma) * anterior
+        nivel = nuevo
+
+    mejor = error.argmin(axis=0)
+    filas = np.arange(productos)
+    nivel, tendencia = nivel[mejor, filas], tendencia[mejor, filas]
+    estacion = estacion[mejor, filas]
+    rmse = np.sqrt(error[mejor, filas] / max(dias - m, 1))
+
+    pasos = np.arange(1, horizonte + 1)
+    acumulado = np.cumsum(amortiguamiento ** pasos)
+    pronostico = (
+        nivel[:, None]
+        + tendencia[:, None] * acumulado[None, :]
+        + estacion[:, (dias + pasos - 1) % m]
+    )
+    return np.maximum(pronostico, 0), rmse
+
+
+def _decimal(valor, lugares='0.01'):
+    return Decimal(f"{valor:.6f}").quantize(Decimal(lugares))
+
+
+def generar_pronosticos():
+    """
+    Reemplaza los pronósticos con una corrida sobre todo el catálogo. Solo se
+    guardan los productos con ventas en la historia. Devuelve la cantidad.
+    """
+    config = _configuracion()
+    hoy = timezone.localdate()
+    dias = max(config['DIAS_HISTORIA'], 2 * ESTACION)
+    ids, ventas = _series(hoy, dias)
+    con_ventas = ventas.any(axis=1)
+    ids, ventas = ids[con_ventas], ventas[con_ventas]
+
+    pronosticos = []
+    if len(ids):
+        valores, rmse = ajustar(
+            ventas, config['HORIZONTE'], config['ALFAS'], config['GAMMAS'],
+            config['BETA'], config['AMORTIGUAMIENTO'],
+        )
+        valores = np.round(valores, 2)
+        semana = valores[:, :ESTACION].sum(axis=1)
+        total = valores.sum(axis=1)
+        ahora = timezone.now()
+        pronosticos = [
+            PronosticoVenta(
+                producto_id=pk, generado=ahora, desde=hoy, diario=diario,
+                total_semana=_decimal(s), total_horizonte=_decimal(t), error=_decimal(e, '0.001'),
+            )
+            for pk, diario, s, t, e in zip(ids.tolist(), valores.tolist(), semana.tolist(), total.tolist(), rmse.tolist())
+        ]
+    with transaction.atomic():
+        PronosticoVenta.objects.all().delete()
+        PronosticoVenta.objects.bulk_create(pronosticos, batch_size=2000)
+    return len(pronosticos)
+
+
+def pronostico_categoria(categoria_id):
+    """Suma diaria de los pronósticos de los productos de una categoría (o None)."""
+    filas = list(
+        PronosticoVenta.objects
+        .filter(producto__categoria_id=categoria_id)
+        .values_list('desde', 'generado', 'diario')
+    )
+    if not filas:
+        return None
+    desde, generado, _ = filas[0]
+    diario = np.round(np.array([fila[2] for fila in filas], dtype=np.float64).sum(axis=0), 2)
+    return {
+        'categoria': categoria_id,
+        'generado': generado,
+        'desde': desde,
+        'productos': len(filas),
+        'diario': diario.tolist(),
+        'total_semana': _decimal(diario[:ESTACION].sum()),
+        'total_horizonte': _decimal(diario.sum()),
+    }
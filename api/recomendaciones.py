@@ -0,0 +1,211 @@
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Q
+
+from .models import (
+    DetalleFactura, DetalleFacturaArchivada, DetalleFacturaCliente, DetalleFacturaClienteArchivada, MarcaProceso,
+    ProductoRelacionado,
+)
+
+MARCA = 'recomendaciones'
+LOTE = 20000
+FUENTES = (
+    # (modelo de detalle, clave en la marca de agua, bit de origen en la clave de la cesta)
+    (DetalleFactura, 'factura', 0),
+    (DetalleFacturaCliente, 'factura_cliente', 1),
+)
+# Las facturas archivadas conservan su id: solo las lee la reconstrucción completa
+FUENTES_ARCHIVO = (
+    (DetalleFacturaArchivada, 'factura', 0),
+    (DetalleFacturaClienteArchivada, 'factura_cliente', 1),
+)
+
+
+def _configuracion():
+    config = getattr(settings, 'RECOMENDACIONES', {})
+    return config.get('MAXIMO_CESTA', 100), config.get('VECES_MINIMAS', 2)
+
+
+def _topes():
+    topes = {}
+    for modelo, clave, _ in FUENTES + FUENTES_ARCHIVO:
+        topes[clave] = max(topes.get(clave, 0), modelo.objects.aggregate(m=Max('factura_id'))['m'] or 0)
+    return topes
+
+
+def _cestas(desde, hasta, fuentes=FUENTES):
+    """
+    Pares (cesta, producto) de las facturas con id en (desde, hasta] de ambas
+    fuentes como un arreglo n x 2. La cesta combina id y origen para que una
+    factura de tienda y una de cliente con el mismo id no se mezclen.
+    """
+    partes = []
+    for modelo, clave, origen in fuentes:
+        filas = (
+            modelo.objects
+            .filter(factura_id__gt=desde.get(clave, 0), factura_id__lte=hasta[clave])
+            .order_by()
+            .values_list('factura_id', 'producto_id')
+        )
+        datos = np.fromiter(chain.from_iterable(filas.iterator(chunk_size=LOTE)), dtype=np.int64).reshape(-1, 2)
+        datos[:, 0] = datos[:, 0] * 2 + origen
+        partes.append(datos)
+    return np.concatenate(partes)
+
+
+def _coocurrencias(filas, maximo_cesta):
+    """
+    Cuenta en bloque las co-ocurrencias de las cestas. Devuelve los pares
+    (a, b, veces) con a < b y la diagonal (productos, facturas en que aparecen).
+    Las cestas de más de `maximo_cesta` productos (compras institucionales)
+    solo cuentan en la diagonal.
+    """
+    vacio = np.zeros(0, dtype=np.int64)
+    if not len(filas):
+        return (vacio, vacio, vacio), (vacio, vacio)
+
+    base = int(filas[:, 1].max()) + 1
+    claves = np.unique(filas[:, 0] * base + filas[:, 1])  # Ordena por cesta y producto y quita repetidos
+    cestas, productos = claves // base, claves % base
+    ids, apariciones = np.unique(productos, return_counts=True)
+
+    _, tamanos = np.unique(cestas, return_counts=True)
+    normales = np.repeat(tamanos, tamanos) <= maximo_cesta
+    cestas, productos = cestas[normales], productos[normales]
+
+    # Producto i con producto i + k de la misma cesta, para cada desplazamiento k
+    izquierda, derecha = [], []
+    for k in range(1, maximo_cesta):
+        if k >= len(cestas):
+            break
+        misma = cestas[:-k] == cestas[k:]
+        if not misma.any():
+            break
+        izquierda.append(productos[:-k][misma])
+        derecha.append(productos[k:][misma])
+    if not izquierda:
+        return (vacio, vacio, vacio), (ids, apariciones)
+
+    pares, veces = np.unique(np.concatenate(izquierda) * base + np.concatenate(derecha), return_counts=True)
+    return (pares // base, pares % base, veces), (ids, apariciones)
+
+
+def _puntuacion(veces, n_a, n_b):
+    return veces / np.sqrt(n_a.astype(np.float64) * n_b)
+
+
+def reconstruir():
+    """
+    Recalcula la matriz completa desde todo el historial de facturas y reemplaza
+    la tabla. Devuelve la cantidad de filas escritas.
+    """
+    maximo_cesta, _ = _configuracion()
+    topes = _topes()
+    (a, b, veces), (ids, apariciones) = _coocurrencias(_cestas({}, topes, FUENTES + FUENTES_ARCHIVO), maximo_cesta)
+
+    # Se guardan todos los pares para que actualizar() sume sobre conteos completos;
+    # VECES_MINIMAS se aplica al leer (relacionados)
+    n_a = apariciones[np.searchsorted(ids, a)]
+    n_b = apariciones[np.searchsorted(ids, b)]
+    puntuacion = _puntuacion(veces, n_a, n_b)
+
+    # Ambas direcciones, para leer los relacionados de un producto con un solo índice
+    origen = np.concatenate([a, b, ids])
+    destino = np.concatenate([b, a, ids])
+    conteo = np.concatenate([veces, veces, apariciones])
+    puntos = np.concatenate([puntuacion, puntuacion, np.ones(len(ids))])
+
+    with transaction.atomic():
+        ProductoRelacionado.objects.all().delete()
+        for inicio in range(0, len(origen), LOTE):
+            fin = inicio + LOTE
+            ProductoRelacionado.objects.bulk_create([
+                ProductoRelacionado(producto_id=p, relacionado_id=r, veces=v, puntuacion=s)
+                for p, r, v, s in zip(
+                    origen[inicio:fin].tolist(), destino[inicio:fin].tolist(),
+                    conteo[inicio:fin].tolist(), puntos[inicio:fin].tolist(),
+                )
+            ])
+        MarcaProceso.objects.update_or_create(nombre=MARCA, defaults={'datos': topes})
+    return len(origen)
+
+
+def actualizar():
+    """
+    Suma a la matriz las facturas posteriores a la marca de agua y recalcula la
+    puntuación de los pares afectados. La primera corrida reconstruye todo.
+    Devuelve la cantidad de filas escritas.
+    """
+    marca = MarcaProceso.objects.filter(nombre=MARCA).first()
+    if marca is None or not marca.datos:
+        return reconstruir()
+
+    maximo_cesta, _ = _configuracion()
+    topes = _topes()
+    (a, b, veces), (ids, apariciones) = _coocurrencias(_cestas(marca.datos, topes), maximo_cesta)
+    if not len(ids):
+        return 0
+
+    incrementos = {}
+    for p, r, v in zip(chain(a.tolist(), b.tolist(), ids.tolist()),
+                       chain(b.tolist(), a.tolist(), ids.tolist()),
+                       chain(veces.tolist(), veces.tolist(), apariciones.tolist())):
+        incrementos[p, r] = v
+
+    afectados = ids.tolist()
+    with transaction.atomic():
+        filas = {
+            (fila.producto_id, fila.relacionado_id): fila
+            for fila in ProductoRelacionado.objects.select_for_update().filter(
+                Q(producto_id__in=afectados) | Q(relacionado_id__in=afectados)
+            )
+        }
+        nuevas = []
+        for clave, incremento in incrementos.items():
+            if clave in filas:
+                filas[clave].veces += incremento
+            else:
+                filas[clave] = ProductoRelacionado(producto_id=clave[0], relacionado_id=clave[1], veces=incremento)
+                nuevas.append(filas[clave])
+
+        # La puntuación depende de la diagonal de ambos productos
+        diagonal = {p: fila.veces for (p, r), fila in filas.items() if p == r}
+        faltantes = {p for clave in filas for p in clave} - diagonal.keys()
+        diagonal.update(
+            ProductoRelacionado.objects
+            .filter(producto_id__in=faltantes, relacionado_id=F('producto_id'))
+            .values_list('producto_id', 'veces')
+        )
+        lista = list(filas.values())
+        puntuacion = _puntuacion(
+            np.array([fila.veces for fila in lista], dtype=np.float64),
+            np.array([diagonal.get(fila.producto_id, fila.veces) for fila in lista]),
+            np.array([diagonal.get(fila.relacionado_id, fila.veces) for fila in lista]),
+        )
+        for fila, valor in zip(lista, puntuacion.tolist()):
+            fila.puntuacion = valor
+
+        existentes = [fila for fila in lista if fila.pk is not None]
+        ProductoRelacionado.objects.bulk_update(existentes, ['veces', 'puntuacion'], batch_size=1000)
+        ProductoRelacionado.objects.bulk_create(nuevas, batch_size=LOTE)
+        marca.datos = topes
+        marca.save(update_fields=['datos', 'actualizado'])
+    return len(lista)
+
+
+def relacionados(producto_id, limite=10):
+    """
+    Los `limite` productos más comprados junto con `producto_id` al menos
+    VECES_MINIMAS veces, en una lectura indexada.
+    """
+    _, veces_minimas = _configuracion()
+    return (
+        ProductoRelacionado.objects
+        .filter(producto_id=producto_id, veces__gte=veces_minimas)
+        .exclude(relacionado_id=producto_id)
+        .select_related('relacionado')
+        .order_by('-puntuacion')[:limite]
+    )
@@ -0,0 +1,144 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import DetalleFactura, DetalleFacturaCliente, Pedidos, Producto, Proveedor, SugerenciaReposicion
+
+
+def _catalogo():
+    """Columnas del catálogo como arreglos alineados y ordenados por id de producto."""
+    ultimo_costo = Subquery(
+        Pedidos.objects
+        .filter(producto=OuterRef('pk'))
+        .order_by('-fecha_pedido', '-id')
+        .values('precio_compra')[:1]
+    )
+    filas = list(
+        Producto.objects
+        .order_by('pk')
+        .annotate(ultimo_costo=ultimo_costo)
+        .values_list('pk', 'stock', 'proveedor_id', 'ultimo_costo', 'precio_sin_igv')
+    )
+    if not filas:
+        return None
+    ids, stock, proveedores, ultimo, sin_igv = zip(*filas)
+    costo = [u if u is not None else p for u, p in zip(ultimo, sin_igv)]
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array(stock, dtype=np.float64),
+        np.array(proveedores, dtype=np.int64),
+        np.array(costo, dtype=object),
+    )
+
+
+def _acumular(ids, matriz, filas):
+    """Suma filas [(producto_id, v1, v2, ...)] en `matriz` alineada con `ids`."""
+    filas = list(filas)
+    if not filas:
+        return
+    datos = np.array(filas, dtype=np.float64)
+    datos = np.nan_to_num(datos)  # Sum(filter=...) devuelve NULL en ventanas sin ventas
+    posiciones = np.searchsorted(ids, datos[:, 0].astype(np.int64))
+    validas = (posiciones < len(ids)) & (ids[np.minimum(posiciones, len(ids) - 1)] == datos[:, 0])
+    np.add.at(matriz, posiciones[validas], datos[validas, 1:])
+
+
+def _ventas_por_ventana(ids, ventanas):
+    """Unidades vendidas por producto en cada ventana: matriz (productos x ventanas)."""
+    ventas = np.zeros((len(ids), len(ventanas)), dtype=np.float64)
+    hoy = timezone.localdate()
+    ahora = timezone.now()
+
+    # Una consulta agrupada por fuente, con una suma condicional por ventana
+    tienda = {
+        f'v{dias}': Sum('cantidad', filter=Q(factura__fecha__gte=hoy - timedelta(days=dias)))
+        for dias in ventanas
+    }
+    _acumular(ids, ventas, (
+        DetalleFactura.objects
+        .filter(factura__fecha__gte=hoy - timedelta(days=max(ventanas)))
+        .values('producto')
+        .annotate(**tienda)
+        .values_list('producto', *tienda)
+    ))
+    clientes = {
+        f'v{dias}': Sum('cantidad', filter=Q(factura__fecha__gte=ahora - timedelta(days=dias)))
+        for dias in ventanas
+    }
+    _acumular(ids, ventas, (
+        DetalleFacturaCliente.objects
+        .filter(factura__fecha__gte=ahora - timedelta(days=max(ventanas)))
+        .values('producto')
+        .annotate(**clientes)
+        .values_list('producto', *clientes)
+    ))
+    return ventas
+
+
+def calcular_sugerencias():
+    """
+    Calcula para todo el catálogo la cantidad a reponer. Devuelve una lista de
+    SugerenciaReposicion sin guardar (solo productos con cantidad > 0).
+    """
+    config = settings.INVENTARIO
+    ventanas = np.array(config['VENTANAS_VENTAS'], dtype=np.float64)
+    pesos = np.array(config['PESOS_VENTANAS'], dtype=np.float64)
+
+    catalogo = _catalogo()
+    if catalogo is None:
+        return []
+    ids, stock, proveedores, costo = catalogo
+
+    # Velocidad combinada (unidades/día): promedio ponderado de las ventanas
+    ventas = _ventas_por_ventana(ids, config['VENTANAS_VENTAS'])
+    velocidad = (ventas / ventanas) @ (pesos / pesos.sum())
+
+    en_camino = np.zeros((len(ids), 1), dtype=np.float64)
+    _acumular(ids, en_camino, (
+        Pedidos.objects
+        .filter(estado__in=['Pendiente', 'En Proceso'])
+        .values('producto')
+        .annotate(total=Sum('cantidad'))
+        .values_list('producto', 'total')
+    ))
+    en_camino = en_camino[:, 0]
+
+    # Tiempo de reposición de cada producto según su proveedor
+    plazos = dict(Proveedor.objects.values_list('pk', 'dias_entrega'))
+    claves = np.array(sorted(plazos), dtype=np.int64)
+    valores = np.array([plazos[k] for k in claves], dtype=np.float64)
+    posiciones = np.clip(np.searchsorted(claves, proveedores), 0, max(len(claves) - 1, 0))
+    dias_entrega = valores[posiciones] if len(claves) else np.zeros(len(ids))
+
+    objetivo = velocidad * (dias_entrega + config['DIAS_COBERTURA'] + config['DIAS_SEGURIDAD'])
+    objetivo = np.maximum(objetivo, config['STOCK_MINIMO'])
+    cantidad = np.ceil(np.maximum(objetivo - stock - en_camino, 0)).astype(np.int64)
+
+    ahora = timezone.now()
+    return [
+        SugerenciaReposicion(
+            proveedor_id=int(proveedores[i]),
+            producto_id=int(ids[i]),
+            generada=ahora,
+            cantidad=int(cantidad[i]),
+            velocidad=Decimal(f"{velocidad[i]:.3f}"),
+            stock=int(stock[i]),
+            en_camino=int(en_camino[i]),
+            precio_compra=costo[i],
+        )
+        for i in np.flatnonzero(cantidad)
+    ]
+
+
+def generar_sugerencias():
+    """Reemplaza las sugerencias vigentes por las de una nueva corrida."""
+    sugerencias = calcular_sugerencias()
+    with transaction.atomic():
+        SugerenciaReposicion.objects.all().delete()
+        SugerenciaReposicion.objects.bulk_create(sugerencias, batch_size=2000)
+    return sugerencias
@@ -0,0 +1,104 @@
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from .models import (
+    DetalleFacturaCliente, DetalleFacturaClienteArchivada, FacturaCliente, FacturaClienteArchivada, Producto,
+    ResumenCliente,
+)
+
+
+def recalcular(cliente_ids=None):
+    """
+    Reconstruye los resúmenes desde las facturas (vivas y archivadas) con una
+    consulta agrupada por tabla. Sin argumentos recalcula todos; los clientes sin
+    facturas quedan en cero.
+    """
+    if cliente_ids is not None:
+        cliente_ids = set(cliente_ids)
+    filas = {}
+    for modelo in (FacturaCliente, FacturaClienteArchivada):
+        facturas = modelo.objects.all()
+        if cliente_ids is not None:
+            facturas = facturas.filter(cliente_id__in=cliente_ids)
+        for fila in facturas.values('cliente').annotate(
+            total=Sum('total'), compras=Count('id'), ultima=Max('fecha'),
+        ).order_by():
+            previa = filas.setdefault(fila['cliente'], {'total': 0, 'compras': 0, 'ultima': None})
+            previa['total'] += fila['total'] or 0
+            previa['compras'] += fila['compras']
+            if previa['ultima'] is None or fila['ultima'] > previa['ultima']:
+                previa['ultima'] = fila['ultima']
+    if cliente_ids is None:
+        ResumenCliente.objects.exclude(cliente_id__in=filas.keys()).update(
+            total_gastado=0, compras=0, ultima_compra=None, actualizado=timezone.now(),
+        )
+    vacia = {'total': 0, 'compras': 0, 'ultima': None}
+    resumenes = [
+        ResumenCliente(
+            cliente_id=pk, total_gastado=fila['total'] or 0, compras=fila['compras'],
+            ultima_compra=fila['ultima'], actualizado=timezone.now(),
+        )
+        for pk, fila in ((pk, filas.get(pk, vacia)) for pk in (cliente_ids if cliente_ids is not None else filas))
+    ]
+    ResumenCliente.objects.bulk_create(
+        resumenes,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['cliente'],
+        update_fields=['total_gastado', 'compras', 'ultima_compra', 'actualizado'],
+    )
+    return len(resumenes)
+
+
+def registrar_compra(factura):
+    """Suma una factura nueva al resumen de su cliente (en la transacción de la venta)."""
+    actualizados = ResumenCliente.objects.filter(cliente_id=factura.cliente_id).update(
+        total_gastado=F('total_gastado') + factura.total,
+        compras=F('compras') + 1,
+        ultima_compra=factura.fecha,
+        actualizado=timezone.now(),
+    )
+    if not actualizados:
+        # Primer resumen del cliente: se arma desde su historial, que ya incluye esta factura
+        recalcular([factura.cliente_id])
+
+
+def resumen(cliente_id):
+    try:
+        return ResumenCliente.objects.get(cliente_id=cliente_id)
+    except ResumenCliente.DoesNotExist:
+        recalcular([cliente_id])
+        return ResumenCliente.objects.get(cliente_id=cliente_id)
+
+
+def recompra(cliente_id, limite=10):
+    """
+    Productos que el cliente compra con más frecuencia, archivo incluido: una
+    consulta agrupada por tabla de detalles y una por los datos de los productos.
+    """
+    productos = {}
+    for modelo in (DetalleFacturaCliente, DetalleFacturaClienteArchivada):
+        filas = (
+            modelo.objects
+            .filter(factura__cliente_id=cliente_id)
+            .values('producto_id')
+            .annotate(compras=Count('factura', distinct=True), unidades=Sum('cantidad'), ultima_compra=Max('factura__fecha'))
+            .order_by()
+        )
+        # Cada factura está entera en la tabla viva o en el archivo: los conteos se suman
+        for fila in filas:
+            acumulado = productos.setdefault(fila['producto_id'], {'compras': 0, 'unidades': 0, 'ultima_compra': None})
+            acumulado['compras'] += fila['compras']
+            acumulado['unidades'] += fila['unidades']
+            if acumulado['ultima_compra'] is None or fila['ultima_compra'] > acumulado['ultima_compra']:
+                acumulado['ultima_compra'] = fila['ultima_compra']
+
+    datos = {
+        fila['producto_id']: fila
+        for fila in Producto.objects.filter(pk__in=productos).values('nombre', 'precio', 'stock', producto_id=F('pk'))
+    }
+    orden = sorted(
+        (pk for pk in productos if pk in datos),
+        key=lambda pk: (-productos[pk]['compras'], -productos[pk]['unidades'], pk),
+    )
+    return [{**datos[pk], **productos[pk]} for pk in orden[:limite]]
@@ -0,0 +1,164 @@
+"""
+Sentencias preparadas del lado del servidor para las consultas más frecuentes.
+
+En PostgreSQL, con settings.SENTENCIAS_PREPARADAS activo, cada conexión prepara
+(PREPARE) una sola vez las sentencias de este módulo y luego solo las ejecuta
+(EXECUTE), sin volver a analizar ni planificar el SQL. Las sentencias tienen forma
+fija: las listas se pasan como arreglos (unnest / ANY) para que el mismo plan sirva
+para cualquier cantidad de líneas. Con otro motor, o desactivado, cada función usa
+la consulta equivalente del ORM.
+
+No usar con un pooler en modo transacción (p. ej. PgBouncer transaction pooling):
+las sentencias preparadas viven en la sesión del servidor.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models import Count, Sum
+from django.dispatch import receiver
+
+from .models import DetalleFactura, DetalleFacturaCliente, Factura, FacturaCliente, Lote, Producto, StockSucursal
+
+COLUMNAS_PRODUCTO = ('id', 'nombre', 'precio', 'stock')
+
+
+def _sentencias():
+    producto = Producto._meta.db_table
+    lote = Lote._meta.db_table
+    stock_sucursal = StockSucursal._meta.db_table
+    insertar_detalle = (
+        "INSERT INTO {tabla} (factura_id, producto_id, cantidad, precio_unitario, subtotal) "
+        "SELECT $1, d.producto_id, d.cantidad, d.precio_unitario, d.subtotal "
+        "FROM unnest($2::bigint[], $3::integer[], $4::numeric[], $5::numeric[]) "
+        "AS d(producto_id, cantidad, precio_unitario, subtotal)"
+    )
+    totales = (
+        "SELECT COALESCE(SUM(total), 0), COALESCE(SUM(subtotal), 0), COALESCE(SUM(igv), 0), COUNT(*) "
+        "FROM {tabla} WHERE fecha >= $1 AND fecha < $2"
+    )
+    return {
+        'productos_por_id': (
+            ('bigint[]',),
+            f"SELECT {', '.join(COLUMNAS_PRODUCTO)} FROM {producto} WHERE id = ANY($1)",
+        ),
+        'insertar_detalle_factura': (
+            ('bigint', 'bigint[]', 'integer[]', 'numeric[]', 'numeric[]'),
+            insertar_detalle.format(tabla=DetalleFactura._meta.db_table),
+        ),
+        'insertar_detalle_factura_cliente': (
+            ('bigint', 'bigint[]', 'integer[]', 'numeric[]', 'numeric[]'),
+            insertar_detalle.format(tabla=DetalleFacturaCliente._meta.db_table),
+        ),
+        'deltas_stock': (
+            ('bigint[]', 'integer[]', 'timestamptz'),
+            f"UPDATE {producto} AS p SET stock = p.stock + d.delta, actualizado = $3 "
+            f"FROM unnest($1, $2) AS d(id, delta) WHERE p.id = d.id",
+        ),
+        'deltas_stock_sucursal': (
+            ('bigint[]', 'integer[]', 'bigint', 'timestamptz'),
+            f"UPDATE {stock_sucursal} AS s SET stock = s.stock + d.delta, actualizado = $4 "
+            f"FROM unnest($1, $2) AS d(producto_id, delta) "
+            f"WHERE s.sucursal_id = $3 AND s.producto_id = d.producto_id",
+        ),
+        'deltas_lote': (
+            ('bigint[]', 'integer[]'),
+            f"UPDATE {lote} AS l SET cantidad = l.cantidad + d.delta "
+            f"FROM unnest($1, $2) AS d(id, delta) WHERE l.id = d.id",
+        ),
+        'totales_factura': (
+            ('date', 'date'),
+            totales.format(tabla=Factura._meta.db_table),
+        ),
+        'totales_factura_sucursal': (
+            ('date', 'date', 'bigint'),
+            totales.format(tabla=Factura._meta.db_table) + " AND sucursal_id = $3",
+        ),
+        'totales_factura_cliente': (
+            ('timestamptz', 'timestamptz'),
+            totales.format(tabla=FacturaCliente._meta.db_table),
+        ),
+    }
+
+
+SENTENCIAS = _sentencias()
+
+
+@receiver(connection_created)
+def _nueva_conexion(sender, connection, **kwargs):
+    # Las sentencias preparadas no sobreviven a la conexión que las creó
+    connection.sentencias_preparadas = set()
+
+
+def habilitadas():
+    return getattr(settings, 'SENTENCIAS_PREPARADAS', False) and connection.vendor == 'postgresql'
+
+
+def ejecutar(cursor, nombre, parametros):
+    """Ejecuta la sentencia `nombre`, preparándola antes si la conexión aún no la tiene."""
+    preparadas = getattr(connection, 'sentencias_preparadas', None)
+    if preparadas is None:
+        preparadas = connection.sentencias_preparadas = set()
+    if nombre not in preparadas:
+        tipos, sql = SENTENCIAS[nombre]
+        cursor.execute(f"PREPARE {nombre} ({', '.join(tipos)}) AS {sql}")
+        preparadas.add(nombre)
+    cursor.execute(f"EXECUTE {nombre} ({', '.join(['%s'] * len(parametros))})", parametros)
+
+
+def productos_por_id(ids):
+    """{pk: Producto} con las columnas que usa la venta (el resto queda diferido)."""
+    ids = list(set(ids))
+    if not habilitadas():
+        return Producto.objects.only(*COLUMNAS_PRODUCTO).in_bulk(ids)
+    with connection.cursor() as cursor:
+        ejecutar(cursor, 'productos_por_id', [ids])
+        filas = cursor.fetchall()
+    return {fila[0]: Producto.from_db(connection.alias, COLUMNAS_PRODUCTO, fila) for fila in filas}
+
+
+def insertar_detalles(modelo, factura, filas):
+    """Inserta las líneas [(producto_id, cantidad, precio_unitario, subtotal), ...] de una factura."""
+    if not filas:
+        return
+    if not habilitadas():
+        modelo.objects.bulk_create([
+            modelo(factura=factura, producto_id=producto_id, cantidad=cantidad,
+                   precio_unitario=precio_unitario, subtotal=subtotal)
+            for producto_id, cantidad, precio_unitario, subtotal in filas
+        ])
+        return
+    nombre = 'insertar_detalle_factura' if modelo is DetalleFactura else 'insertar_detalle_factura_cliente'
+    with connection.cursor() as cursor:
+        ejecutar(cursor, nombre, [factura.pk, *map(list, zip(*filas))])
+
+
+def aplicar_deltas(nombre, deltas, *extra):
+    """Suma `deltas` {pk: delta} con la sentencia 'deltas_stock', 'deltas_stock_sucursal' o 'deltas_lote'."""
+    with connection.cursor() as cursor:
+        ejecutar(cursor, nombre, [list(deltas), list(deltas.values()), *extra])
+
+
+def totales_facturas(modelo, desde, hasta, sucursal_id=None):
+    """
+    (total, subtotal, igv, cantidad) de las facturas con fecha en [desde, hasta),
+    opcionalmente solo las de una sucursal (facturas de tienda).
+    """
+    if not habilitadas():
+        facturas = modelo.objects.filter(fecha__gte=desde, fecha__lt=hasta)
+        if sucursal_id is not None:
+            facturas = facturas.filter(sucursal_id=sucursal_id)
+        totales = facturas.aggregate(
+            total=Sum('total'), subtotal=Sum('subtotal'), igv=Sum('igv'), cantidad=Count('id'),
+        )
+        return (totales['total'] or 0, totales['subtotal'] or 0, totales['igv'] or 0, totales['cantidad'])
+    parametros = [desde, hasta]
+    if modelo is not Factura:
+        nombre = 'totales_factura_cliente'
+    elif sucursal_id is not None:
+        nombre = 'totales_factura_sucursal'
+        parametros.append(sucursal_id)
+    else:
+        nombre = 'totales_factura'
+    with connection.cursor() as cursor:
+        ejecutar(cursor, nombre, parametros)
+        return cursor.fetchone()
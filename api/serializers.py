@@ -1,10 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Sum
+from django.utils import timezone
 from .models import (
     DetalleFacturaCliente, FacturaCliente, Persona, Empleado, Clientes, Proveedor, 
-    Categoria, Producto, Medicamento, Factura,  Pedidos, DetalleFactura
+    Categoria, Producto, Medicamento, Factura,  Pedidos, DetalleFactura, MovimientoStock, Lote,
+    AlertaInventario, OrdenCompra, ResumenCliente, ProductoRelacionado,
+    PronosticoVenta, Sucursal, StockSucursal, TransferenciaStock, FacturaArchivada, DetalleFacturaArchivada,
+    FacturaClienteArchivada, DetalleFacturaClienteArchivada, FacturacionMensual,
 )
+from .inventario import StockInsuficiente, movimientos_fefo, registrar_movimientos
+from .precios import desglosar, precio_con_igv, redondear
+from .pedidos import TransicionInvalida, validar_transicion
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -34,7 +42,7 @@ class EmpleadoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Empleado
-        fields = ['persona', 'cargo', 'fecha_contratacion', 'salario', 'usuario']
+        fields = ['persona', 'cargo', 'fecha_contratacion', 'salario', 'usuario', 'sucursal']
 
     def create(self, validated_data):
         persona_data = validated_data.pop('persona')
@@ -131,36 +139,155 @@ class ClientesSerializer(serializers.ModelSerializer):
 
         return instance
 
+class RelacionPrecargada(serializers.PrimaryKeyRelatedField):
+    """Resuelve el pk desde los objetos que el serializer de lista trajo en una consulta."""
+    precargados = None
+
+    def to_internal_value(self, data):
+        if self.precargados is not None and not isinstance(data, bool):
+            try:
+                objeto = self.precargados.get(int(data))
+            except (TypeError, ValueError):
+                objeto = None
+            if objeto is not None:
+                return objeto
+        return super().to_internal_value(data)
+
+class ListaBulkSerializer(serializers.ListSerializer):
+    """
+    Alta y modificación en bloque: valida cada elemento con el serializer hijo y
+    escribe con bulk_create / bulk_update. Para modificar, cada elemento debe
+    incluir su `id` y el serializer se construye con las instancias a modificar.
+    """
+    batch_size = 500
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            # Una consulta por relación en lugar de una por elemento
+            for nombre, campo in self.child.fields.items():
+                if isinstance(campo, RelacionPrecargada) and not campo.read_only:
+                    pks = set()
+                    for item in data:
+                        try:
+                            pks.add(int(item.get(nombre)))
+                        except (AttributeError, TypeError, ValueError):
+                            pass
+                    campo.precargados = campo.get_queryset().in_bulk(pks)
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        if self.instance is None:
+            return self.child.run_validation(data)
+
+        if not hasattr(self, '_instancias'):
+            self._instancias = {instancia.pk: instancia for instancia in self.instance}
+        try:
+            instancia = self._instancias.get(int(data.get('id')))
+        except (AttributeError, TypeError, ValueError):
+            instancia = None
+        if instancia is None:
+            raise serializers.ValidationError({'id': ["Debe indicar el id de un registro existente."]})
+
+        self.child.instance = instancia
+        self.child.initial_data = data
+        validado = self.child.run_validation(data)
+        validado['id'] = instancia.pk
+        return validado
+
+    def preparar(self, instancia):
+        """Ajustes que haría Model.save() y que bulk_create/bulk_update omiten."""
+
+    def create(self, validated_data):
+        modelo = self.child.Meta.model
+        instancias = [modelo(**datos) for datos in validated_data]
+        for instancia in instancias:
+            self.preparar(instancia)
+        return modelo.objects.bulk_create(instancias, batch_size=self.batch_size)
+
+    def update(self, instance, validated_data):
+        campos = set()
+        actualizadas = []
+        for datos in validated_data:
+            instancia = self._instancias[datos.pop('id')]
+            for campo, valor in datos.items():
+                setattr(instancia, campo, valor)
+            campos.update(datos)
+            self.preparar(instancia)
+            actualizadas.append(instancia)
+        campos |= set(getattr(self, 'campos_preparados', ()))
+        if campos:
+            self.child.Meta.model.objects.bulk_update(actualizadas, list(campos), batch_size=self.batch_size)
+        return actualizadas
+
 class ProveedorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Proveedor
         fields = '__all__'
+        list_serializer_class = ListaBulkSerializer
         
 class ProveedorTopSerializer(serializers.ModelSerializer):
-    total_pedidos = serializers.SerializerMethodField()
+    """Espera el queryset anotado con total_pedidos=Count('pedidos') y monto_total=Sum('pedidos__total_pedido')."""
+    total_pedidos = serializers.IntegerField(read_only=True)
     monto_total = serializers.SerializerMethodField()
 
     class Meta:
         model = Proveedor
         fields = ['id', 'nombre', 'total_pedidos', 'monto_total']
 
-    def get_total_pedidos(self, obj):
-        # Asegúrate de que la relación 'pedidos' existe
-        return obj.pedidos.count()
-
     def get_monto_total(self, obj):
-        # Calcular la suma total de los pedidos del proveedor
-        return obj.pedidos.aggregate(total=Sum('total_pedido'))['total'] or 0.0
+        return obj.monto_total or 0.0
 
 class CategoriaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Categoria
         fields = '__all__'
+        list_serializer_class = ListaBulkSerializer
+
+class ProductoListSerializer(ListaBulkSerializer):
+    campos_preparados = ('precio', 'actualizado')
+
+    def preparar(self, producto):
+        producto.precio = precio_con_igv(producto.precio_sin_igv)
+        producto.actualizado = timezone.now()
+
+    def create(self, validated_data):
+        productos = super().create(validated_data)
+        # El stock inicial de cada producto queda como saldo de apertura en el kardex
+        registrar_movimientos(
+            [MovimientoStock(producto=producto, cantidad=producto.stock, motivo='APERTURA') for producto in productos],
+            actualizar_stock=False,
+        )
+        return productos
+
+    def update(self, instance, validated_data):
+        # Los cambios de stock se registran como ajustes del kardex, no se escriben directo
+        nuevos = {datos['id']: datos.pop('stock') for datos in validated_data if 'stock' in datos}
+        with transaction.atomic():
+            # Los ajustes se calculan sobre el stock vigente, con las filas bloqueadas
+            actuales = dict(
+                Producto.objects.select_for_update().filter(pk__in=nuevos).order_by('pk').values_list('pk', 'stock')
+            )
+            productos = super().update(instance, validated_data)
+            ajustes = [
+                MovimientoStock(producto_id=pk, cantidad=stock - actuales[pk], motivo='AJUSTE')
+                for pk, stock in nuevos.items()
+                if stock != actuales[pk]
+            ]
+            if ajustes:
+                try:
+                    registrar_movimientos(ajustes)
+                except StockInsuficiente as e:
+                    raise serializers.ValidationError({'stock': str(e)})
+                stocks = dict(Producto.objects.filter(pk__in=[p.pk for p in productos]).values_list('pk', 'stock'))
+                for producto in productos:
+                    producto.stock = stocks[producto.pk]
+        return productos
 
 class ProductoSerializer(serializers.ModelSerializer):
     proveedor_nombre = serializers.CharField(source='proveedor.nombre', read_only=True)
     categoria_nombre = serializers.CharField(source='categoria.nombre', read_only=True)
     imagen_url = serializers.SerializerMethodField()
+    serializer_related_field = RelacionPrecargada
 
     class Meta:
         model = Producto
@@ -170,6 +297,7 @@ class ProductoSerializer(serializers.ModelSerializer):
             'proveedor', 'proveedor_nombre', 'imagen', 'imagen_url'
         ]
         read_only_fields = ['precio']  # El campo `precio` es de solo lectura.
+        list_serializer_class = ProductoListSerializer
 
     def get_imagen_url(self, obj):
         request = self.context.get('request')
@@ -183,10 +311,110 @@ class ProductoSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("La fecha de vencimiento no puede ser en el pasado.")
         return value
 
+    def create(self, validated_data):
+        producto = super().create(validated_data)
+        # El stock inicial queda como saldo de apertura en el kardex
+        registrar_movimientos(
+            [MovimientoStock(producto=producto, cantidad=producto.stock, motivo='APERTURA')],
+            actualizar_stock=False,
+        )
+        return producto
+
     def update(self, instance, validated_data):
         if 'imagen' in validated_data and not validated_data['imagen']:
             validated_data.pop('imagen')
-        return super().update(instance, validated_data)
+        # Los cambios de stock se registran como ajuste en el kardex; save() no escribe el stock
+        stock = validated_data.pop('stock', None)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if stock is not None:
+                # El ajuste se calcula sobre el stock vigente, no sobre el leído al cargar
+                actual = Producto.objects.select_for_update().values_list('stock', flat=True).get(pk=instance.pk)
+                if stock != actual:
+                    try:
+                        registrar_movimientos([
+                            MovimientoStock(producto=instance, cantidad=stock - actual, motivo='AJUSTE')
+                        ])
+                    except StockInsuficiente as e:
+                        raise serializers.ValidationError({'stock': str(e)})
+            instance.refresh_from_db(fields=['stock'])
+        return instance
+
+class MovimientoStockSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MovimientoStock
+        fields = ['id', 'fecha', 'motivo', 'cantidad', 'sucursal', 'factura', 'factura_cliente', 'pedido', 'transferencia']
+
+class LoteSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
+
+    class Meta:
+        model = Lote
+        fields = [
+            'id', 'producto', 'producto_nombre', 'pedido', 'sucursal', 'codigo', 'fecha_vencimiento',
+            'fecha_ingreso', 'cantidad_inicial', 'cantidad'
+        ]
+
+class SucursalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Sucursal
+        fields = ['id', 'nombre', 'direccion', 'activa']
+
+class StockSucursalSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
+
+    class Meta:
+        model = StockSucursal
+        fields = ['producto', 'producto_nombre', 'stock', 'actualizado']
+
+class LineaTransferenciaSerializer(serializers.Serializer):
+    producto = serializers.PrimaryKeyRelatedField(queryset=Producto.objects.all())
+    cantidad = serializers.IntegerField(min_value=1)
+
+class TransferenciaStockSerializer(serializers.ModelSerializer):
+    """Sin origen o sin destino se entiende el almacén central."""
+    lineas = LineaTransferenciaSerializer(many=True, write_only=True, allow_empty=False)
+    movimientos = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TransferenciaStock
+        fields = ['id', 'origen', 'destino', 'fecha', 'usuario', 'nota', 'lineas', 'movimientos']
+        read_only_fields = ['fecha', 'usuario']
+
+    def get_movimientos(self, obj):
+        # Solo las entradas al destino: una por lote trasladado
+        return [
+            {'producto': m.producto_id, 'cantidad': m.cantidad, 'lote': m.lote_id}
+            for m in obj.movimientos.all()
+            if m.sucursal_id == obj.destino_id
+        ]
+
+    def validate(self, attrs):
+        if attrs.get('origen') == attrs.get('destino'):
+            raise serializers.ValidationError("El origen y el destino deben ser distintos.")
+        return attrs
+
+class ProductoRelacionadoSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='relacionado_id', read_only=True)
+    nombre = serializers.CharField(source='relacionado.nombre', read_only=True)
+    precio = serializers.DecimalField(source='relacionado.precio', max_digits=10, decimal_places=2, read_only=True)
+    stock = serializers.IntegerField(source='relacionado.stock', read_only=True)
+
+    class Meta:
+        model = ProductoRelacionado
+        fields = ['id', 'nombre', 'precio', 'stock', 'veces', 'puntuacion']
+
+class PronosticoVentaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PronosticoVenta
+        fields = ['producto', 'generado', 'desde', 'diario', 'total_semana', 'total_horizonte', 'error']
+
+class AlertaInventarioSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
+
+    class Meta:
+        model = AlertaInventario
+        fields = ['id', 'producto', 'producto_nombre', 'sucursal', 'tipo', 'mensaje', 'activa', 'creada', 'resuelta']
 
 class MedicamentoSerializer(serializers.ModelSerializer):
     producto = serializers.PrimaryKeyRelatedField(queryset=Producto.objects.all())
@@ -215,27 +443,54 @@ class FacturaSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Factura
-        fields = ['id', 'empleado', 'cliente', 'fecha', 'total', 'subtotal', 'igv', 'detalles']
+        fields = ['id', 'uuid', 'empleado', 'sucursal', 'cliente', 'fecha', 'total', 'subtotal', 'igv', 'detalles']
+        read_only_fields = ['sucursal']  # La define el empleado que emite la factura
 
     def create(self, validated_data):
-        # Crear la factura
+        # Crear la factura en la sucursal del empleado
+        validated_data['sucursal'] = validated_data['empleado'].sucursal
         factura = super().create(validated_data)
 
         # Actualizar el stock de los productos
-        for detalle in factura.detalles.all():
+        lineas = []
+        for detalle in factura.detalles.select_related('producto'):
             producto = detalle.producto
             cantidad_vendida = detalle.cantidad
 
-            # Verificar si hay suficiente stock
-            if producto.stock < cantidad_vendida:
+            # Verificar si hay suficiente stock (el de los locales lo controla el kardex)
+            if factura.sucursal_id is None and producto.stock < cantidad_vendida:
                 raise serializers.ValidationError(f"No hay suficiente stock para el producto {producto.nombre}.")
 
-            # Restar el stock del producto
-            producto.stock -= cantidad_vendida
-            producto.save()
+            lineas.append((producto.id, cantidad_vendida))
+
+        # Restar el stock de los productos por lotes (FEFO)
+        try:
+            registrar_movimientos(movimientos_fefo(lineas, 'VENTA', factura=factura, sucursal_id=factura.sucursal_id))
+        except StockInsuficiente as e:
+            raise serializers.ValidationError(str(e))
 
         return factura
 
+class FacturaListaSerializer(serializers.ModelSerializer):
+    """Factura sin sus detalles para los listados; `lineas` viene anotado en el queryset."""
+    lineas = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Factura
+        fields = ['id', 'uuid', 'empleado', 'sucursal', 'cliente', 'fecha', 'total', 'lineas']
+
+class DetalleSincronizacionSerializer(serializers.Serializer):
+    producto = serializers.IntegerField()
+    cantidad = serializers.IntegerField(min_value=1)
+
+class FacturaSincronizacionSerializer(serializers.Serializer):
+    """Factura emitida sin conexión por un punto de venta."""
+    uuid = serializers.UUIDField()
+    empleado = serializers.IntegerField()
+    cliente = serializers.CharField(max_length=200, required=False, default="Cliente")
+    fecha = serializers.DateField()
+    detalles = DetalleSincronizacionSerializer(many=True, allow_empty=False)
+
 class PedidosSerializer(serializers.ModelSerializer):
     producto = ProductoSerializer(read_only=True)  
     proveedor = ProveedorSerializer(read_only=True)
@@ -255,21 +510,90 @@ class PedidosSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'fecha_pedido', 'proveedor', 'proveedor_id', 
             'producto', 'producto_id', 'cantidad', 'precio_compra', 
-            'subtotal', 'igv', 'total_pedido', 'estado'
+            'subtotal', 'igv', 'total_pedido', 'estado', 'lote', 'fecha_vencimiento', 'sucursal'
         ]
 
-    def update(self, instance, validated_data):
-        # Lógica personalizada si se actualiza el estado
-        estado_anterior = instance.estado
-        estado_nuevo = validated_data.get('estado', instance.estado)
+    def validate_estado(self, value):
+        # El ingreso de stock al completar lo aplica Pedidos.save() mediante la transición
+        if self.instance is not None:
+            try:
+                validar_transicion(self.instance.estado, value)
+            except TransicionInvalida as e:
+                raise serializers.ValidationError(str(e))
+        return value
 
-        if estado_anterior != 'Completado' and estado_nuevo == 'Completado':
-            producto = validated_data.get('producto', instance.producto)
-            if producto:
-                producto.stock += instance.cantidad
-                producto.save()
+class LineaOrdenCompraSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
 
-        return super().update(instance, validated_data)
+    class Meta:
+        model = Pedidos
+        fields = [
+            'id', 'producto', 'producto_nombre', 'cantidad', 'precio_compra',
+            'subtotal', 'igv', 'total_pedido', 'estado', 'lote', 'fecha_vencimiento', 'sucursal'
+        ]
+        read_only_fields = ['subtotal', 'igv', 'total_pedido', 'estado']
+
+class OrdenCompraSerializer(serializers.ModelSerializer):
+    proveedor_nombre = serializers.CharField(source='proveedor.nombre', read_only=True)
+    lineas = LineaOrdenCompraSerializer(many=True)
+
+    class Meta:
+        model = OrdenCompra
+        fields = [
+            'id', 'proveedor', 'proveedor_nombre', 'fecha', 'estado',
+            'subtotal', 'igv', 'total', 'recibida', 'lineas'
+        ]
+        read_only_fields = ['subtotal', 'igv', 'total', 'recibida']
+
+    def validate_lineas(self, value):
+        if not value:
+            raise serializers.ValidationError("La orden debe tener al menos una línea.")
+        return value
+
+    def validate_estado(self, value):
+        if value == 'Recibida':
+            raise serializers.ValidationError("Use la acción 'recibir' para ingresar la orden.")
+        return value
+
+    def _crear_lineas(self, orden, lineas_data):
+        lineas = []
+        for linea_data in lineas_data:
+            linea = Pedidos(
+                orden=orden, proveedor=orden.proveedor, fecha_pedido=orden.fecha,
+                estado='Pendiente', **linea_data
+            )
+            # bulk_create no pasa por Pedidos.save(): calcular importes aquí
+            linea.subtotal = linea.calcular_subtotal()
+            linea.igv = linea.calcular_igv()
+            linea.total_pedido = linea.calcular_total()
+            lineas.append(linea)
+        Pedidos.objects.bulk_create(lineas)
+        orden.recalcular_totales()
+
+    def create(self, validated_data):
+        lineas_data = validated_data.pop('lineas')
+        with transaction.atomic():
+            orden = OrdenCompra.objects.create(**validated_data)
+            self._crear_lineas(orden, lineas_data)
+        return orden
+
+    def update(self, instance, validated_data):
+        if instance.estado == 'Recibida':
+            raise serializers.ValidationError("La orden ya fue recibida y no se puede modificar.")
+        lineas_data = validated_data.pop('lineas', None)
+        with transaction.atomic():
+            if lineas_data is not None:
+                # Las líneas completadas ya ingresaron stock y lotes al kardex: no se reemplazan
+                completadas = instance.lineas.select_for_update().filter(estado='Completado').exists()
+                if completadas:
+                    raise serializers.ValidationError(
+                        {'lineas': ["La orden tiene líneas completadas: ya no se pueden reemplazar."]}
+                    )
+            instance = super().update(instance, validated_data)
+            if lineas_data is not None:
+                instance.lineas.all().delete()
+                self._crear_lineas(instance, lineas_data)
+        return instance
 
 class DetalleFacturaClienteSerializer(serializers.ModelSerializer):
     producto = serializers.StringRelatedField()  # Nombre del producto
@@ -285,6 +609,11 @@ class DetalleFacturaClienteSerializer(serializers.ModelSerializer):
         data['subtotal'] = cantidad * precio_unitario
         return data
 
+class ResumenClienteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ResumenCliente
+        fields = ['cliente', 'total_gastado', 'compras', 'ultima_compra']
+
 class FacturaClienteSerializer(serializers.ModelSerializer):
   
     cliente = serializers.SerializerMethodField()
@@ -310,9 +639,51 @@ class FacturaClienteSerializer(serializers.ModelSerializer):
         for detalle_data in detalles_data:
             DetalleFacturaCliente.objects.create(factura=factura, **detalle_data)
         
-        factura.subtotal = sum(detalle.subtotal for detalle in factura.detalles.all())
-        factura.igv = factura.subtotal * 0.18
-        factura.total = factura.subtotal + factura.igv
+        # Los subtotales de los detalles ya incluyen IGV
+        factura.total = redondear(sum(detalle.subtotal for detalle in factura.detalles.all()))
+        factura.subtotal, factura.igv = desglosar(factura.total)
         factura.save()
         
         return factura
+
+class FacturaClienteListaSerializer(serializers.ModelSerializer):
+    """FacturaCliente sin sus detalles para los listados; `lineas` viene anotado en el queryset."""
+    cliente = serializers.SerializerMethodField()
+    fecha = serializers.DateTimeField(format="%d-%m-%Y %H:%M:%S")
+    lineas = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = FacturaCliente
+        fields = ['id', 'cliente', 'fecha', 'total', 'lineas']
+
+    def get_cliente(self, obj):
+        return f"{obj.cliente.first_name} {obj.cliente.last_name}"
+
+class DetalleFacturaArchivadaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DetalleFacturaArchivada
+        fields = ['producto', 'cantidad', 'precio_unitario', 'subtotal']
+
+class FacturaArchivadaSerializer(serializers.ModelSerializer):
+    detalles = DetalleFacturaArchivadaSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = FacturaArchivada
+        fields = ['id', 'uuid', 'empleado', 'sucursal', 'cliente', 'fecha', 'total', 'subtotal', 'igv', 'archivada', 'detalles']
+
+class DetalleFacturaClienteArchivadaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DetalleFacturaClienteArchivada
+        fields = ['producto', 'cantidad', 'precio_unitario', 'subtotal']
+
+class FacturaClienteArchivadaSerializer(serializers.ModelSerializer):
+    detalles = DetalleFacturaClienteArchivadaSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = FacturaClienteArchivada
+        fields = ['id', 'cliente', 'fecha', 'subtotal', 'igv', 'total', 'archivada', 'detalles']
+
+class FacturacionMensualSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FacturacionMensual
+        fields = ['mes', 'origen', 'sucursal', 'facturas', 'total', 'subtotal', 'igv']
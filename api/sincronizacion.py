@@ -0,0 +1,138 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from .eventos import publicar_ventas
+from .inventario import lotes_fefo, registrar_movimientos, repartir_fefo
+from .models import DetalleFactura, Empleado, Factura, Producto
+from .precios import desglosar, redondear
+from .serializers import FacturaSincronizacionSerializer
+
+MAXIMO_LOTE = 500
+
+
+def _rechazo(uuid, motivo, errores=None):
+    resultado = {'uuid': uuid, 'resultado': 'rechazada', 'motivo': motivo}
+    if errores is not None:
+        resultado['errores'] = errores
+    return resultado
+
+
+def sincronizar_facturas(facturas):
+    """
+    Registra en una sola transacción un lote de facturas emitidas sin conexión.
+    Cada factura se identifica por el uuid generado en el punto de venta, de modo
+    que reenviar el lote no duplica ventas. Devuelve un resultado por factura, en
+    el orden recibido: 'aceptada', 'duplicada' o 'rechazada'.
+    """
+    resultados = [None] * len(facturas)
+    validas = {}
+    for i, datos in enumerate(facturas):
+        serializer = FacturaSincronizacionSerializer(data=datos)
+        if not serializer.is_valid():
+            uuid = datos.get('uuid') if isinstance(datos, dict) else None
+            resultados[i] = _rechazo(uuid, 'datos_invalidos', serializer.errors)
+            continue
+        factura = serializer.validated_data
+        if factura['uuid'] in validas:
+            resultados[i] = {'uuid': str(factura['uuid']), 'resultado': 'duplicada'}
+            continue
+        validas[factura['uuid']] = (i, factura)
+
+    with transaction.atomic():
+        empleados = dict(
+            Empleado.objects
+            .filter(pk__in={f['empleado'] for _, f in validas.values()})
+            .values_list('pk', 'sucursal_id')
+        )
+        producto_ids = {d['producto'] for _, f in validas.values() for d in f['detalles']}
+        productos = Producto.objects.in_bulk(producto_ids)
+
+        # Cada factura descuenta del local de su empleado. Bloquear primero el stock de
+        # esos locales serializa los reenvíos concurrentes del mismo lote sin frenar a
+        # los demás locales.
+        por_sucursal = defaultdict(set)
+        for _, datos in validas.values():
+            if datos['empleado'] in empleados:
+                por_sucursal[empleados[datos['empleado']]].update(
+                    d['producto'] for d in datos['detalles'] if d['producto'] in productos
+                )
+        disponible = {}
+        lotes = {}
+        for sucursal_id, ids in por_sucursal.items():
+            # Sin las unidades de lotes vencidos, que no se venden
+            lotes[sucursal_id] = lotes_fefo(ids, sucursal_id)
+            disponible.update({(sucursal_id, pk): lotes[sucursal_id].disponible(pk) for pk in ids})
+
+        existentes = dict(Factura.objects.filter(uuid__in=validas).values_list('uuid', 'id'))
+
+        aceptadas = []
+        for uuid, (i, datos) in validas.items():
+            if uuid in existentes:
+                resultados[i] = {'uuid': str(uuid), 'resultado': 'duplicada', 'id': existentes[uuid]}
+                continue
+            if datos['empleado'] not in empleados:
+                resultados[i] = _rechazo(str(uuid), 'empleado_no_encontrado')
+                continue
+
+            cantidades = defaultdict(int)
+            for detalle in datos['detalles']:
+                cantidades[detalle['producto']] += detalle['cantidad']
+            faltantes = [pk for pk in cantidades if pk not in productos]
+            if faltantes:
+                resultados[i] = _rechazo(str(uuid), 'producto_no_encontrado', {'productos': faltantes})
+                continue
+            sucursal_id = empleados[datos['empleado']]
+            sin_stock = [pk for pk, cantidad in cantidades.items() if disponible[sucursal_id, pk] < cantidad]
+            if sin_stock:
+                resultados[i] = _rechazo(str(uuid), 'stock_insuficiente', {'productos': sin_stock})
+                continue
+
+            for pk, cantidad in cantidades.items():
+                disponible[sucursal_id, pk] -= cantidad
+            aceptadas.append((i, datos))
+
+        facturas_nuevas = []
+        for _, datos in aceptadas:
+            total = redondear(sum(
+                (productos[d['producto']].precio * Decimal(d['cantidad']) for d in datos['detalles']),
+                Decimal(0),
+            ))
+            subtotal, igv = desglosar(total)
+            facturas_nuevas.append(Factura(
+                uuid=datos['uuid'],
+                empleado_id=datos['empleado'],
+                cliente=datos['cliente'],
+                fecha=datos['fecha'],
+                sucursal_id=empleados[datos['empleado']],
+                subtotal=subtotal,
+                igv=igv,
+                total=total,
+            ))
+        Factura.objects.bulk_create(facturas_nuevas, batch_size=MAXIMO_LOTE)
+
+        detalles = []
+        movimientos = []
+        for factura, (i, datos) in zip(facturas_nuevas, aceptadas):
+            lineas = []
+            for detalle in datos['detalles']:
+                producto = productos[detalle['producto']]
+                detalles.append(DetalleFactura(
+                    factura=factura,
+                    producto=producto,
+                    cantidad=detalle['cantidad'],
+                    precio_unitario=producto.precio,
+                    subtotal=producto.precio * detalle['cantidad'],
+                ))
+                lineas.append((producto.pk, detalle['cantidad']))
+            movimientos += repartir_fefo(
+                lotes[factura.sucursal_id], lineas, 'VENTA', factura=factura, sucursal_id=factura.sucursal_id
+            )
+            resultados[i] = {'uuid': str(datos['uuid']), 'resultado': 'aceptada', 'id': factura.pk}
+
+        DetalleFactura.objects.bulk_create(detalles, batch_size=2000)
+        registrar_movimientos(movimientos)
+        if facturas_nuevas:
+            publicar_ventas('sincronizacion', facturas_nuevas)
+    return resultados
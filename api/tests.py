@@ -0,0 +1,1189 @@
+import json
+import re
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from uuid import uuid4
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import (
+    alertas, analitica, archivo, eventos, lecturas, pronosticos, recomendaciones, resumenes, sentencias, valoracion,
+    vistas_async,
+)
+from .autenticacion import cache_usuarios
+from .inventario import conciliar_stock, generar_cortes, registrar_movimientos, saldos_kardex, transferir_stock
+from .lista_negra import FiltroBloom, lista_negra
+from .models import (
+    AlertaInventario, Categoria, ClaveIdempotencia, Clientes, CorteStock, DetalleFactura, DetalleFacturaCliente,
+    Empleado, EventoInventario, Factura, FacturaArchivada, FacturaCliente, Lote, MarcaProceso, MovimientoStock,
+    Pedidos, Persona, Producto, ProductoRelacionado, Proveedor, StockSucursal, SugerenciaReposicion, Sucursal,
+)
+from .pedidos import transicionar_pedidos
+from .precios import desglosar, precio_con_igv
+from .reposicion import generar_sugerencias
+from .serializers import ProductoSerializer
+
+
+class BaseAPITest(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@farmavida.pe', 'clave')
+        self.empleado = self.crear_empleado(self.usuario, '1')
+        self.proveedor = Proveedor.objects.create(nombre='Prov', direccion='d', telefono='1', email='p@p.pe')
+        self.categoria = Categoria.objects.create(nombre='Cat')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def crear_empleado(self, usuario, identificacion, sucursal=None):
+        persona = Persona.objects.create(
+            nombre='Ana', apellidos='B', direccion='d', correo=f'{identificacion}@farmavida.pe',
+            telefono='1', identificacion=identificacion,
+        )
+        return Empleado.objects.create(
+            persona=persona, usuario=usuario, cargo='Cajero', fecha_contratacion=date.today(),
+            salario=1, sucursal=sucursal,
+        )
+
+    def crear_producto(self, stock=0, nombre='Paracetamol', precio_sin_igv='10'):
+        producto = Producto.objects.create(
+            nombre=nombre, descripcion='d', presentacion='caja', proveedor=self.proveedor,
+            categoria=self.categoria, precio_sin_igv=Decimal(precio_sin_igv),
+            fecha_vencimiento=date.today() + timedelta(days=365),
+        )
+        if stock:
+            registrar_movimientos([MovimientoStock(producto=producto, cantidad=stock, motivo='APERTURA')])
+        return producto
+
+    def crear_lote(self, producto, cantidad, vence_en_dias, sucursal=None):
+        lote = Lote.objects.create(
+            producto=producto, codigo=f'L{vence_en_dias}', cantidad_inicial=cantidad, sucursal=sucursal,
+            fecha_vencimiento=date.today() + timedelta(days=vence_en_dias),
+        )
+        registrar_movimientos([
+            MovimientoStock(producto=producto, cantidad=cantidad, motivo='AJUSTE', lote=lote, sucursal=sucursal)
+        ])
+        return lote
+
+    def vender(self, producto, cantidad, **cabeceras):
+        return self.client.post('/api/v1/facturas/', {
+            'empleado': self.empleado.pk,
+            'cliente': 'Cliente',
+            'fecha': str(date.today()),
+            'detalles': [{'producto': producto.pk, 'cantidad': cantidad}],
+        }, format='json', **cabeceras)
+
+    def stock(self, producto):
+        return Producto.objects.values_list('stock', flat=True).get(pk=producto.pk)
+
+
+class VentaStockTest(BaseAPITest):
+    def test_venta_descuenta_lotes_en_orden_fefo(self):
+        producto = self.crear_producto(stock=2)
+        tardio = self.crear_lote(producto, 5, 200)
+        proximo = self.crear_lote(producto, 5, 30)
+
+        respuesta = self.vender(producto, 7)
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(self.stock(producto), 5)
+        proximo.refresh_from_db()
+        tardio.refresh_from_db()
+        self.assertEqual((proximo.cantidad, tardio.cantidad), (0, 3))
+        salidas = MovimientoStock.objects.filter(factura_id=respuesta.data['id'])
+        self.assertEqual(sum(m.cantidad for m in salidas), -7)
+
+    def test_unidades_de_lotes_vencidos_no_se_venden(self):
+        producto = self.crear_producto(stock=5)
+        vencido = self.crear_lote(producto, 5, -1)
+
+        respuesta = self.vender(producto, 10)
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.stock(producto), 10)
+        vencido.refresh_from_db()
+        self.assertEqual(vencido.cantidad, 5)
+        self.assertFalse(Factura.objects.exists())
+
+    def test_se_vende_el_stock_sin_lote_junto_a_un_lote_vencido(self):
+        producto = self.crear_producto(stock=5)
+        self.crear_lote(producto, 5, -1)
+
+        self.assertEqual(self.vender(producto, 5).status_code, 201)
+        self.assertEqual(self.stock(producto), 5)
+        self.assertEqual(self.vender(producto, 1).status_code, 400)
+
+    def test_ids_de_producto_como_texto(self):
+        producto = self.crear_producto(stock=5)
+        Clientes.objects.create(user=self.usuario, dni=1)
+
+        tienda = self.client.post('/api/v1/facturas/', {
+            'empleado': self.empleado.pk, 'cliente': 'Cliente', 'fecha': str(date.today()),
+            'detalles': [{'producto': str(producto.pk), 'cantidad': '2'}],
+        }, format='json')
+        en_linea = self.client.post(
+            '/api/v1/facturas-cliente/', {'detalles': [{'producto': str(producto.pk), 'cantidad': 1}]}, format='json'
+        )
+
+        self.assertEqual((tienda.status_code, en_linea.status_code), (201, 201))
+        self.assertEqual(self.stock(producto), 2)
+
+    def test_detalles_invalidos_responden_400(self):
+        producto = self.crear_producto(stock=5)
+
+        for detalle in ({'producto': 'x', 'cantidad': 1}, {'producto': producto.pk, 'cantidad': -1}, {'producto': producto.pk}):
+            respuesta = self.client.post('/api/v1/facturas/', {
+                'empleado': self.empleado.pk, 'cliente': 'Cliente', 'fecha': str(date.today()), 'detalles': [detalle],
+            }, format='json')
+            self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.stock(producto), 5)
+
+    def test_venta_sin_stock_no_modifica_nada(self):
+        producto = self.crear_producto(stock=3)
+
+        respuesta = self.vender(producto, 4)
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.stock(producto), 3)
+        self.assertFalse(MovimientoStock.objects.filter(motivo='VENTA').exists())
+
+    def test_editar_el_stock_registra_un_ajuste(self):
+        producto = self.crear_producto(stock=5)
+
+        respuesta = self.client.patch(f'/api/v1/productos/{producto.pk}/', {'stock': 8}, format='json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.stock(producto), 8)
+        self.assertEqual(MovimientoStock.objects.get(motivo='AJUSTE').cantidad, 3)
+        self.assertEqual(conciliar_stock(), {})
+
+
+class CorteKardexTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto(stock=5)
+
+    def mover(self, cantidad):
+        return registrar_movimientos([MovimientoStock(producto=self.producto, cantidad=cantidad, motivo='AJUSTE')])[0]
+
+    def corte(self):
+        return CorteStock.objects.filter(producto=self.producto).order_by('-ultimo_movimiento', '-id').first()
+
+    def test_corte_cuadra_con_el_stock(self):
+        self.mover(-2)
+
+        self.assertEqual(generar_cortes(), 1)
+        self.assertEqual(self.corte().stock, 3)
+        self.assertEqual(saldos_kardex(), {self.producto.pk: (3, 3)})
+        self.assertEqual(generar_cortes(), 0)
+
+    def test_hueco_nuevo_detiene_el_corte(self):
+        en_curso = self.mover(3)
+        MovimientoStock.objects.filter(pk=en_curso.pk).delete()
+        self.mover(2)
+
+        generar_cortes()
+        self.assertEqual((self.corte().stock, self.corte().ultimo_movimiento), (5, en_curso.pk - 1))
+
+        # La transacción confirma: el siguiente corte la incluye
+        en_curso.save(force_insert=True)
+        generar_cortes()
+        self.assertEqual(self.corte().stock, 10)
+        self.assertEqual(conciliar_stock(), {})
+
+    def test_movimiento_confirmado_tarde_entra_al_siguiente_corte(self):
+        en_curso = self.mover(3)
+        MovimientoStock.objects.filter(pk=en_curso.pk).delete()
+        ultimo = self.mover(2)
+
+        generar_cortes()
+        generar_cortes()
+        self.assertEqual((self.corte().stock, self.corte().ultimo_movimiento), (7, ultimo.pk))
+
+        en_curso.save(force_insert=True)
+        self.assertEqual(generar_cortes(), 1)
+        self.assertEqual(self.corte().stock, 10)
+        self.assertEqual(saldos_kardex(), {self.producto.pk: (10, 10)})
+
+
+class AlertasTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.sucursal = Sucursal.objects.create(nombre='Local 1')
+        self.producto = self.crear_producto(stock=50)
+
+    def activas(self):
+        return set(AlertaInventario.objects.filter(activa=True).values_list('producto', 'sucursal', 'tipo'))
+
+    def envejecer(self):
+        # Lo modificado antes de la corrida anterior no vuelve a ser candidato
+        antes = timezone.now() - timedelta(days=1)
+        Producto.objects.update(actualizado=antes)
+        StockSucursal.objects.update(actualizado=antes)
+
+    def test_lote_proximo_a_vencer_alerta_el_producto(self):
+        self.crear_lote(self.producto, 20, 10)
+
+        alertas.escanear()
+
+        self.assertEqual(self.activas(), {(self.producto.pk, None, 'POR_VENCER')})
+        self.assertTrue(AlertaInventario.objects.get().mensaje.startswith('Lote L10'))
+
+    def test_stock_de_sucursal(self):
+        transferir_stock(None, self.sucursal.pk, [(self.producto.pk, 30)])
+        alertas.escanear()
+        self.assertEqual(self.activas(), set())
+        self.envejecer()
+
+        registrar_movimientos([
+            MovimientoStock(producto=self.producto, cantidad=-30, motivo='VENTA', sucursal=self.sucursal)
+        ])
+        self.assertEqual(alertas.escanear(), (1, 0))
+        self.assertEqual(self.activas(), {(self.producto.pk, self.sucursal.pk, 'AGOTADO')})
+        self.envejecer()
+
+        registrar_movimientos([
+            MovimientoStock(producto=self.producto, cantidad=12, motivo='AJUSTE', sucursal=self.sucursal)
+        ])
+        self.assertEqual(alertas.escanear(), (0, 1))
+        self.assertEqual(AlertaInventario.objects.filter(activa=False).count(), 1)
+
+    def test_vencimiento_de_lote_por_el_paso_de_los_dias(self):
+        lote = self.crear_lote(self.producto, 20, 45)
+        alertas.escanear()
+        self.assertEqual(self.activas(), set())
+        self.envejecer()
+        # Equivale a que pasaron 25 días desde la corrida anterior
+        Lote.objects.filter(pk=lote.pk).update(fecha_vencimiento=date.today() + timedelta(days=20))
+        MarcaProceso.objects.filter(nombre=alertas.MARCA).update(
+            datos={'desde': timezone.now().isoformat(), 'dia': (date.today() - timedelta(days=25)).isoformat()}
+        )
+
+        alertas.escanear()
+
+        self.assertEqual(self.activas(), {(self.producto.pk, None, 'POR_VENCER')})
+
+
+class ReposicionTest(BaseAPITest):
+    def test_sugerencia_segun_velocidad_de_venta(self):
+        producto = self.crear_producto(stock=20)
+        self.vender(producto, 14)
+
+        self.assertEqual(self.client.post('/api/v1/reposicion/').data, {'productos': 1})
+
+        orden, = self.client.get('/api/v1/reposicion/').data
+        linea, = orden['lineas']
+        self.assertEqual((orden['proveedor_id'], linea['producto_id'], linea['stock']), (self.proveedor.pk, producto.pk, 6))
+        self.assertGreater(linea['velocidad'], 0)
+        self.assertGreater(linea['cantidad'], 4)
+
+    def test_costo_de_respaldo_con_precio_alto(self):
+        producto = self.crear_producto(precio_sin_igv='150000.00')
+
+        generar_sugerencias()
+
+        self.assertEqual(SugerenciaReposicion.objects.get().precio_compra, Decimal('150000.00'))
+        respuesta = self.client.post('/api/v1/ordenes-compra/desde-sugerencias/', {'proveedor': self.proveedor.pk}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(Pedidos.objects.get(producto=producto).precio_compra, Decimal('150000.00'))
+
+
+class OrdenCompraTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.a = self.crear_producto(nombre='A')
+        self.b = self.crear_producto(nombre='B')
+        vence = str(date.today() + timedelta(days=90))
+        respuesta = self.client.post('/api/v1/ordenes-compra/', {
+            'proveedor': self.proveedor.pk,
+            'lineas': [
+                {'producto': self.a.pk, 'cantidad': 5, 'precio_compra': '2.00', 'lote': 'A1', 'fecha_vencimiento': vence},
+                {'producto': self.b.pk, 'cantidad': 3, 'precio_compra': '4.00', 'lote': 'B1', 'fecha_vencimiento': vence},
+            ],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.orden = respuesta.data
+
+    def test_recibir_ingresa_todas_las_lineas(self):
+        self.assertEqual(Decimal(self.orden['subtotal']), Decimal('22.00'))
+
+        respuesta = self.client.post(f"/api/v1/ordenes-compra/{self.orden['id']}/recibir/")
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['lineas_recibidas'], 2)
+        self.assertEqual((self.stock(self.a), self.stock(self.b)), (5, 3))
+        self.assertEqual(sorted(Lote.objects.values_list('codigo', 'cantidad')), [('A1', 5), ('B1', 3)])
+        self.assertEqual(self.client.post(f"/api/v1/ordenes-compra/{self.orden['id']}/recibir/").status_code, 400)
+        self.assertEqual(self.stock(self.a), 5)
+
+    def test_no_reemplaza_lineas_completadas(self):
+        transicionar_pedidos(Pedidos.objects.filter(producto=self.a), 'Completado')
+
+        respuesta = self.client.patch(f"/api/v1/ordenes-compra/{self.orden['id']}/", {
+            'lineas': [{'producto': self.b.pk, 'cantidad': 1, 'precio_compra': '4.00'}],
+        }, format='json')
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Pedidos.objects.filter(orden_id=self.orden['id']).count(), 2)
+        self.assertEqual(self.stock(self.a), 5)
+
+
+class PedidoEstadoTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto()
+        self.pedido = Pedidos.objects.create(
+            fecha_pedido=date.today(), proveedor=self.proveedor, producto=self.producto,
+            cantidad=4, precio_compra=Decimal('2.00'), estado='Pendiente',
+        )
+
+    def test_completar_ingresa_el_stock_una_sola_vez(self):
+        url = f'/api/v1/pedidos/{self.pedido.pk}/cambiar_estado/'
+
+        self.assertEqual(self.client.patch(url, {'estado': 'Completado'}, format='json').status_code, 200)
+        self.assertEqual(self.client.patch(url, {'estado': 'Completado'}, format='json').status_code, 400)
+
+        self.assertEqual(self.stock(self.producto), 4)
+        self.assertEqual(MovimientoStock.objects.filter(pedido=self.pedido).count(), 1)
+
+    def test_save_sin_cambio_de_estado_no_relee_la_fila(self):
+        pedido = Pedidos.objects.get(pk=self.pedido.pk)
+        pedido.lote = 'X1'
+
+        with self.assertNumQueries(1):
+            pedido.save()
+
+        pedido.estado = 'Completado'
+        pedido.save()
+        self.assertEqual(self.stock(self.producto), 4)
+        self.assertEqual(list(pedido.transiciones.values_list('estado_anterior', 'estado_nuevo')), [('Pendiente', 'Completado')])
+
+    def test_pedido_completado_no_vuelve_atras(self):
+        transicionar_pedidos(Pedidos.objects.filter(pk=self.pedido.pk), 'Completado')
+
+        respuesta = self.client.patch(f'/api/v1/pedidos/{self.pedido.pk}/', {'estado': 'Pendiente'}, format='json')
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Pedidos.objects.get(pk=self.pedido.pk).estado, 'Completado')
+
+
+class AutenticacionTest(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('cli', 'cli@farmavida.pe', 'clave')
+        Clientes.objects.create(user=self.usuario, dni=12345678)
+        self.client = APIClient()
+        self.tokens = self.client.post('/api/token/', {'username': 'cli', 'password': 'clave'}, format='json').data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+        cache_usuarios.invalidar(self.usuario.pk)
+
+    def test_peticiones_con_usuario_en_cache_no_consultan_la_bd(self):
+        self.assertEqual(self.client.get('/api/v1/current-user/').status_code, 200)
+
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/v1/current-user/')
+
+        self.assertEqual(respuesta.data['dni'], 12345678)
+
+    def test_desactivar_al_usuario_invalida_la_cache(self):
+        self.assertEqual(self.client.get('/api/v1/current-user/').status_code, 200)
+
+        self.usuario.is_active = False
+        self.usuario.save()
+
+        self.assertEqual(self.client.get('/api/v1/current-user/').status_code, 401)
+        refresh = self.client.post('/api/token/refresh/', {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(refresh.status_code, 401)
+
+    def test_refresh_recalcula_los_claims(self):
+        self.assertFalse(AccessToken(self.tokens['access'])['is_superuser'])
+        self.usuario.is_superuser = True
+        self.usuario.save()
+
+        respuesta = self.client.post('/api/token/refresh/', {'refresh': self.tokens['refresh']}, format='json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(AccessToken(respuesta.data['access'])['is_superuser'])
+        self.assertTrue(self.client.get('/api/auth/check-superuser/').data['is_superuser'])
+
+    def test_comprar_en_linea_requiere_perfil_de_cliente(self):
+        self.usuario.clientes.delete()
+
+        respuesta = self.client.post('/api/v1/facturas-cliente/', {'detalles': []}, format='json')
+
+        self.assertEqual(respuesta.status_code, 403)
+
+
+class ListaNegraTest(TestCase):
+    def setUp(self):
+        User.objects.create_user('cli', 'cli@farmavida.pe', 'clave')
+        self.client = APIClient()
+        self.refresh = self.client.post('/api/token/', {'username': 'cli', 'password': 'clave'}, format='json').data['refresh']
+        lista_negra._filtro = None
+
+    def refrescar(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': token}, format='json')
+
+    def test_filtro_sin_falsos_negativos(self):
+        filtro = FiltroBloom(1000, 0.01)
+        for i in range(1000):
+            filtro.agregar(f'jti-{i}')
+
+        self.assertTrue(all(f'jti-{i}' in filtro for i in range(1000)))
+        falsos = sum(f'otro-{i}' in filtro for i in range(10000))
+        self.assertLess(falsos, 300)
+
+    def test_refresh_rotado_no_se_acepta_dos_veces(self):
+        respuesta = self.refrescar(self.refresh)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(lista_negra.posiblemente_revocado(RefreshToken(self.refresh, verify=False)['jti']))
+        self.assertEqual(self.refrescar(self.refresh).status_code, 401)
+        self.assertEqual(self.refrescar(respuesta.data['refresh']).status_code, 200)
+
+    def test_revocacion_hecha_en_otro_proceso(self):
+        self.assertEqual(self.refrescar(self.refresh).status_code, 200)
+        # Filtro de un proceso que no vio la revocación
+        lista_negra._filtro = FiltroBloom(10, 0.001)
+
+        self.assertEqual(self.refrescar(self.refresh).status_code, 401)
+
+
+class TransicionPedidosTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto()
+        self.pedidos = [
+            Pedidos.objects.create(
+                fecha_pedido=date.today(), proveedor=self.proveedor, producto=self.producto,
+                cantidad=cantidad, precio_compra=Decimal('1.00'), estado=estado,
+            )
+            for cantidad, estado in ((2, 'Pendiente'), (3, 'En Proceso'), (4, 'Completado'))
+        ]
+
+    def test_resultado_por_id(self):
+        ids = [p.pk for p in self.pedidos] + [999]
+
+        respuesta = self.client.post('/api/v1/pedidos/transicion/', {'ids': ids, 'estado': 'Completado'}, format='json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['actualizados'], ids[:2])
+        self.assertEqual(
+            [r['resultado'] for r in respuesta.data['resultados']], ['ok', 'ok', 'sin_cambio', 'no_encontrado']
+        )
+        self.assertEqual(self.stock(self.producto), 5)
+
+    def test_transicion_invalida_no_afecta_al_resto(self):
+        ids = [p.pk for p in self.pedidos]
+
+        respuesta = self.client.post('/api/v1/pedidos/transicion/', {'ids': ids, 'estado': 'Pendiente'}, format='json')
+
+        self.assertEqual(
+            [r['resultado'] for r in respuesta.data['resultados']], ['sin_cambio', 'ok', 'transicion_invalida']
+        )
+        self.assertEqual(Pedidos.objects.get(pk=ids[1]).estado, 'Pendiente')
+
+    def test_datos_invalidos(self):
+        for datos in ({'ids': [], 'estado': 'Completado'}, {'ids': ['x'], 'estado': 'Completado'}, {'ids': [1], 'estado': 'Otro'}):
+            respuesta = self.client.post('/api/v1/pedidos/transicion/', datos, format='json')
+            self.assertEqual(respuesta.status_code, 400)
+
+
+class IdempotenciaTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto(stock=10)
+
+    def test_repeticion_devuelve_la_misma_respuesta_sin_vender_dos_veces(self):
+        primera = self.vender(self.producto, 2, HTTP_IDEMPOTENCY_KEY='k1')
+        segunda = self.vender(self.producto, 2, HTTP_IDEMPOTENCY_KEY='k1')
+
+        self.assertEqual((primera.status_code, segunda.status_code), (201, 201))
+        self.assertEqual(segunda.headers.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(Factura.objects.count(), 1)
+        self.assertEqual(self.stock(self.producto), 8)
+        self.assertEqual(ClaveIdempotencia.objects.get(clave='k1').estado, 'COMPLETADA')
+
+    def test_misma_clave_con_otro_cuerpo_es_conflicto(self):
+        self.vender(self.producto, 2, HTTP_IDEMPOTENCY_KEY='k1')
+
+        respuesta = self.vender(self.producto, 3, HTTP_IDEMPOTENCY_KEY='k1')
+
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertEqual(self.stock(self.producto), 8)
+
+    def test_clave_en_curso_responde_409(self):
+        self.vender(self.producto, 2, HTTP_IDEMPOTENCY_KEY='k1')
+        ClaveIdempotencia.objects.filter(clave='k1').update(estado='EN_CURSO', codigo=None, respuesta=None)
+
+        respuesta = self.vender(self.producto, 2, HTTP_IDEMPOTENCY_KEY='k1')
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(Factura.objects.count(), 1)
+
+    def test_las_claves_son_de_cada_usuario(self):
+        self.vender(self.producto, 2, HTTP_IDEMPOTENCY_KEY='k1')
+        otro = User.objects.create_user('otro', 'otro@farmavida.pe', 'clave')
+        self.empleado = self.crear_empleado(otro, '2')
+        self.client.force_authenticate(otro)
+
+        respuesta = self.vender(self.producto, 2, HTTP_IDEMPOTENCY_KEY='k1')
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(Factura.objects.count(), 2)
+
+
+class SincronizacionTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto(stock=5)
+
+    def factura(self, cantidad, uuid=None, **extra):
+        return {
+            'uuid': str(uuid or uuid4()), 'empleado': self.empleado.pk, 'fecha': str(date.today()),
+            'detalles': [{'producto': self.producto.pk, 'cantidad': cantidad}], **extra,
+        }
+
+    def sincronizar(self, facturas):
+        return self.client.post('/api/v1/facturas/sincronizar/', {'facturas': facturas}, format='json')
+
+    def test_lote_con_resultado_por_factura(self):
+        lote = [self.factura(2), self.factura(4), self.factura(1, empleado=999), {'uuid': 'x'}, self.factura(3)]
+
+        respuesta = self.sincronizar(lote)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['aceptadas'], 2)
+        self.assertEqual(
+            [(r['resultado'], r.get('motivo')) for r in respuesta.data['resultados']],
+            [('aceptada', None), ('rechazada', 'stock_insuficiente'), ('rechazada', 'empleado_no_encontrado'),
+             ('rechazada', 'datos_invalidos'), ('aceptada', None)],
+        )
+        self.assertEqual(self.stock(self.producto), 0)
+        self.assertEqual(Factura.objects.count(), 2)
+
+    def test_reenviar_el_lote_no_duplica_ventas(self):
+        lote = [self.factura(2), self.factura(1)]
+        primera = self.sincronizar(lote)
+
+        segunda = self.sincronizar(lote)
+
+        self.assertEqual(segunda.data['aceptadas'], 0)
+        self.assertEqual(
+            [(r['resultado'], r['id']) for r in segunda.data['resultados']],
+            [('duplicada', r['id']) for r in primera.data['resultados']],
+        )
+        self.assertEqual(self.stock(self.producto), 2)
+
+
+class PreciosTest(BaseAPITest):
+    def repreciar(self, **datos):
+        return self.client.post('/api/v1/productos/repreciar/', {'categoria': self.categoria.pk, **datos}, format='json')
+
+    def test_desglose_cuadra_con_el_total(self):
+        self.assertEqual(precio_con_igv('10'), Decimal('11.80'))
+        self.assertEqual(desglosar(Decimal('118')), (Decimal('100.00'), Decimal('18.00')))
+        for centimos in range(1, 2000, 7):
+            total = Decimal(centimos) / 100
+            subtotal, igv = desglosar(total)
+            self.assertEqual(subtotal + igv, total)
+
+    def test_repreciar_por_porcentaje_y_por_precio(self):
+        producto = self.crear_producto()
+        otro = Producto.objects.create(
+            nombre='Fuera', descripcion='d', presentacion='caja', proveedor=self.proveedor,
+            categoria=Categoria.objects.create(nombre='Otra'), precio_sin_igv=Decimal('10'),
+            fecha_vencimiento=date.today(),
+        )
+
+        self.assertEqual(self.repreciar(porcentaje=10).data, {'actualizados': 1})
+        producto.refresh_from_db()
+        self.assertEqual((producto.precio_sin_igv, producto.precio), (Decimal('11.00'), Decimal('12.98')))
+
+        self.repreciar(precio_sin_igv='5')
+        producto.refresh_from_db()
+        otro.refresh_from_db()
+        self.assertEqual((producto.precio_sin_igv, producto.precio), (Decimal('5.00'), Decimal('5.90')))
+        self.assertEqual(otro.precio, Decimal('11.80'))
+
+    def test_repreciar_rechaza_valores_invalidos(self):
+        producto = self.crear_producto()
+
+        for datos in ({'porcentaje': -100}, {'precio_sin_igv': '0'}, {'porcentaje': 'x'}, {'porcentaje': 5, 'precio_sin_igv': 3}, {}):
+            self.assertEqual(self.repreciar(**datos).status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/productos/repreciar/', {'porcentaje': 5}, format='json').status_code, 400)
+        producto.refresh_from_db()
+        self.assertEqual(producto.precio, Decimal('11.80'))
+
+
+class BulkTest(BaseAPITest):
+    def datos_producto(self, nombre, stock):
+        return {
+            'nombre': nombre, 'descripcion': 'd', 'presentacion': 'caja', 'precio_sin_igv': '10.00', 'stock': stock,
+            'fecha_vencimiento': str(date.today() + timedelta(days=30)),
+            'categoria': self.categoria.pk, 'proveedor': self.proveedor.pk,
+        }
+
+    def test_alta_y_modificacion_en_bloque_pasan_por_el_kardex(self):
+        creados = self.client.post(
+            '/api/v1/productos/', [self.datos_producto('A', 5), self.datos_producto('B', 0)], format='json'
+        )
+        self.assertEqual(creados.status_code, 201)
+        a, b = (p['id'] for p in creados.data)
+        self.assertEqual(creados.data[0]['precio'], '11.80')
+
+        respuesta = self.client.patch('/api/v1/productos/bulk/', [
+            {'id': str(a), 'stock': 2}, {'id': b, 'stock': 7, 'precio_sin_igv': '20.00'},
+        ], format='json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([p['stock'] for p in respuesta.data], [2, 7])
+        self.assertEqual(Producto.objects.get(pk=b).precio, Decimal('23.60'))
+        self.assertEqual(
+            sorted(MovimientoStock.objects.values_list('producto', 'motivo', 'cantidad')),
+            [(a, 'AJUSTE', -3), (a, 'APERTURA', 5), (b, 'AJUSTE', 7)],
+        )
+        self.assertEqual(conciliar_stock(), {})
+
+    def test_ids_invalidos(self):
+        proveedor = self.client.post('/api/v1/proveedores/', [
+            {'nombre': 'P2', 'direccion': 'd', 'telefono': '1', 'email': 'p2@p.pe'},
+        ], format='json').data[0]
+
+        patch = self.client.patch('/api/v1/proveedores/bulk/', [{'id': 'x', 'nombre': 'Z'}], format='json')
+        borrar_invalido = self.client.delete('/api/v1/proveedores/bulk/', {'ids': [proveedor['id'], 'x']}, format='json')
+        borrar = self.client.delete('/api/v1/proveedores/bulk/', {'ids': [str(proveedor['id']), 999]}, format='json')
+
+        self.assertEqual((patch.status_code, borrar_invalido.status_code), (400, 400))
+        self.assertEqual(borrar_invalido.data['invalidos'], ['x'])
+        self.assertEqual(borrar.data, {'eliminados': [proveedor['id']], 'no_encontrados': [999]})
+        self.assertEqual(Proveedor.objects.count(), 1)
+
+
+class SentenciasTest(BaseAPITest):
+    class Cursor:
+        def __init__(self):
+            self.sql = []
+
+        def execute(self, sql, parametros=None):
+            self.sql.append(sql.split(' ', 2)[:2])
+
+    def test_cada_sentencia_declara_sus_parametros(self):
+        for nombre, (tipos, sql) in sentencias.SENTENCIAS.items():
+            usados = {int(n) for n in re.findall(r'\$(\d+)', sql)}
+            self.assertEqual(usados, set(range(1, len(tipos) + 1)), nombre)
+
+    def test_prepara_una_vez_por_conexion(self):
+        cursor = self.Cursor()
+        previas = getattr(connection, 'sentencias_preparadas', None)
+        connection.sentencias_preparadas = set()
+        try:
+            sentencias.ejecutar(cursor, 'productos_por_id', [[1]])
+            sentencias.ejecutar(cursor, 'productos_por_id', [[2]])
+        finally:
+            connection.sentencias_preparadas = previas
+
+        self.assertEqual(cursor.sql, [['PREPARE', 'productos_por_id'], ['EXECUTE', 'productos_por_id'], ['EXECUTE', 'productos_por_id']])
+
+    @override_settings(SENTENCIAS_PREPARADAS=True)
+    def test_sin_postgresql_usa_el_orm(self):
+        producto = self.crear_producto(stock=3)
+
+        productos = sentencias.productos_por_id([producto.pk, producto.pk, 999])
+
+        self.assertEqual(sentencias.habilitadas(), connection.vendor == 'postgresql')
+        self.assertEqual(list(productos), [producto.pk])
+        self.assertEqual((productos[producto.pk].precio, productos[producto.pk].stock), (Decimal('11.80'), 3))
+        self.assertEqual(self.vender(producto, 2).status_code, 201)
+        self.assertEqual(self.stock(producto), 1)
+
+
+class VistasAsyncTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto(stock=4)
+        self.fabrica = AsyncRequestFactory()
+
+    async def test_lista_de_productos_igual_a_la_vista_drf(self):
+        esperado = (await sync_to_async(self.client.get)('/api/v1/productos/')).json()
+
+        respuesta = await vistas_async.productos(self.fabrica.get('/api/v1/productos/'))
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(json.loads(respuesta.content), esperado)
+        self.assertEqual(esperado[0]['stock'], 4)
+
+    async def test_productos_por_categoria(self):
+        con_productos = await vistas_async.productos_por_categoria(self.fabrica.get('/'), self.categoria.pk)
+        vacia = await vistas_async.productos_por_categoria(self.fabrica.get('/'), self.categoria.pk + 1)
+
+        self.assertEqual([p['id'] for p in json.loads(con_productos.content)], [self.producto.pk])
+        self.assertEqual(vacia.status_code, 404)
+
+    async def test_usuario_actual_requiere_token(self):
+        await Clientes.objects.acreate(user=self.usuario, dni=7)
+        token = AccessToken.for_user(self.usuario)
+
+        sin_token = await vistas_async.usuario_actual(self.fabrica.get('/'))
+        con_token = await vistas_async.usuario_actual(self.fabrica.get('/', headers={'Authorization': f'Bearer {token}'}))
+
+        self.assertEqual(sin_token.status_code, 401)
+        self.assertEqual(json.loads(con_token.content)['dni'], 7)
+
+
+class EventosTest(BaseAPITest):
+    def evento(self, pk):
+        return {'id': pk, 'tipo': 'stock', 'datos': {}}
+
+    def test_venta_publica_stock_y_venta(self):
+        producto = self.crear_producto(stock=5)
+        desde = eventos.ultimo_id()
+
+        factura = self.vender(producto, 2).data
+
+        flujo = eventos.flujo(desde)
+        try:
+            self.assertTrue(next(flujo).startswith('retry:'))
+            mensajes = [next(flujo), next(flujo)]
+        finally:
+            flujo.close()
+        self.assertIn(f'data: {{"productos":[[{producto.pk},3,-2]]}}', mensajes[0])
+        self.assertIn('event: venta', mensajes[1])
+        self.assertIn(f'[[{factura["id"]},', mensajes[1])
+
+    def test_evento_confirmado_tarde_se_entrega(self):
+        lector = eventos.LectorEventos(0)
+
+        self.assertEqual([e['id'] for e in lector.nuevos([self.evento(1), self.evento(2), self.evento(4)])], [1, 2, 4])
+        self.assertEqual(set(lector.huecos), {3})
+        self.assertFalse(lector.recibido(self.evento(4)))
+
+        self.assertEqual([e['id'] for e in lector.nuevos([self.evento(3), self.evento(5)])], [3, 5])
+        self.assertEqual(lector.huecos, {})
+        self.assertEqual(lector.nuevos([self.evento(3)]), [])
+
+    def test_consulta_incluye_los_huecos_y_los_olvida_al_vencer(self):
+        ids = [EventoInventario.objects.create(tipo='stock', datos={}).pk for _ in range(3)]
+        lector = eventos.LectorEventos(ids[0] - 1)
+        lector.nuevos([self.evento(ids[0]), self.evento(ids[2])])
+
+        self.assertEqual([fila['id'] for fila in lector.consulta()], [ids[1]])
+
+        lector.huecos[ids[1]] -= eventos.ESPERA_HUECOS + 1
+        lector.nuevos([])
+        self.assertEqual(list(lector.consulta()), [])
+
+
+class HistorialClienteTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.cliente = User.objects.create_user('cli', 'cli@farmavida.pe', 'clave')
+        Clientes.objects.create(user=self.cliente, dni=1)
+        self.a = self.crear_producto(stock=20, nombre='A')
+        self.b = self.crear_producto(stock=20, nombre='B', precio_sin_igv='20')
+        self.client.force_authenticate(self.cliente)
+        for lineas in ([(self.a, 1)], [(self.a, 2), (self.b, 1)], [(self.a, 1)]):
+            respuesta = self.client.post('/api/v1/facturas-cliente/', {
+                'detalles': [{'producto': producto.pk, 'cantidad': cantidad} for producto, cantidad in lineas],
+            }, format='json')
+            self.assertEqual(respuesta.status_code, 201)
+
+    def test_resumen_precalculado_cuadra_con_las_facturas(self):
+        resumen = self.client.get('/api/v1/facturas-cliente/resumen/').data
+
+        self.assertEqual(resumen['compras'], 3)
+        self.assertEqual(Decimal(resumen['total_gastado']), Decimal('70.80'))
+        resumenes.recalcular([self.cliente.pk])
+        self.assertEqual(self.client.get('/api/v1/facturas-cliente/resumen/').data, resumen)
+
+    def test_historial_paginado_por_cursor(self):
+        primera = self.client.get('/api/v1/facturas-cliente/historial/?page_size=2').data
+        segunda = self.client.get(primera['next']).data
+
+        self.assertEqual(len(primera['results']), 2)
+        self.assertEqual(len(segunda['results']), 1)
+        self.assertIsNone(segunda['next'])
+
+    def test_recompra_y_alcance_por_cliente(self):
+        recompra = self.client.get('/api/v1/facturas-cliente/recompra/').json()
+        self.assertEqual([(p['producto_id'], p['compras']) for p in recompra], [(self.a.pk, 3), (self.b.pk, 1)])
+
+        otro = User.objects.create_user('otro', 'otro@farmavida.pe', 'clave')
+        self.client.force_authenticate(otro)
+        self.assertEqual(self.client.get(f'/api/v1/facturas-cliente/recompra/?cliente={self.cliente.pk}').json(), [])
+        self.client.force_authenticate(self.usuario)
+        self.assertEqual(self.client.get(f'/api/v1/facturas-cliente/recompra/?cliente={self.cliente.pk}').json(), recompra)
+
+
+class RecomendacionesTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.a, self.b, self.c = (self.crear_producto(nombre=nombre) for nombre in 'ABC')
+
+    def cesta(self, *productos):
+        factura = Factura.objects.create(empleado=self.empleado, fecha=date.today(), total=0, subtotal=0, igv=0)
+        for producto in productos:
+            DetalleFactura.objects.create(
+                factura=factura, producto=producto, cantidad=1, precio_unitario=producto.precio, subtotal=producto.precio,
+            )
+
+    def matriz(self):
+        return sorted(
+            (p, r, v, round(s, 9))
+            for p, r, v, s in ProductoRelacionado.objects.values_list('producto', 'relacionado', 'veces', 'puntuacion')
+        )
+
+    def relacionados(self, producto):
+        return [(p['id'], p['veces']) for p in self.client.get(f'/api/v1/productos/{producto.pk}/relacionados/').data]
+
+    def test_actualizacion_incremental_igual_a_reconstruir(self):
+        self.cesta(self.a, self.b)
+        self.cesta(self.a, self.b, self.c)
+        recomendaciones.actualizar()
+        self.cesta(self.a, self.c)
+        self.cesta(self.b, self.c)
+        recomendaciones.actualizar()
+        incremental = self.matriz()
+
+        recomendaciones.reconstruir()
+
+        self.assertEqual(self.matriz(), incremental)
+        self.assertIn((self.a.pk, self.b.pk, 2, round(2 / 3, 9)), incremental)
+
+    def test_relacionados_con_veces_minimas(self):
+        self.cesta(self.a, self.b)
+        self.cesta(self.a, self.c)
+        recomendaciones.actualizar()
+        self.assertEqual(self.relacionados(self.a), [])
+
+        self.cesta(self.a, self.b)
+        recomendaciones.actualizar()
+        self.assertEqual(self.relacionados(self.a), [(self.b.pk, 2)])
+
+
+class PronosticosTest(BaseAPITest):
+    def test_serie_constante_y_estacional(self):
+        semana = np.array([10, 10, 10, 10, 10, 0, 0], dtype=np.float64)
+        ventas = np.vstack([np.full(56, 5.0), np.tile(semana, 8)])
+
+        pronostico, error = pronosticos.ajustar(ventas, 14, (0.1, 0.3), (0.05, 0.2), 0.02, 0.9)
+
+        self.assertEqual(pronostico.shape, (2, 14))
+        np.testing.assert_allclose(pronostico[0], 5, atol=1e-6)
+        np.testing.assert_allclose(pronostico[1], np.tile(semana, 2), atol=0.5)
+        np.testing.assert_allclose(error, 0, atol=1e-6)
+
+    def test_generar_y_consultar_pronosticos(self):
+        producto = self.crear_producto(nombre='A')
+        sin_ventas = self.crear_producto(nombre='B')
+        hoy = timezone.localdate()
+        for dias in range(1, 29):
+            factura = Factura.objects.create(
+                empleado=self.empleado, fecha=hoy - timedelta(days=dias), total=0, subtotal=0, igv=0,
+            )
+            DetalleFactura.objects.create(
+                factura=factura, producto=producto, cantidad=3, precio_unitario=producto.precio, subtotal=producto.precio * 3,
+            )
+
+        self.assertEqual(pronosticos.generar_pronosticos(), 1)
+
+        datos = self.client.get(f'/api/v1/productos/{producto.pk}/pronostico/').data
+        self.assertEqual(len(datos['diario']), 28)
+        self.assertAlmostEqual(float(datos['total_semana']), 21, delta=0.5)
+        self.assertEqual(self.client.get(f'/api/v1/productos/{sin_ventas.pk}/pronostico/').status_code, 404)
+        categoria = self.client.get(f'/api/v1/categorias/{self.categoria.pk}/pronostico/').data
+        self.assertEqual((categoria['productos'], categoria['total_horizonte']), (1, Decimal(datos['total_horizonte'])))
+
+
+class AnaliticaProveedoresTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.producto = self.crear_producto()
+        self.pedido = Pedidos.objects.create(
+            fecha_pedido=date.today() - timedelta(days=3), proveedor=self.proveedor, producto=self.producto,
+            cantidad=10, precio_compra=Decimal('2.00'), estado='Pendiente',
+        )
+
+    def test_indicadores_por_proveedor(self):
+        self.client.patch(f'/api/v1/pedidos/{self.pedido.pk}/cambiar_estado/', {'estado': 'Completado'}, format='json')
+        self.vender(self.producto, 2)
+        hoy = timezone.localdate()
+
+        with self.assertNumQueries(5):
+            fila, = analitica.calcular(hoy - timedelta(days=30), hoy)
+
+        self.assertEqual((fila['id'], fila['pedidos'], fila['unidades_pedidas'], fila['unidades_recibidas']), (self.proveedor.pk, 1, 10, 10))
+        self.assertEqual((fila['unidades_vendidas'], fila['ventas'], fila['ventas_sin_igv']), (2, Decimal('23.60'), Decimal('20.00')))
+        self.assertEqual((fila['costo_ventas'], fila['margen']), (Decimal('4.00'), Decimal('16.00')))
+        self.assertEqual((fila['pedidos_completados'], fila['dias_entrega_promedio']), (1, 3.0))
+
+    def test_endpoint_usa_cache_y_valida_fechas(self):
+        url = '/api/v1/proveedores/analitica/'
+        self.assertEqual(self.client.get(url).data['proveedores'][0]['pedidos'], 1)
+
+        Pedidos.objects.create(
+            fecha_pedido=date.today(), proveedor=self.proveedor, producto=self.producto,
+            cantidad=1, precio_compra=Decimal('2.00'), estado='Pendiente',
+        )
+        self.assertEqual(self.client.get(url).data['proveedores'][0]['pedidos'], 1)
+        self.assertEqual(self.client.get(url, {'desde': '2024-02-01', 'hasta': '2024-01-01'}).status_code, 400)
+
+
+class ValoracionTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto()
+        for precio in ('2.00', '4.00'):
+            pedido = Pedidos.objects.create(
+                fecha_pedido=date.today(), proveedor=self.proveedor, producto=self.producto,
+                cantidad=10, precio_compra=Decimal(precio), estado='Pendiente',
+            )
+            pedido.estado = 'Completado'
+            pedido.save()
+        self.vender(self.producto, 4)
+
+    def comprobar(self):
+        total = valoracion.margen()['total']
+        self.assertEqual((total['ventas_sin_igv'], total['costo_ventas'], total['margen']), (Decimal('40.00'), Decimal('12.00'), Decimal('28.00')))
+        self.assertEqual(total['margen_porcentaje'], 70.0)
+
+        categoria, = valoracion.valorizar_inventario()['categorias']
+        self.assertEqual((categoria['categoria'], categoria['unidades'], categoria['valor']), (self.categoria.pk, 16, Decimal('48.00')))
+        producto, = valoracion.valorizar_inventario(self.categoria.pk)['productos']
+        self.assertEqual((producto['stock'], producto['costo_promedio']), (16, Decimal('3.0000')))
+
+    def test_costo_promedio_ponderado(self):
+        self.comprobar()
+
+    def test_meses_cerrados_dan_el_mismo_resultado(self):
+        mes_anterior = date.today().replace(day=1) - timedelta(days=1)
+        MovimientoStock.objects.update(fecha=timezone.make_aware(datetime.combine(mes_anterior, time(12))))
+        Factura.objects.update(fecha=mes_anterior)
+
+        self.assertEqual(valoracion.cerrar_meses(), 1)
+        self.assertEqual(valoracion.cerrar_meses(), 0)
+        self.comprobar()
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/v1/reporte-margen/', {'desde': '2024-13'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/valorizacion-inventario/', {'categoria': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/reporte-margen/', {'desde': '2024-01'}).status_code, 200)
+
+
+class KardexSucursalTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.sucursal = Sucursal.objects.create(nombre='Local 1')
+        self.producto = self.crear_producto()
+        registrar_movimientos([MovimientoStock(producto=self.producto, cantidad=10, motivo='AJUSTE')])
+        transferir_stock(None, self.sucursal.pk, [(self.producto.pk, 4)])
+
+    def kardex(self, consulta=''):
+        respuesta = self.client.get(f'/api/v1/productos/{self.producto.pk}/kardex/{consulta}')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_kardex_central_cuadra_con_sus_saldos(self):
+        datos = self.kardex('?desde=2000-01-01')
+
+        cantidades = [m['cantidad'] for m in datos['results']]
+        self.assertEqual(sorted(cantidades), [-4, 10])
+        self.assertTrue(all(m['sucursal'] is None for m in datos['results']))
+        self.assertEqual(datos['saldo_inicial'] + sum(cantidades), datos['saldo_final'])
+        self.assertEqual((datos['saldo_final'], datos['stock_actual']), (6, 6))
+
+    def test_kardex_de_sucursal(self):
+        datos = self.kardex(f'?sucursal={self.sucursal.pk}&desde=2000-01-01')
+
+        self.assertEqual([m['cantidad'] for m in datos['results']], [4])
+        self.assertEqual((datos['saldo_inicial'], datos['saldo_final'], datos['stock_actual']), (0, 4, 4))
+        self.assertEqual(StockSucursal.objects.get(sucursal=self.sucursal, producto=self.producto).stock, 4)
+        self.assertEqual(self.stock(self.producto), 6)
+
+
+    def test_transferencia_sin_stock_no_mueve_nada(self):
+        respuesta = self.client.post('/api/v1/transferencias/', {
+            'origen': self.sucursal.pk, 'destino': None, 'lineas': [{'producto': self.producto.pk, 'cantidad': 5}],
+        }, format='json')
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(self.kardex(f'?sucursal={self.sucursal.pk}&desde=2000-01-01')['stock_actual'], 4)
+        self.assertEqual(self.stock(self.producto), 6)
+
+
+class ArchivoReportesTest(BaseAPITest):
+    """Los reportes dan las mismas cifras antes y después de archivar un periodo."""
+
+    def setUp(self):
+        super().setUp()
+        self.cliente = User.objects.create_user('cli', 'cli@farmavida.pe', 'clave')
+        self.producto = self.crear_producto(nombre='A')
+        self.otro = self.crear_producto(nombre='B', precio_sin_igv='20')
+        hoy = timezone.localdate().replace(day=1)
+        self.meses = [self.mes_anterior(hoy, k) for k in (15, 14, 2, 0)]
+        for mes in self.meses:
+            for cantidad in (1, 2):
+                factura = Factura.objects.create(
+                    empleado=self.empleado, fecha=mes.replace(day=5), total=self.producto.precio * cantidad,
+                    subtotal=self.producto.precio_sin_igv * cantidad, igv=(self.producto.precio - self.producto.precio_sin_igv) * cantidad,
+                )
+                DetalleFactura.objects.create(
+                    factura=factura, producto=self.producto, cantidad=cantidad,
+                    precio_unitario=self.producto.precio, subtotal=self.producto.precio * cantidad,
+                )
+            factura = FacturaCliente.objects.create(
+                cliente=self.cliente, total=self.otro.precio, subtotal=self.otro.precio_sin_igv,
+                igv=self.otro.precio - self.otro.precio_sin_igv,
+            )
+            FacturaCliente.objects.filter(pk=factura.pk).update(
+                fecha=timezone.make_aware(datetime.combine(mes.replace(day=10), time.min))
+            )
+            DetalleFacturaCliente.objects.create(
+                factura=factura, producto=self.otro, cantidad=1, precio_unitario=self.otro.precio, subtotal=self.otro.precio,
+            )
+
+    @staticmethod
+    def mes_anterior(mes, meses):
+        for _ in range(meses):
+            mes = (mes - timedelta(days=1)).replace(day=1)
+        return mes
+
+    def cifras(self):
+        general = self.client.get('/api/v1/reporte-general/').data
+        resultado = {
+            'general': [Decimal(str(general[c])) for c in ('total_facturado', 'total_igv', 'total_subtotal')],
+            'mas_vendidos': [(p['producto']['id'], p['total_vendido']) for p in general['productos_vendidos']],
+            'lista_mas_vendidos': [p['id'] for p in self.client.get('/api/v1/productos-mas-vendidos/').data],
+        }
+        for mes in self.meses[:2]:
+            mensual = self.client.get(f'/api/v1/reporte-mensual/{mes.year}/{mes.month}/').json()
+            resultado[mes] = (
+                [Decimal(mensual[c]) for c in ('total_facturado', 'total_igv', 'total_subtotal')],
+                mensual['total_pedidos_count'],
+                [(p['producto']['id'], p['total_vendido']) for p in mensual['productos_vendidos']],
+                [Decimal(p['monto_total']) for p in mensual['proveedores']],
+            )
+        return resultado
+
+    def test_reportes_iguales_tras_archivar(self):
+        antes = self.cifras()
+
+        archivadas = archivo.archivar_periodo()
+
+        self.assertEqual(archivadas, {'tienda': 4, 'cliente': 2})
+        self.assertEqual(FacturaArchivada.objects.count(), 4)
+        self.assertEqual(Factura.objects.count(), 4)
+        self.assertEqual(self.cifras(), antes)
+
+    def test_recompra_incluye_el_archivo(self):
+        self.client.force_authenticate(self.cliente)
+        antes = self.client.get('/api/v1/facturas-cliente/recompra/').json()
+
+        archivo.archivar_periodo()
+
+        despues = self.client.get('/api/v1/facturas-cliente/recompra/').json()
+        self.assertEqual(despues, antes)
+        self.assertEqual(despues[0]['compras'], 4)
+
+
+class ListadoFacturasTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.cliente = User.objects.create_user('cli', 'cli@farmavida.pe', 'clave', first_name='Luis', last_name='Q')
+        self.productos = [self.crear_producto(stock=20, nombre=f'P{i}') for i in range(3)]
+        for cantidad in (1, 2, 3):
+            factura = self.vender(self.productos[0], 1).data
+            Factura.objects.filter(pk=factura['id']).update(total=cantidad)
+            DetalleFactura.objects.bulk_create([
+                DetalleFactura(factura_id=factura['id'], producto=p, cantidad=1, precio_unitario=p.precio, subtotal=p.precio)
+                for p in self.productos[1:cantidad]
+            ])
+            factura = FacturaCliente.objects.create(cliente=self.cliente, total=cantidad, subtotal=0, igv=0)
+            DetalleFacturaCliente.objects.bulk_create([
+                DetalleFacturaCliente(factura=factura, producto=p, cantidad=1, precio_unitario=p.precio, subtotal=p.precio)
+                for p in self.productos[:cantidad]
+            ])
+
+    def test_listado_de_facturas_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            datos = self.client.get('/api/v1/facturas/').data
+
+        self.assertEqual(sorted(f['lineas'] for f in datos), [1, 2, 3])
+        self.assertNotIn('detalles', datos[0])
+        detalle = self.client.get(f"/api/v1/facturas/{datos[0]['id']}/").data
+        self.assertEqual(len(detalle['detalles']), datos[0]['lineas'])
+
+    def test_listado_de_facturas_de_cliente_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            datos = self.client.get('/api/v1/facturas-cliente/').data
+
+        self.assertEqual(sorted(f['lineas'] for f in datos), [1, 2, 3])
+        self.assertEqual(datos[0]['cliente'], 'Luis Q')
+        self.assertNotIn('detalles', datos[0])
+
+    def test_detalle_sin_consultas_por_linea(self):
+        factura = FacturaCliente.objects.get(total=3)
+
+        with self.assertNumQueries(3):
+            datos = self.client.get(f'/api/v1/facturas-cliente/{factura.pk}/').data
+
+        self.assertEqual(sorted(d['producto'] for d in datos['detalles']), ['P0', 'P1', 'P2'])
+
+
+class LecturaRapidaTest(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        self.crear_producto(stock=3, nombre='A', precio_sin_igv='12.5')
+        con_imagen = self.crear_producto(stock=3, nombre='B')
+        Producto.objects.filter(pk=con_imagen.pk).update(imagen='productos/b.png')
+        self.peticion = RequestFactory().get('/api/v1/productos/')
+
+    def serializar(self, request):
+        productos = Producto.objects.order_by('id')
+        contexto = {'request': request} if request else {}
+        return [dict(fila) for fila in ProductoSerializer(productos, many=True, context=contexto).data]
+
+    def test_misma_salida_que_el_serializer(self):
+        for request in (self.peticion, None):
+            self.assertEqual(lecturas.productos(Producto.objects.order_by('id'), request), self.serializar(request))
+
+    def test_listado_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            datos = self.client.get('/api/v1/productos/', {'categoria_id': self.categoria.pk}).data
+
+        self.assertEqual(sorted(p['nombre'] for p in datos), ['A', 'B'])
+        self.assertEqual({p['precio'] for p in datos}, {'14.75', '11.80'})
+        self.assertTrue(next(p for p in datos if p['nombre'] == 'B')['imagen_url'].startswith('http://testserver/'))
+
+    def test_benchmark_verifica_la_salida(self):
+        salida = StringIO()
+        call_command('benchmark_serializacion', iteraciones=1, stdout=salida)
+        self.assertIn('2 productos', salida.getvalue())
+
+        Producto.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('benchmark_serializacion', iteraciones=1, stdout=StringIO())
+
+    def test_reporte_mensual_usa_la_misma_forma_de_producto(self):
+        for producto in Producto.objects.all():
+            self.vender(producto, 1)
+        hoy = date.today()
+
+        datos = self.client.get(f'/api/v1/reporte-mensual/{hoy.year}/{hoy.month}/').json()
+
+        listado = {p['id']: p for p in self.client.get('/api/v1/productos/').json()}
+        self.assertEqual(len(datos['productos_vendidos']), 2)
+        for vendido in datos['productos_vendidos']:
+            self.assertEqual(vendido['producto'], listado[vendido['producto']['id']])
+            self.assertEqual(vendido['total_vendido'], 1)
+        self.assertEqual((datos['total_facturado'], datos['total_pedidos_count']), ('26.55', 2))
+        self.assertEqual([Decimal(p['monto_total']) for p in datos['proveedores']], [Decimal('26.55')])
@@ -1,11 +1,16 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import vistas_async
 from .views import (
     PersonaViewSet, EmpleadoViewSet, ClienteViewSet, ProductoPorCategoriaView, ProductosMasVendidosAPIView, ProveedorViewSet,
     CategoriaViewSet, ProductoViewSet, MedicamentoViewSet, RegisterView,
     FacturaViewSet, PedidosViewSet, CurrentUserView, check_superuser, generar_pdf_factura, generar_pdf_factura_cliente, generar_reporte_pdf_cliente,
     landing_page, RegisterClienteView, MedicamentoDetailView, proveedores_top_view, reporte_general, reporte_mensual, descargar_reporte_general, 
-    FacturaClienteViewSet, CurrentUserManagementView, reporte_general_clientes, reporte_mensual_clientes,  reporte_mensualpdf
+    FacturaClienteViewSet, CurrentUserManagementView, reporte_general_clientes, reporte_mensual_clientes,  reporte_mensualpdf,
+    LoteViewSet, AlertaInventarioViewSet, ReposicionView, OrdenCompraViewSet, reporte_margen, valorizacion_inventario,
+    SucursalViewSet, TransferenciaStockViewSet, FacturaArchivadaViewSet, FacturaClienteArchivadaViewSet,
+    FacturacionMensualViewSet,
 )
 
 router = DefaultRouter()
@@ -19,6 +24,14 @@ router.register(r'facturas-cliente', FacturaClienteViewSet, basename='factura-cl
 router.register(r'medicamentos', MedicamentoViewSet)
 router.register(r'facturas', FacturaViewSet, basename='factura')
 router.register(r'pedidos', PedidosViewSet)
+router.register(r'lotes', LoteViewSet)
+router.register(r'alertas', AlertaInventarioViewSet)
+router.register(r'ordenes-compra', OrdenCompraViewSet)
+router.register(r'sucursales', SucursalViewSet)
+router.register(r'transferencias', TransferenciaStockViewSet)
+router.register(r'archivo/facturas', FacturaArchivadaViewSet)
+router.register(r'archivo/facturas-cliente', FacturaClienteArchivadaViewSet)
+router.register(r'archivo/facturacion-mensual', FacturacionMensualViewSet)
 
 urlpatterns = [
     # Landing page
@@ -44,6 +57,10 @@ urlpatterns = [
     path('v1/reporte-mensual/<int:year>/<int:month>/', reporte_mensual, name='reporte-mensual'),
     path('v1/reporte-mensual-pdf/<int:year>/<int:month>/', reporte_mensualpdf, name='reporte_mensual_pdf'),
 
+    # Margen bruto y valorización de inventario
+    path('v1/reporte-margen/', reporte_margen, name='reporte-margen'),
+    path('v1/valorizacion-inventario/', valorizacion_inventario, name='valorizacion-inventario'),
+
     # Register paths
     path('v1/register_cliente/', RegisterClienteView.as_view(), name='register_cliente'),
     
@@ -64,4 +81,20 @@ urlpatterns = [
     
     # Proveedor paths
     path('v1/proveedores-top/', proveedores_top_view, name='proveedores_top'),
+
+    # Reposición sugerida
+    path('v1/reposicion/', ReposicionView.as_view(), name='reposicion'),
+
+    # Feed en vivo (SSE) de stock y ventas
+    path('v1/eventos/', vistas_async.eventos_inventario, name='eventos'),
 ]
+
+if settings.VISTAS_ASYNC:
+    # Lecturas del catálogo y del usuario en versión async; van primero para tener prioridad
+    urlpatterns = [
+        path('v1/productos/', vistas_async.productos, name='producto-list'),
+        path('v1/productos/categoria/<int:categoria_id>/', vistas_async.productos_por_categoria, name='productos_por_categoria'),
+        path('api/medicamentos/<int:pk>/', vistas_async.medicamento_detalle, name='detalle_medicamento'),
+        path('v1/current-user/', vistas_async.usuario_actual, name='current_user'),
+        path('auth/check-superuser/', vistas_async.verificar_superusuario, name='check_superuser'),
+    ] + urlpatterns
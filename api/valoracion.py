@@ -0,0 +1,341 @@
+"""
+Costo promedio ponderado periódico (mensual) y valorización del inventario.
+
+Cada mes, el costo de un producto es (valor del saldo inicial + valor de lo
+comprado en el mes) / (unidades iniciales + unidades compradas). Ese costo
+valoriza lo vendido y el saldo final. Las entradas sin precio (apertura,
+ajustes) se valorizan al costo vigente.
+
+Los movimientos se agrupan en SQL por producto y mes, y la recurrencia avanza
+mes a mes sobre todo el catálogo con NumPy. Los meses cerrados quedan en
+CierreCosto, de modo que los reportes solo recalculan los meses abiertos.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import DateField, DecimalField, ExpressionWrapper, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .analitica import costos_promedio
+from .models import (
+    Categoria, CierreCosto, DetalleFactura, DetalleFacturaCliente, MovimientoStock, Producto,
+    StockSucursal,
+)
+from .precios import redondear, tasa_igv
+
+VENTAS = ('VENTA', 'VENTA_CLIENTE')
+LOTE = 2000
+
+
+def _siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _inicio(mes):
+    return timezone.make_aware(datetime.combine(mes, time.min))
+
+
+def _meses(desde, hasta):
+    """Primeros días de los meses en [desde, hasta)."""
+    meses = []
+    while desde < hasta:
+        meses.append(desde)
+        desde = _siguiente(desde)
+    return meses
+
+
+def _mes(valor):
+    if isinstance(valor, datetime):
+        valor = timezone.localtime(valor).date() if timezone.is_aware(valor) else valor.date()
+    return valor.replace(day=1)
+
+
+class Catalogo:
+    """Ids de producto ordenados y su categoría, para alinear las matrices."""
+
+    def __init__(self):
+        filas = list(Producto.objects.order_by('pk').values_list('pk', 'categoria_id'))
+        self.ids = np.array([pk for pk, _ in filas], dtype=np.int64)
+        self.categorias = np.array([c or 0 for _, c in filas], dtype=np.int64)
+
+    def posiciones(self, producto_ids):
+        producto_ids = np.asarray(producto_ids, dtype=np.int64)
+        posiciones = np.searchsorted(self.ids, producto_ids)
+        validas = (posiciones < len(self.ids)) & (self.ids[np.minimum(posiciones, len(self.ids) - 1)] == producto_ids)
+        return posiciones, validas
+
+    def vector(self, valores):
+        """Diccionario {producto_id: valor} como arreglo alineado con el catálogo."""
+        arreglo = np.zeros(len(self.ids))
+        if valores:
+            posiciones, validas = self.posiciones(list(valores))
+            arreglo[posiciones[validas]] = np.array([float(v) for v in valores.values()])[validas]
+        return arreglo
+
+
+def _matrices(catalogo, meses):
+    """Movimientos del kardex e ingresos por venta agrupados por producto y mes."""
+    forma = (len(catalogo.ids), len(meses))
+    neto, comprado, valor_compras, vendido, ingresos = (np.zeros(forma) for _ in range(5))
+    if not meses:
+        return neto, comprado, valor_compras, vendido, ingresos
+    columna = {mes: i for i, mes in enumerate(meses)}
+    inicio, fin = _inicio(meses[0]), _inicio(_siguiente(meses[-1]))
+
+    def acumular(filas, destinos):
+        filas = [fila for fila in filas if _mes(fila[1]) in columna]
+        if not filas:
+            return
+        posiciones, validas = catalogo.posiciones([fila[0] for fila in filas])
+        columnas = np.array([columna[_mes(fila[1])] for fila in filas])
+        for i, destino in enumerate(destinos, start=2):
+            valores = np.array([float(fila[i] or 0) for fila in filas])
+            np.add.at(destino, (posiciones[validas], columnas[validas]), valores[validas])
+
+    valor_pedido = ExpressionWrapper(
+        F('cantidad') * F('pedido__precio_compra'), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+    acumular(
+        MovimientoStock.objects
+        .filter(fecha__gte=inicio, fecha__lt=fin)
+        .annotate(mes=TruncMonth('fecha'))
+        .values('producto_id', 'mes')
+        .annotate(
+            neto=Sum('cantidad'),
+            comprado=Sum('cantidad', filter=Q(motivo='PEDIDO')),
+            valor=Sum(valor_pedido, filter=Q(motivo='PEDIDO')),
+            vendido=Sum('cantidad', filter=Q(motivo__in=VENTAS)),
+        )
+        .order_by()
+        .values_list('producto_id', 'mes', 'neto', 'comprado', 'valor', 'vendido'),
+        (neto, comprado, valor_compras, vendido),
+    )
+    vendido *= -1  # Las salidas se registran en negativo
+
+    tienda = (
+        DetalleFactura.objects
+        .filter(factura__fecha__gte=meses[0], factura__fecha__lt=_siguiente(meses[-1]))
+        .annotate(mes=TruncMonth('factura__fecha'))
+        .values('producto_id', 'mes')
+        .annotate(total=Sum('subtotal'))
+        .order_by()
+        .values_list('producto_id', 'mes', 'total')
+    )
+    clientes = (
+        DetalleFacturaCliente.objects
+        .filter(factura__fecha__gte=inicio, factura__fecha__lt=fin)
+        .annotate(mes=TruncMonth('factura__fecha', output_field=DateField()))
+        .values('producto_id', 'mes')
+        .annotate(total=Sum('subtotal'))
+        .order_by()
+        .values_list('producto_id', 'mes', 'total')
+    )
+    acumular(tienda.union(clientes, all=True), (ingresos,))
+    # Los precios de venta incluyen IGV
+    ingresos /= 1 + float(tasa_igv())
+    return neto, comprado, valor_compras, vendido, ingresos
+
+
+def _apertura(catalogo, mes_cerrado):
+    """Cantidad, valor y costo de cada producto al cierre de `mes_cerrado` (o ceros)."""
+    cantidad, valor, costo = (np.zeros(len(catalogo.ids)) for _ in range(3))
+    if mes_cerrado is None:
+        return cantidad, valor, costo
+    filas = list(CierreCosto.objects.filter(mes=mes_cerrado).values_list('producto_id', 'cantidad', 'valor', 'costo_promedio'))
+    if filas:
+        posiciones, validas = catalogo.posiciones([fila[0] for fila in filas])
+        for i, destino in enumerate((cantidad, valor, costo), start=1):
+            destino[posiciones[validas]] = np.array([float(fila[i]) for fila in filas])[validas]
+    return cantidad, valor, costo
+
+
+def calcular(catalogo, meses, mes_cerrado):
+    """
+    Recorre `meses` partiendo del cierre de `mes_cerrado`. Devuelve matrices
+    (productos x meses): cantidad, valor, costo, vendido, ingresos y costo de ventas.
+    """
+    neto, comprado, valor_compras, vendido, ingresos = _matrices(catalogo, meses)
+    cantidad, valor, costo = _apertura(catalogo, mes_cerrado)
+    respaldo = catalogo.vector(costos_promedio())
+
+    forma = neto.shape
+    cantidades, valores, costos, costo_ventas = (np.zeros(forma) for _ in range(4))
+    for m in range(len(meses)):
+        base = np.maximum(cantidad, 0) + comprado[:, m]
+        costo = np.where(base > 0, (np.maximum(valor, 0) + valor_compras[:, m]) / np.where(base > 0, base, 1), costo)
+        costo = np.where(costo > 0, costo, respaldo)
+        costo_ventas[:, m] = vendido[:, m] * costo
+        cantidad = cantidad + neto[:, m]
+        valor = np.maximum(cantidad, 0) * costo
+        cantidades[:, m], valores[:, m], costos[:, m] = cantidad, valor, costo
+    return {
+        'cantidad': cantidades, 'valor': valores, 'costo': costos,
+        'vendido': vendido, 'ingresos': ingresos, 'costo_ventas': costo_ventas,
+        'actividad': (neto != 0) | (ingresos != 0),
+    }
+
+
+def ultimo_cierre():
+    return CierreCosto.objects.aggregate(m=Max('mes'))['m']
+
+
+def _primer_mes():
+    primero = MovimientoStock.objects.aggregate(m=Min('fecha'))['m']
+    return _mes(primero) if primero else None
+
+
+def cerrar_meses():
+    """
+    Guarda los cierres de los meses completos aún no cerrados. Devuelve la
+    cantidad de filas creadas.
+    """
+    cerrado = ultimo_cierre()
+    desde = _siguiente(cerrado) if cerrado else _primer_mes()
+    hasta = timezone.localdate().replace(day=1)
+    if desde is None or desde >= hasta:
+        return 0
+
+    catalogo = Catalogo()
+    meses = _meses(desde, hasta)
+    resultado = calcular(catalogo, meses, cerrado)
+    cierres = []
+    for m, mes in enumerate(meses):
+        filas = np.flatnonzero((resultado['cantidad'][:, m] != 0) | resultado['actividad'][:, m])
+        for i in filas.tolist():
+            cierres.append(CierreCosto(
+                producto_id=int(catalogo.ids[i]),
+                mes=mes,
+                cantidad=int(resultado['cantidad'][i, m]),
+                valor=redondear(Decimal(resultado['valor'][i, m])),
+                costo_promedio=Decimal(f"{resultado['costo'][i, m]:.4f}"),
+                unidades_vendidas=int(resultado['vendido'][i, m]),
+                ventas_sin_igv=redondear(Decimal(resultado['ingresos'][i, m])),
+                costo_ventas=redondear(Decimal(resultado['costo_ventas'][i, m])),
+            ))
+    with transaction.atomic():
+        CierreCosto.objects.bulk_create(cierres, batch_size=LOTE)
+    return len(cierres)
+
+
+def _abiertos():
+    """Catálogo, meses abiertos (posteriores al último cierre) y su cálculo."""
+    cerrado = ultimo_cierre()
+    desde = _siguiente(cerrado) if cerrado else _primer_mes()
+    catalogo = Catalogo()
+    meses = _meses(desde, _siguiente(timezone.localdate().replace(day=1))) if desde else []
+    return catalogo, meses, calcular(catalogo, meses, cerrado)
+
+
+def _fila(ventas, costo, **extra):
+    ventas, costo = redondear(Decimal(ventas)), redondear(Decimal(costo))
+    margen = ventas - costo
+    return {
+        **extra,
+        'ventas_sin_igv': ventas,
+        'costo_ventas': costo,
+        'margen': margen,
+        'margen_porcentaje': round(float(margen / ventas * 100), 2) if ventas else None,
+    }
+
+
+def margen(desde=None, hasta=None):
+    """
+    Ventas sin IGV, costo de ventas y margen por mes y por categoría entre los
+    meses `desde` y `hasta` (incluidos; None = sin límite).
+    """
+    catalogo, meses, abiertos = _abiertos()
+
+    cerrados = CierreCosto.objects.all()
+    if desde:
+        cerrados = cerrados.filter(mes__gte=desde)
+    if hasta:
+        cerrados = cerrados.filter(mes__lte=hasta)
+    por_mes = {
+        fila['mes']: [float(fila['ventas']), float(fila['costo'])]
+        for fila in cerrados.values('mes').annotate(ventas=Sum('ventas_sin_igv'), costo=Sum('costo_ventas')).order_by()
+    }
+    por_categoria = {
+        fila['producto__categoria']: [float(fila['ventas']), float(fila['costo'])]
+        for fila in (
+            cerrados.values('producto__categoria')
+            .annotate(ventas=Sum('ventas_sin_igv'), costo=Sum('costo_ventas'))
+            .order_by()
+        )
+    }
+
+    incluidas = [m for m, mes in enumerate(meses) if (not desde or mes >= desde) and (not hasta or mes <= hasta)]
+    if incluidas:
+        ingresos = abiertos['ingresos'][:, incluidas]
+        costo_ventas = abiertos['costo_ventas'][:, incluidas]
+        for columna, m in enumerate(incluidas):
+            acumulado = por_mes.setdefault(meses[m], [0.0, 0.0])
+            acumulado[0] += ingresos[:, columna].sum()
+            acumulado[1] += costo_ventas[:, columna].sum()
+        claves, inversa = np.unique(catalogo.categorias, return_inverse=True)
+        ventas_categoria = np.zeros(len(claves))
+        costo_categoria = np.zeros(len(claves))
+        np.add.at(ventas_categoria, inversa, ingresos.sum(axis=1))
+        np.add.at(costo_categoria, inversa, costo_ventas.sum(axis=1))
+        for clave, ventas, costo in zip(claves.tolist(), ventas_categoria.tolist(), costo_categoria.tolist()):
+            if ventas or costo:
+                acumulado = por_categoria.setdefault(clave or None, [0.0, 0.0])
+                acumulado[0] += ventas
+                acumulado[1] += costo
+
+    nombres = dict(Categoria.objects.filter(pk__in=[k for k in por_categoria if k]).values_list('pk', 'nombre'))
+    return {
+        'meses': [_fila(v, c, mes=mes.strftime('%Y-%m')) for mes, (v, c) in sorted(por_mes.items())],
+        'categorias': sorted(
+            (_fila(v, c, categoria=k, nombre=nombres.get(k)) for k, (v, c) in por_categoria.items()),
+            key=lambda fila: -fila['ventas_sin_igv'],
+        ),
+        'total': _fila(sum(v for v, _ in por_mes.values()), sum(c for _, c in por_mes.values())),
+    }
+
+
+def valorizar_inventario(categoria_id=None):
+    """
+    Stock actual de la cadena (almacén central más todas las sucursales)
+    valorizado al costo promedio vigente, por categoría; con `categoria_id`, el
+    detalle por producto de esa categoría.
+    """
+    catalogo, meses, abiertos = _abiertos()
+    # Sin movimientos en el kardex no hay meses abiertos: se usa el costo de los pedidos
+    costo = abiertos['costo'][:, -1] if meses else catalogo.vector(costos_promedio())
+    stock = catalogo.vector(dict(Producto.objects.values_list('pk', 'stock'))) + catalogo.vector(dict(
+        StockSucursal.objects.values('producto_id').annotate(total=Sum('stock')).order_by().values_list('producto_id', 'total')
+    ))
+    valor = stock * costo
+
+    if categoria_id is not None:
+        seleccion = np.flatnonzero((catalogo.categorias == int(categoria_id)) & (stock > 0))
+        nombres = dict(Producto.objects.filter(categoria_id=categoria_id).values_list('pk', 'nombre'))
+        productos = [
+            {
+                'producto': int(catalogo.ids[i]),
+                'nombre': nombres.get(int(catalogo.ids[i])),
+                'stock': int(stock[i]),
+                'costo_promedio': Decimal(f"{costo[i]:.4f}"),
+                'valor': redondear(Decimal(valor[i])),
+            }
+            for i in seleccion.tolist()
+        ]
+        productos.sort(key=lambda fila: -fila['valor'])
+        return {'categoria': int(categoria_id), 'productos': productos, 'valor': sum(p['valor'] for p in productos)}
+
+    claves, inversa = np.unique(catalogo.categorias, return_inverse=True)
+    valores = np.zeros(len(claves))
+    unidades = np.zeros(len(claves))
+    np.add.at(valores, inversa, valor)
+    np.add.at(unidades, inversa, stock)
+    nombres = dict(Categoria.objects.values_list('pk', 'nombre'))
+    categorias = [
+        {'categoria': clave or None, 'nombre': nombres.get(clave), 'unidades': int(u), 'valor': redondear(Decimal(v))}
+        for clave, u, v in zip(claves.tolist(), unidades.tolist(), valores.tolist())
+        if u
+    ]
+    categorias.sort(key=lambda fila: -fila['valor'])
+    return {'categorias': categorias, 'valor': sum((c['valor'] for c in categorias), Decimal('0.00'))}
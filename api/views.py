@@ -1,4 +1,5 @@
-from datetime import datetime
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 from io import BytesIO
 from reportlab.lib import colors
@@ -6,10 +7,12 @@ from reportlab.lib import colors
 # Django imports
 from django.views import View
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.http import HttpResponse, JsonResponse
 from django.template.loader import render_to_string, get_template
 from django.shortcuts import get_object_or_404, render
-from django.db.models import Sum, Count, ExpressionWrapper, F, DecimalField
+from django.db import transaction
+from django.db.models import Sum, Count, ExpressionWrapper, F, DecimalField, Q
 from django.contrib.auth.models import User
 
 # DRF imports
@@ -19,6 +22,7 @@ from rest_framework.generics import RetrieveAPIView
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
 # Otros
@@ -28,12 +32,34 @@ from reportlab.lib.pagesizes import letter
 
 from .models import (
     DetalleFactura, DetalleFacturaCliente, FacturaCliente, Persona, Empleado, Clientes, Proveedor,
-    Categoria, Producto, Medicamento, Factura, Pedidos, 
+    Categoria, Producto, Medicamento, Factura, Pedidos, MovimientoStock, Lote, AlertaInventario,
+    SugerenciaReposicion, OrdenCompra, PronosticoVenta, Sucursal, StockSucursal, TransferenciaStock,
+    FacturaArchivada, FacturaClienteArchivada, FacturacionMensual,
 )
 from .serializers import (
     FacturaClienteSerializer, PersonaSerializer, EmpleadoSerializer, ClientesSerializer, ProveedorSerializer,
     CategoriaSerializer, ProductoSerializer, MedicamentoSerializer, FacturaSerializer,
-    PedidosSerializer, UserSerializer, ProveedorTopSerializer,
+    PedidosSerializer, UserSerializer, ProveedorTopSerializer, MovimientoStockSerializer, LoteSerializer,
+    AlertaInventarioSerializer, OrdenCompraSerializer, ResumenClienteSerializer, ProductoRelacionadoSerializer,
+    PronosticoVentaSerializer, SucursalSerializer, StockSucursalSerializer, TransferenciaStockSerializer,
+    FacturaArchivadaSerializer, FacturaClienteArchivadaSerializer, FacturacionMensualSerializer,
+    FacturaListaSerializer, FacturaClienteListaSerializer,
+)
+from .reposicion import generar_sugerencias
+from .pedidos import TransicionInvalida, transicionar_pedidos, transicionar_por_id
+from .idempotencia import idempotente
+from . import sentencias
+from .precios import desglosar, redondear, repreciar
+from .sincronizacion import MAXIMO_LOTE, sincronizar_facturas
+from .eventos import publicar_ventas
+from . import archivo, lecturas, resumenes
+from .recomendaciones import relacionados
+from .pronosticos import pronostico_categoria
+from .analitica import analitica_proveedores
+from .valoracion import margen as margen_ventas, valorizar_inventario
+from .inventario import (
+    StockInsuficiente, lotes_por_vencer, movimientos_fefo, registrar_movimientos, stock_a_fecha, stock_sucursal,
+    transferir_stock,
 )
 @api_view(['GET'])
 def proveedores_top_view(request):
@@ -73,19 +99,12 @@ from .models import Producto, DetalleFactura
 
 class ProductosMasVendidosAPIView(APIView):
     def get(self, request, *args, **kwargs):
-        # Obtener los productos más vendidos sumando la cantidad vendida en cada detalle de factura
-        productos_mas_vendidos = (
-            DetalleFactura.objects
-            .values('producto')
-            .annotate(total_vendido=Sum('cantidad'))  # Sumar la cantidad vendida de cada producto
-            .order_by('-total_vendido')  # Ordenar de mayor a menor por cantidad vendida
-        )
+        # Productos ordenados por unidades vendidas, incluidos los periodos archivados
+        ventas = mas_vendidos(DetalleFactura.objects.all(), 'tienda', limite=None)
         
-        # Obtener los productos correspondientes a los resultados
-        productos = []
-        for detalle in productos_mas_vendidos:
-            producto = Producto.objects.get(id=detalle['producto'])
-            productos.append(producto)
+        # Obtener los productos correspondientes a los resultados en una sola consulta
+        productos = Producto.objects.select_related('proveedor', 'categoria').in_bulk([v['producto'] for v in ventas])
+        productos = [productos[v['producto']] for v in ventas if v['producto'] in productos]
         
         # Serializar los productos
         serializer = ProductoSerializer(productos, many=True)
@@ -111,9 +130,9 @@ class CurrentUserView(APIView):
     def get(self, request):
         user = request.user
 
-        # Recuperar el cliente asociado al usuario
+        # Recuperar el cliente asociado al usuario (cargado junto con el usuario autenticado)
         try:
-            cliente = Clientes.objects.get(user=user)
+            cliente = user.clientes
         except Clientes.DoesNotExist:
             return Response({"error": "Cliente no encontrado"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -145,6 +164,177 @@ class CurrentUserManagementView(APIView):
             "is_superuser": user.is_superuser,
         }, status=status.HTTP_200_OK)
     
+def fecha_param(valor):
+    """Convierte un parámetro 'YYYY-MM-DD' o ISO 8601 en datetime con zona horaria."""
+    if not valor:
+        return None
+    fecha = parse_datetime(valor)
+    if fecha is None:
+        dia = parse_date(valor)
+        if dia is None:
+            return None
+        fecha = datetime.combine(dia, time.min)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+def mes_param(valor):
+    """Convierte un parámetro 'YYYY-MM' en el primer día del mes (None si no es válido)."""
+    try:
+        return parse_date(f"{valor}-01") if valor else None
+    except ValueError:  # Formato correcto pero fecha imposible, como '2024-13'
+        return None
+
+def sucursal_param(request):
+    """Id del parámetro ?sucursal= para acotar un reporte a un local (None si no viene o no es válido)."""
+    valor = request.GET.get('sucursal')
+    return int(valor) if valor and valor.isdigit() else None
+
+def entero_param(valor):
+    """Un id o cantidad como entero (acepta "5"), o None si no es un entero válido."""
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, str) and valor.strip().isdigit():
+        return int(valor)
+    return None
+
+def lineas_venta(detalles):
+    """Los detalles de una venta como (producto_id, cantidad) enteros; ValueError si alguno no lo es."""
+    if not isinstance(detalles, list) or not all(isinstance(d, dict) for d in detalles):
+        raise ValueError("'detalles' debe ser una lista de líneas.")
+    lineas = []
+    for detalle in detalles:
+        producto_id, cantidad = entero_param(detalle.get("producto")), entero_param(detalle.get("cantidad"))
+        if producto_id is None or cantidad is None or cantidad <= 0:
+            raise ValueError("Cada detalle necesita 'producto' y 'cantidad' enteros positivos.")
+        lineas.append((producto_id, cantidad))
+    return lineas
+
+def rango_mes(year, month, con_hora=False):
+    """Límites [desde, hasta) de un mes, como fechas o como datetimes locales."""
+    desde = date(year, month, 1)
+    hasta = date(year + month // 12, month % 12 + 1, 1)
+    if con_hora:
+        return tuple(timezone.make_aware(datetime.combine(d, time.min)) for d in (desde, hasta))
+    return desde, hasta
+
+def totales_generales(facturas, origen, sucursal_id=None):
+    """(total, igv, subtotal) de `facturas` más los de los periodos archivados de su origen."""
+    vivas = facturas.aggregate(total=Sum('total'), igv=Sum('igv'), subtotal=Sum('subtotal'))
+    archivadas = archivo.totales(origen, sucursal_id=sucursal_id)
+    return tuple((vivas[campo] or 0) + archivadas[campo] for campo in ('total', 'igv', 'subtotal'))
+
+def ventas_productos(detalles, origen, desde=None, hasta=None, sucursal_id=None):
+    """
+    Unidades e importe por producto de `detalles` más los meses archivados en
+    [desde, hasta): [{'producto', 'cantidad_vendida', 'subtotal'}, ...].
+    """
+    ventas = {
+        fila['producto']: [fila['cantidad_vendida'], fila['subtotal']]
+        for fila in detalles.values('producto').annotate(
+            cantidad_vendida=Sum('cantidad'), subtotal=Sum('subtotal')
+        ).order_by()
+    }
+    for producto_id, (unidades, importe) in archivo.ventas_por_producto(origen, desde, hasta, sucursal_id).items():
+        fila = ventas.setdefault(producto_id, [0, 0])
+        fila[0] += unidades
+        fila[1] += importe
+    return [
+        {'producto': producto_id, 'cantidad_vendida': unidades, 'subtotal': importe}
+        for producto_id, (unidades, importe) in ventas.items()
+    ]
+
+def mas_vendidos(detalles, origen, limite=5, sucursal_id=None):
+    """
+    Los `limite` productos con más unidades vendidas (todos con limite=None),
+    archivo incluido: [{'producto', 'total_vendido'}].
+    """
+    ventas = sorted(ventas_productos(detalles, origen, sucursal_id=sucursal_id), key=lambda v: -v['cantidad_vendida'])
+    return [{'producto': v['producto'], 'total_vendido': v['cantidad_vendida']} for v in ventas[:limite]]
+
+class PaginacionEstandar(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+class PaginacionHistorial(CursorPagination):
+    """Paginación por cursor: cada página cuesta lo mismo sin importar la antigüedad del cliente."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-fecha', '-id')
+
+class BulkMixin:
+    """
+    Operaciones en bloque para un ModelViewSet cuyo serializer usa ListaBulkSerializer:
+    POST con una lista crea todos los elementos; PATCH/DELETE sobre `bulk/` modifican
+    (lista de objetos con `id`) o eliminan ({"ids": [...]}) varios registros.
+    """
+    bulk_maximo = 5000
+
+    def _excede_maximo(self, cantidad):
+        if cantidad > self.bulk_maximo:
+            return Response(
+                {"error": f"Se admiten hasta {self.bulk_maximo} elementos por petición."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return None
+
+    _id_entero = staticmethod(entero_param)
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        error = self._excede_maximo(len(request.data))
+        if error:
+            return error
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        if request.method == 'DELETE':
+            ids = request.data.get('ids') if isinstance(request.data, dict) else None
+            if not isinstance(ids, list) or not ids:
+                return Response({"error": "Debe enviar 'ids' (lista)."}, status=status.HTTP_400_BAD_REQUEST)
+            error = self._excede_maximo(len(ids))
+            if error:
+                return error
+            invalidos = [pk for pk in ids if self._id_entero(pk) is None]
+            if invalidos:
+                return Response(
+                    {"error": "Los 'ids' deben ser enteros.", "invalidos": invalidos},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            ids = list(dict.fromkeys(self._id_entero(pk) for pk in ids))
+            queryset = self.get_queryset().filter(pk__in=ids)
+            existentes = set(queryset.values_list('pk', flat=True))
+            with transaction.atomic():
+                queryset.delete()
+            return Response({
+                "eliminados": sorted(existentes),
+                "no_encontrados": [pk for pk in ids if pk not in existentes],
+            })
+
+        if not isinstance(request.data, list) or not request.data:
+            return Response({"error": "Debe enviar una lista de objetos con 'id'."}, status=status.HTTP_400_BAD_REQUEST)
+        error = self._excede_maximo(len(request.data))
+        if error:
+            return error
+        # Los ids que no son enteros los rechaza la validación de cada elemento
+        ids = {self._id_entero(item.get('id')) for item in request.data if isinstance(item, dict)}
+        instancias = list(self.get_queryset().filter(pk__in=ids - {None}))
+        serializer = self.get_serializer(instancias, data=request.data, many=True, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+        return Response(serializer.data)
+
 class ProductoPorCategoriaView(APIView):
     def get(self, request, categoria_id, *args, **kwargs):
         productos = Producto.objects.filter(categoria_id=categoria_id)
@@ -170,16 +360,40 @@ class ClienteViewSet(viewsets.ModelViewSet):
     queryset = Clientes.objects.all()
     serializer_class = ClientesSerializer
 
-class ProveedorViewSet(viewsets.ModelViewSet):
+class ProveedorViewSet(BulkMixin, viewsets.ModelViewSet):
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def analitica(self, request):
+        """
+        Compras, unidades recibidas, ventas, margen y tiempo de entrega por proveedor
+        entre ?desde= y ?hasta= (YYYY-MM-DD; por defecto los últimos 90 días).
+        """
+        hasta = parse_date(request.query_params.get('hasta', '')) or timezone.localdate()
+        desde = parse_date(request.query_params.get('desde', '')) or hasta - timedelta(days=90)
+        if desde > hasta:
+            return Response({"error": "'desde' debe ser anterior a 'hasta'."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'desde': desde,
+            'hasta': hasta,
+            'proveedores': analitica_proveedores(desde, hasta),
+        })
+
+class CategoriaViewSet(BulkMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
 
-class ProductoViewSet(viewsets.ModelViewSet):
-    queryset = Producto.objects.all()
+    @action(detail=True, methods=['get'])
+    def pronostico(self, request, pk=None):
+        """Ventas diarias pronosticadas de la categoría (suma de sus productos)."""
+        datos = pronostico_categoria(pk)
+        if datos is None:
+            return Response({"error": "No hay pronósticos para esta categoría."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(datos)
+
+class ProductoViewSet(BulkMixin, viewsets.ModelViewSet):
+    queryset = Producto.objects.select_related('proveedor', 'categoria')
     serializer_class = ProductoSerializer
 
     def get_queryset(self):
@@ -189,6 +403,169 @@ class ProductoViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(categoria_id=categoria_id)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Lectura rápida: filas de values() sin instanciar modelos ni pasar por el serializer
+        return Response(lecturas.productos(self.filter_queryset(self.get_queryset()), request))
+
+    @action(detail=True, methods=['get'])
+    def kardex(self, request, pk=None):
+        """
+        Movimientos del producto entre `desde` y `hasta` con su saldo inicial, del
+        almacén central o del local indicado con ?sucursal=.
+        """
+        producto = self.get_object()
+        sucursal_id = sucursal_param(request)
+        desde = fecha_param(request.query_params.get('desde'))
+        hasta = fecha_param(request.query_params.get('hasta')) or timezone.now()
+
+        movimientos = MovimientoStock.objects.filter(producto=producto, sucursal_id=sucursal_id, fecha__lte=hasta)
+        saldo_inicial = 0
+        if desde:
+            movimientos = movimientos.filter(fecha__gt=desde)
+            saldo_inicial = stock_a_fecha(producto.id, desde, sucursal_id)
+
+        paginador = PaginacionEstandar()
+        pagina = paginador.paginate_queryset(movimientos, request, view=self)
+        respuesta = paginador.get_paginated_response(MovimientoStockSerializer(pagina, many=True).data)
+        respuesta.data['sucursal'] = sucursal_id
+        respuesta.data['saldo_inicial'] = saldo_inicial
+        respuesta.data['saldo_final'] = stock_a_fecha(producto.id, hasta, sucursal_id)
+        respuesta.data['stock_actual'] = stock_sucursal(sucursal_id, [producto.id]).get(producto.id, 0)
+        return respuesta
+
+    @action(detail=False, methods=['post'])
+    def repreciar(self, request):
+        """
+        Cambia en bloque el precio de una categoría o proveedor:
+        {"categoria" | "proveedor": id, "precio_sin_igv" | "porcentaje": valor}.
+        """
+        filtros = {campo: request.data[campo] for campo in ('categoria', 'proveedor') if request.data.get(campo)}
+        if not filtros:
+            return Response({"error": "Debe indicar 'categoria' o 'proveedor'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            actualizados = repreciar(
+                Producto.objects.filter(**filtros),
+                precio_sin_igv=request.data.get('precio_sin_igv'),
+                porcentaje=request.data.get('porcentaje'),
+            )
+        except ArithmeticError:
+            return Response(
+                {"error": "Indique un valor numérico en 'precio_sin_igv' o en 'porcentaje' (solo uno)."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"actualizados": actualizados})
+
+    @action(detail=True, methods=['get'])
+    def pronostico(self, request, pk=None):
+        """Ventas diarias pronosticadas del producto (última corrida de generar_pronosticos)."""
+        pronostico = PronosticoVenta.objects.filter(producto_id=pk).first()
+        if pronostico is None:
+            return Response({"error": "No hay pronóstico para este producto."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(PronosticoVentaSerializer(pronostico).data)
+
+    @action(detail=True, methods=['get'])
+    def relacionados(self, request, pk=None):
+        """Productos que se suelen comprar junto con este (?limite=, por defecto 10)."""
+        try:
+            limite = min(int(request.query_params.get('limite', 10)), 50)
+        except ValueError:
+            return Response({"error": "'limite' debe ser un entero."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ProductoRelacionadoSerializer(relacionados(pk, limite), many=True).data)
+
+class LoteViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Lote.objects.select_related('producto').order_by('producto_id', 'fecha_vencimiento')
+    serializer_class = LoteSerializer
+    pagination_class = PaginacionEstandar
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        producto_id = self.request.query_params.get('producto_id', None)
+        if producto_id is not None:
+            queryset = queryset.filter(producto_id=producto_id)
+        return queryset
+
+    @action(detail=False, methods=['get'], url_path='por-vencer')
+    def por_vencer(self, request):
+        try:
+            dias = int(request.query_params.get('dias', 30))
+        except ValueError:
+            return Response({"error": "El parámetro 'dias' debe ser un número entero."}, status=status.HTTP_400_BAD_REQUEST)
+
+        pagina = self.paginate_queryset(lotes_por_vencer(dias))
+        return self.get_paginated_response(self.get_serializer(pagina, many=True).data)
+
+class SucursalViewSet(viewsets.ModelViewSet):
+    queryset = Sucursal.objects.order_by('nombre')
+    serializer_class = SucursalSerializer
+
+    @action(detail=True, methods=['get'])
+    def stock(self, request, pk=None):
+        """Stock del local (?producto_id=, ?con_stock=true), leído solo de sus propias filas."""
+        sucursal = self.get_object()
+        stocks = StockSucursal.objects.filter(sucursal=sucursal).select_related('producto').order_by('producto_id')
+        producto_id = request.query_params.get('producto_id')
+        if producto_id is not None:
+            stocks = stocks.filter(producto_id=producto_id)
+        if request.query_params.get('con_stock', '').lower() == 'true':
+            stocks = stocks.filter(stock__gt=0)
+
+        paginador = PaginacionEstandar()
+        pagina = paginador.paginate_queryset(stocks, request, view=self)
+        return paginador.get_paginated_response(StockSucursalSerializer(pagina, many=True).data)
+
+class TransferenciaStockViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = TransferenciaStock.objects.prefetch_related('movimientos')
+    serializer_class = TransferenciaStockSerializer
+    pagination_class = PaginacionEstandar
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        sucursal = self.request.query_params.get('sucursal')
+        if sucursal is not None:
+            queryset = queryset.filter(Q(origen_id=sucursal) | Q(destino_id=sucursal))
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        """{"origen": id | null, "destino": id | null, "lineas": [{"producto", "cantidad"}, ...]}."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        cantidades = defaultdict(int)
+        for linea in datos['lineas']:
+            cantidades[linea['producto'].pk] += linea['cantidad']
+        try:
+            transferencia = transferir_stock(
+                datos['origen'].pk if datos.get('origen') else None,
+                datos['destino'].pk if datos.get('destino') else None,
+                list(cantidades.items()),
+                usuario=request.user if request.user.is_authenticated else None,
+                nota=datos.get('nota', ''),
+            )
+        except StockInsuficiente as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        transferencia = self.get_queryset().get(pk=transferencia.pk)
+        return Response(self.get_serializer(transferencia).data, status=status.HTTP_201_CREATED)
+
+class AlertaInventarioViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = AlertaInventario.objects.select_related('producto')
+    serializer_class = AlertaInventarioSerializer
+    pagination_class = PaginacionEstandar
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Por defecto solo las alertas vigentes (?activa=false para el histórico)
+        activa = self.request.query_params.get('activa', 'true').lower() != 'false'
+        queryset = queryset.filter(activa=activa)
+        tipo = self.request.query_params.get('tipo', None)
+        if tipo is not None:
+            queryset = queryset.filter(tipo=tipo)
+        sucursal_id = sucursal_param(self.request)
+        if sucursal_id is not None:
+            queryset = queryset.filter(sucursal_id=sucursal_id)
+        return queryset
+
 class MedicamentoViewSet(viewsets.ModelViewSet):
     queryset = Medicamento.objects.all()
     serializer_class = MedicamentoSerializer
@@ -202,53 +579,76 @@ class FacturaViewSet(viewsets.ModelViewSet):
     queryset = Factura.objects.all()
     serializer_class = FacturaSerializer
 
+    def get_queryset(self):
+        # El listado no trae detalles, solo cuántas líneas tiene cada factura
+        if self.action == 'list':
+            return Factura.objects.annotate(lineas=Count('detalles'))
+        return Factura.objects.prefetch_related('detalles__producto')
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return FacturaListaSerializer
+        return FacturaSerializer
+
+    @idempotente
     def create(self, request, *args, **kwargs):
         factura_data = request.data
 
+        try:
+            detalles = lineas_venta(factura_data.get("detalles"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             # Obtener el empleado y cliente
             empleado = Empleado.objects.get(id=factura_data["empleado"])
             cliente_nombre = factura_data["cliente"]  # Nombre del cliente como string
 
-            # Crear la factura inicial
-            factura = Factura.objects.create(
-                empleado=empleado,
-                cliente=cliente_nombre,
-                fecha=factura_data["fecha"]
-            )
-
-            # Crear los detalles de la factura y calcular el total
-            total = Decimal(0)
-            for detalle in factura_data["detalles"]:
-                producto = Producto.objects.get(id=detalle["producto"])
-                cantidad_vendida = detalle["cantidad"]
-
-                # Calcular subtotal del detalle (precio unitario con IGV * cantidad)
-                subtotal_detalle = producto.precio * Decimal(cantidad_vendida)
-                total += subtotal_detalle
-
-                # Crear detalle de factura
-                DetalleFactura.objects.create(
-                    factura=factura,
-                    producto=producto,
-                    cantidad=cantidad_vendida,
-                    precio_unitario=producto.precio,  # Precio con IGV
-                    subtotal=subtotal_detalle
+            with transaction.atomic():
+                # Crear la factura inicial, en la sucursal del cajero
+                factura = Factura.objects.create(
+                    empleado=empleado,
+                    cliente=cliente_nombre,
+                    fecha=factura_data["fecha"],
+                    sucursal_id=empleado.sucursal_id,
                 )
 
-                # Actualizar el stock del producto
-                producto.stock -= cantidad_vendida
-                producto.save()
+                # Todos los productos de la venta en una sola consulta
+                productos = sentencias.productos_por_id(producto_id for producto_id, _ in detalles)
+
+                # Crear los detalles de la factura y calcular el total
+                total = Decimal(0)
+                lineas = []
+                filas = []
+                for producto_id, cantidad_vendida in detalles:
+                    producto = productos.get(producto_id)
+                    if producto is None:
+                        raise Producto.DoesNotExist
+
+                    # Calcular subtotal del detalle (precio unitario con IGV * cantidad)
+                    subtotal_detalle = producto.precio * Decimal(cantidad_vendida)
+                    total += subtotal_detalle
 
-            # Calcular IGV y total
-            igv = total * Decimal(0.18)
-            subtotal = total - igv
+                    filas.append((producto.id, cantidad_vendida, producto.precio, subtotal_detalle))
+                    lineas.append((producto.id, cantidad_vendida))
 
-            # Actualizar los valores en la factura
-            factura.subtotal = subtotal
-            factura.igv = igv
-            factura.total = total
-            factura.save()
+                sentencias.insertar_detalles(DetalleFactura, factura, filas)
+
+                # Descontar el stock del local por lotes (FEFO) de todos los productos en un solo paso
+                registrar_movimientos(
+                    movimientos_fefo(lineas, 'VENTA', factura=factura, sucursal_id=empleado.sucursal_id)
+                )
+
+                # Los precios incluyen IGV: separar la base imponible del impuesto
+                total = redondear(total)
+                subtotal, igv = desglosar(total)
+
+                # Actualizar los valores en la factura
+                factura.subtotal = subtotal
+                factura.igv = igv
+                factura.total = total
+                factura.save()
+                publicar_ventas('tienda', [factura])
 
             # Serializar la factura
             serializer = FacturaSerializer(factura)
@@ -263,9 +663,92 @@ class FacturaViewSet(viewsets.ModelViewSet):
             return Response({"error": "Empleado no encontrado"}, status=status.HTTP_400_BAD_REQUEST)
         except Producto.DoesNotExist:
             return Response({"error": "Producto no encontrado"}, status=status.HTTP_400_BAD_REQUEST)
+        except StockInsuficiente as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'])
+    def sincronizar(self, request):
+        """
+        Recibe las facturas emitidas sin conexión por un punto de venta:
+        {"facturas": [{"uuid", "empleado", "cliente", "fecha", "detalles": [...]}, ...]}.
+        """
+        facturas = request.data.get('facturas')
+        if not isinstance(facturas, list) or not facturas:
+            return Response({"error": "Debe enviar 'facturas' (lista)."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(facturas) > MAXIMO_LOTE:
+            return Response(
+                {"error": f"Se admiten hasta {MAXIMO_LOTE} facturas por lote."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            resultados = sincronizar_facturas(facturas)
+        except StockInsuficiente as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({
+            "aceptadas": sum(r['resultado'] == 'aceptada' for r in resultados),
+            "resultados": resultados,
+        }, status=status.HTTP_200_OK)
+
+class FacturaArchivadaViewSet(viewsets.ReadOnlyModelViewSet):
+    """Facturas de tienda de periodos archivados (?desde=, ?hasta= fechas; ?sucursal=)."""
+    queryset = FacturaArchivada.objects.prefetch_related('detalles')
+    serializer_class = FacturaArchivadaSerializer
+    pagination_class = PaginacionEstandar
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        desde = parse_date(self.request.query_params.get('desde') or '')
+        hasta = parse_date(self.request.query_params.get('hasta') or '')
+        if desde:
+            queryset = queryset.filter(fecha__gte=desde)
+        if hasta:
+            queryset = queryset.filter(fecha__lte=hasta)
+        sucursal = self.request.query_params.get('sucursal')
+        if sucursal is not None:
+            queryset = queryset.filter(sucursal_id=sucursal)
+        return queryset
+
+class FacturaClienteArchivadaViewSet(viewsets.ReadOnlyModelViewSet):
+    """Facturas de cliente archivadas; cada cliente ve solo las suyas."""
+    queryset = FacturaClienteArchivada.objects.prefetch_related('detalles')
+    serializer_class = FacturaClienteArchivadaSerializer
+    pagination_class = PaginacionHistorial
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_superuser:
+            return queryset.filter(cliente=self.request.user)
+        cliente = self.request.query_params.get('cliente')
+        if cliente is not None:
+            queryset = queryset.filter(cliente_id=cliente)
+        return queryset
+
+class FacturacionMensualViewSet(viewsets.ReadOnlyModelViewSet):
+    """Totales mensuales de los periodos archivados (?origen=tienda|cliente, ?desde=/?hasta= YYYY-MM)."""
+    queryset = FacturacionMensual.objects.all()
+    serializer_class = FacturacionMensualSerializer
+    pagination_class = PaginacionEstandar
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        origen = self.request.query_params.get('origen')
+        if origen is not None:
+            queryset = queryset.filter(origen=origen)
+        desde = mes_param(self.request.query_params.get('desde'))
+        hasta = mes_param(self.request.query_params.get('hasta'))
+        if desde:
+            queryset = queryset.filter(mes__gte=desde)
+        if hasta:
+            queryset = queryset.filter(mes__lte=hasta)
+        sucursal = self.request.query_params.get('sucursal')
+        if sucursal is not None:
+            queryset = queryset.filter(sucursal_id=sucursal)
+        return queryset
+
 class FacturaClienteViewSet(viewsets.ModelViewSet):
     queryset = FacturaCliente.objects.all()
     serializer_class = FacturaClienteSerializer
@@ -275,65 +758,139 @@ class FacturaClienteViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.is_superuser:
             # Retornar todas las facturas si es superusuario
-            return FacturaCliente.objects.all()
+            facturas = FacturaCliente.objects.all()
         else:
             # Retornar solo las facturas del cliente autenticado
-            return FacturaCliente.objects.filter(cliente=user)
+            facturas = FacturaCliente.objects.filter(cliente=user)
+        # El listado no trae detalles, solo cuántas líneas tiene cada factura
+        if self.action == 'list':
+            return facturas.select_related('cliente').annotate(lineas=Count('detalles'))
+        return facturas.select_related('cliente').prefetch_related('detalles__producto')
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return FacturaClienteListaSerializer
+        return FacturaClienteSerializer
+
+    def _cliente_consultado(self, request):
+        """El superusuario puede consultar a otro cliente con ?cliente=<id de usuario>."""
+        cliente_id = request.query_params.get('cliente')
+        if cliente_id and request.user.is_superuser:
+            return int(cliente_id)
+        return request.user.pk
+
+    def perform_update(self, serializer):
+        factura = serializer.save()
+        resumenes.recalcular([factura.cliente_id])
+
+    def perform_destroy(self, instance):
+        cliente_id = instance.cliente_id
+        with transaction.atomic():
+            instance.delete()
+            resumenes.recalcular([cliente_id])
+
+    @action(detail=False, methods=['get'])
+    def historial(self, request):
+        """Facturas del cliente de la más reciente a la más antigua, paginadas por cursor."""
+        try:
+            cliente_id = self._cliente_consultado(request)
+        except ValueError:
+            return Response({"error": "'cliente' debe ser un entero."}, status=status.HTTP_400_BAD_REQUEST)
+        facturas = (
+            FacturaCliente.objects
+            .filter(cliente_id=cliente_id)
+            .select_related('cliente')
+            .prefetch_related('detalles__producto')
+        )
+        paginador = PaginacionHistorial()
+        pagina = paginador.paginate_queryset(facturas, request, view=self)
+        serializer = FacturaClienteSerializer(pagina, many=True, context={'request': request})
+        return paginador.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def resumen(self, request):
+        """Gasto total, número de compras y última compra, leídos del resumen precalculado."""
+        try:
+            cliente_id = self._cliente_consultado(request)
+        except ValueError:
+            return Response({"error": "'cliente' debe ser un entero."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ResumenClienteSerializer(resumenes.resumen(cliente_id)).data)
+
+    @action(detail=False, methods=['get'])
+    def recompra(self, request):
+        """Productos comprados con más frecuencia (?limite=, por defecto 10)."""
+        try:
+            cliente_id = self._cliente_consultado(request)
+            limite = min(int(request.query_params.get('limite', 10)), 50)
+        except ValueError:
+            return Response({"error": "'cliente' y 'limite' deben ser enteros."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resumenes.recompra(cliente_id, limite))
 
+    @idempotente
     def create(self, request, *args, **kwargs):
-        cliente = request.user.clientes  # Obtener el cliente relacionado al usuario
-        factura_data = request.data
+        # Solo compran en línea los usuarios con perfil de cliente (cargado con el usuario autenticado)
+        if not hasattr(request.user, 'clientes'):
+            return Response({"error": "El usuario no tiene un perfil de cliente."}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            # Crear factura inicial
-            factura_cliente = FacturaCliente.objects.create(
-                cliente=request.user,
-                subtotal=0,
-                igv=0,
-                total=0
-            )
+            detalles = lineas_venta(request.data.get("detalles"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            total = Decimal(0)
-            for detalle in factura_data["detalles"]:
-                producto = Producto.objects.get(id=detalle["producto"])
-                cantidad = detalle["cantidad"]
-
-                if producto.stock < cantidad:
-                    return Response(
-                        {"error": f"Stock insuficiente para el producto {producto.nombre}. Quedan {producto.stock} unidades."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                subtotal = producto.precio * Decimal(cantidad)
-                total += subtotal
-
-                # Crear detalle
-                DetalleFacturaCliente.objects.create(
-                    factura=factura_cliente,
-                    producto=producto,
-                    cantidad=cantidad,
-                    precio_unitario=producto.precio,
-                    subtotal=subtotal
+        try:
+            with transaction.atomic():
+                # Crear factura inicial
+                factura_cliente = FacturaCliente.objects.create(
+                    cliente=request.user,
+                    subtotal=0,
+                    igv=0,
+                    total=0
                 )
 
-                # Reducir el stock
-                producto.stock -= cantidad
-                producto.save()
+                productos = sentencias.productos_por_id(producto_id for producto_id, _ in detalles)
+
+                total = Decimal(0)
+                lineas = []
+                filas = []
+                for producto_id, cantidad in detalles:
+                    producto = productos.get(producto_id)
+                    if producto is None:
+                        raise Producto.DoesNotExist
+
+                    if producto.stock < cantidad:
+                        raise StockInsuficiente(
+                            f"Stock insuficiente para el producto {producto.nombre}. Quedan {producto.stock} unidades."
+                        )
+
+                    subtotal = producto.precio * Decimal(cantidad)
+                    total += subtotal
+
+                    filas.append((producto.id, cantidad, producto.precio, subtotal))
+                    lineas.append((producto.id, cantidad))
+
+                sentencias.insertar_detalles(DetalleFacturaCliente, factura_cliente, filas)
+
+                # Reducir el stock por lotes (FEFO)
+                registrar_movimientos(movimientos_fefo(lineas, 'VENTA_CLIENTE', factura_cliente=factura_cliente))
 
-            igv = total * Decimal(0.18)
-            subtotal_factura = total - igv
+                total = redondear(total)
+                subtotal_factura, igv = desglosar(total)
 
-            # Actualizar la factura
-            factura_cliente.subtotal = subtotal_factura
-            factura_cliente.igv = igv
-            factura_cliente.total = total
-            factura_cliente.save()
+                # Actualizar la factura
+                factura_cliente.subtotal = subtotal_factura
+                factura_cliente.igv = igv
+                factura_cliente.total = total
+                factura_cliente.save()
+                resumenes.registrar_compra(factura_cliente)
+                publicar_ventas('cliente', [factura_cliente])
 
             serializer = FacturaClienteSerializer(factura_cliente, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         except Producto.DoesNotExist:
             return Response({"error": "Producto no encontrado"}, status=status.HTTP_400_BAD_REQUEST)
+        except StockInsuficiente as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -350,8 +907,10 @@ class PedidosViewSet(ModelViewSet):
         nuevo_estado = request.data.get('estado')
 
         if nuevo_estado and nuevo_estado != estado_anterior:
-            pedido.estado = nuevo_estado
-            pedido.save()
+            try:
+                transicionar_pedidos(Pedidos.objects.filter(pk=pedido.pk), nuevo_estado)
+            except TransicionInvalida as e:
+                return Response({"error": str(e)}, status=400)
             return Response({
                 "mensaje": "Estado actualizado correctamente",
                 "estado_anterior": estado_anterior,
@@ -361,41 +920,116 @@ class PedidosViewSet(ModelViewSet):
             "error": "No se pudo actualizar el estado. Verifica los datos enviados."
         }, status=400)
 
-def landing_page(request):
-    return render(request, 'landing.html')
-@api_view(['PUT'])
-def actualizar_pedido(request, pk):
-    try:
-        pedido = Pedidos.objects.get(pk=pk)
-    except Pedidos.DoesNotExist:
-        return Response({"detail": "Pedido no encontrado"}, status=404)
-
-    # Obtener el estado enviado en el request
-    estado = request.data.get('estado')
-    cantidad = request.data.get('cantidad')  # Asegurarse de obtener la cantidad
-    if cantidad:
-        cantidad = int(cantidad)  # Convertir a entero
-
-    # Actualizar el estado del pedido
-    pedido.estado = estado
-
-    if estado == 'Completado':
-        # Obtener el producto relacionado con el pedido
-        producto = pedido.producto
-        print(f"Producto antes de actualizar stock: {producto.nombre}, stock actual: {producto.stock}")
-
-        # Verificar si hay suficiente stock
-        if producto.stock >= cantidad:
-            producto.stock -= cantidad
-            producto.save()  # Guardar el producto con el stock actualizado
-            print(f"Producto actualizado: {producto.nombre}, nuevo stock: {producto.stock}")
-        else:
-            return Response({"detail": "Stock insuficiente para completar el pedido"}, status=400)
+    @action(detail=False, methods=['post'])
+    def transicion(self, request):
+        """
+        Cambia el estado de varios pedidos a la vez: {"ids": [...], "estado": "..."}.
+        Los pedidos que no admiten la transición se informan sin afectar al resto.
+        """
+        ids = request.data.get('ids') or []
+        nuevo_estado = request.data.get('estado')
+        if not isinstance(ids, list) or not ids or not nuevo_estado:
+            return Response({"error": "Debe enviar 'ids' (lista) y 'estado'."}, status=400)
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return Response({"error": "Los ids deben ser enteros."}, status=400)
+
+        try:
+            resultados = transicionar_por_id(ids, nuevo_estado)
+        except TransicionInvalida as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({
+            "nuevo_estado": nuevo_estado,
+            "actualizados": [pk for pk, resultado in resultados.items() if resultado == 'ok'],
+            "resultados": [{"id": pk, "resultado": resultado} for pk, resultado in resultados.items()],
+        })
+
+class OrdenCompraViewSet(viewsets.ModelViewSet):
+    queryset = OrdenCompra.objects.select_related('proveedor').prefetch_related('lineas__producto').order_by('-fecha', '-id')
+    serializer_class = OrdenCompraSerializer
+    pagination_class = PaginacionEstandar
+
+    @action(detail=True, methods=['post'])
+    def recibir(self, request, pk=None):
+        """Ingresa todas las líneas pendientes de la orden en una sola transacción."""
+        orden = self.get_object()
+        if orden.estado == 'Recibida':
+            return Response({"error": "La orden ya fue recibida."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            recibidas = transicionar_pedidos(orden.lineas.exclude(estado='Completado'), 'Completado')
+            orden.estado = 'Recibida'
+            orden.recibida = timezone.now()
+            orden.save(update_fields=['estado', 'recibida'])
+
+        orden = self.get_queryset().get(pk=orden.pk)
+        return Response({
+            "lineas_recibidas": len(recibidas),
+            "orden": self.get_serializer(orden).data,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='desde-sugerencias')
+    def desde_sugerencias(self, request):
+        """Convierte las sugerencias de reposición de un proveedor en una orden borrador."""
+        proveedor = get_object_or_404(Proveedor, pk=request.data.get('proveedor'))
+        sugerencias = list(SugerenciaReposicion.objects.filter(proveedor=proveedor))
+        if not sugerencias:
+            return Response({"error": "No hay sugerencias para este proveedor."}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data={
+            'proveedor': proveedor.pk,
+            'lineas': [
+                {'producto': s.producto_id, 'cantidad': s.cantidad, 'precio_compra': s.precio_compra}
+                for s in sugerencias
+            ],
+        })
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+            SugerenciaReposicion.objects.filter(pk__in=[s.pk for s in sugerencias]).delete()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class ReposicionView(APIView):
+    """Órdenes de compra sugeridas, agrupadas por proveedor."""
 
-    pedido.save()
+    def get(self, request):
+        sugerencias = SugerenciaReposicion.objects.values(
+            'proveedor_id', 'proveedor__nombre', 'producto_id', 'producto__nombre',
+            'cantidad', 'velocidad', 'stock', 'en_camino', 'precio_compra', 'generada',
+        )
+        proveedor_id = request.query_params.get('proveedor_id', None)
+        if proveedor_id is not None:
+            sugerencias = sugerencias.filter(proveedor_id=proveedor_id)
+
+        ordenes = {}
+        for fila in sugerencias:
+            orden = ordenes.setdefault(fila['proveedor_id'], {
+                'proveedor_id': fila['proveedor_id'],
+                'proveedor_nombre': fila['proveedor__nombre'],
+                'generada': fila['generada'],
+                'subtotal': Decimal(0),
+                'lineas': [],
+            })
+            orden['subtotal'] += fila['precio_compra'] * fila['cantidad']
+            orden['lineas'].append({
+                'producto_id': fila['producto_id'],
+                'producto_nombre': fila['producto__nombre'],
+                'cantidad': fila['cantidad'],
+                'velocidad': fila['velocidad'],
+                'stock': fila['stock'],
+                'en_camino': fila['en_camino'],
+                'precio_compra': fila['precio_compra'],
+            })
+        return Response(list(ordenes.values()), status=status.HTTP_200_OK)
 
-    return Response({"detail": "Pedido actualizado con éxito", "pedido": pedido.id}, status=200)
+    def post(self, request):
+        # Recalcula las sugerencias (la corrida nocturna usa `manage.py generar_reposicion`)
+        sugerencias = generar_sugerencias()
+        return Response({"productos": len(sugerencias)}, status=status.HTTP_201_CREATED)
 
+def landing_page(request):
+    return render(request, 'landing.html')
 def generar_factura_pdf(request, factura_id):
     try:
         # Obtener la factura y los detalles relacionados
@@ -442,19 +1076,15 @@ def reporte_general(request):
         if request.GET.get('format') == 'pdf':
             # Generación del PDF
             facturas = Factura.objects.all()
-            total_facturas = facturas.aggregate(total_facturado=Sum('total'))['total_facturado'] or 0.0
-            total_igv = facturas.aggregate(total_igv=Sum('igv'))['total_igv'] or 0.0
-            total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0.0
+            total_facturas, total_igv, total_subtotal = totales_generales(facturas, 'tienda')
 
             # Resumen de productos más vendidos
-            productos_vendidos = Factura.objects.values('detalles__producto').annotate(
-                total_vendido=Sum('detalles__cantidad')
-            ).order_by('-total_vendido')[:5]
+            productos_vendidos = mas_vendidos(DetalleFactura.objects.all(), 'tienda')
 
             productos_data = []
             for producto_data in productos_vendidos:
                 try:
-                    producto = Producto.objects.get(id=producto_data['detalles__producto'])
+                    producto = Producto.objects.get(id=producto_data['producto'])
                     producto_serializer = ProductoSerializer(producto)
                     productos_data.append({
                         'producto': producto_serializer.data,
@@ -483,20 +1113,21 @@ def reporte_general(request):
 
             return response
         
-        # Si no se requiere PDF, retornar los datos en formato JSON
+        # Si no se requiere PDF, retornar los datos en formato JSON (?sucursal= acota las ventas a un local)
         facturas = Factura.objects.all()
-        total_facturas = facturas.aggregate(total_facturado=Sum('total'))['total_facturado'] or 0.0
-        total_igv = facturas.aggregate(total_igv=Sum('igv'))['total_igv'] or 0.0
-        total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0.0
+        detalles = DetalleFactura.objects.all()
+        sucursal_id = sucursal_param(request)
+        if sucursal_id is not None:
+            facturas = facturas.filter(sucursal_id=sucursal_id)
+            detalles = detalles.filter(factura__sucursal_id=sucursal_id)
+        total_facturas, total_igv, total_subtotal = totales_generales(facturas, 'tienda', sucursal_id)
 
-        productos_vendidos = Factura.objects.values('detalles__producto').annotate(
-            total_vendido=Sum('detalles__cantidad')
-        ).order_by('-total_vendido')[:5]
+        productos_vendidos = mas_vendidos(detalles, 'tienda', sucursal_id=sucursal_id)
 
         productos_data = []
         for producto_data in productos_vendidos:
             try:
-                producto = Producto.objects.get(id=producto_data['detalles__producto'])
+                producto = Producto.objects.get(id=producto_data['producto'])
                 producto_serializer = ProductoSerializer(producto)
                 productos_data.append({
                     'producto': producto_serializer.data,
@@ -505,7 +1136,9 @@ def reporte_general(request):
             except Producto.DoesNotExist:
                 continue
 
-        proveedores = Proveedor.objects.all()
+        proveedores = Proveedor.objects.annotate(
+            total_pedidos=Count('pedidos'), monto_total=Sum('pedidos__total_pedido')
+        )
         proveedores_top = ProveedorTopSerializer(proveedores, many=True)
 
         pedidos = Pedidos.objects.all()
@@ -528,12 +1161,22 @@ def reporte_general(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 def reporte_mensual(request, year, month):
-    # Filtrar las facturas por el año y mes proporcionados
-    facturas = Factura.objects.filter(fecha__year=year, fecha__month=month)
+    # Filtrar las facturas por el año y mes proporcionados (?sucursal= para un solo local)
+    desde, hasta = rango_mes(year, month)
+    sucursal_id = sucursal_param(request)
+    facturas = Factura.objects.filter(fecha__gte=desde, fecha__lt=hasta)
+    if sucursal_id is not None:
+        facturas = facturas.filter(sucursal_id=sucursal_id)
     
     # Calcular el total de ventas y el IGV
-    ventas_totales = facturas.aggregate(total_ventas=Sum('total'))['total_ventas'] or 0
-    total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0
+    ventas_totales, total_subtotal, _, cantidad_facturas = sentencias.totales_facturas(
+        Factura, desde, hasta, sucursal_id
+    )
+    # Un mes está entero en la tabla viva o entero en el archivo
+    archivados = archivo.totales('tienda', desde, hasta, sucursal_id)
+    ventas_totales += archivados['total']
+    total_subtotal += archivados['subtotal']
+    cantidad_facturas += archivados['cantidad']
     total_igv = ventas_totales - total_subtotal
     
     ventas_totales = round(ventas_totales, 2)
@@ -544,52 +1187,40 @@ def reporte_mensual(request, year, month):
     detalles_ventas = DetalleFactura.objects.filter(factura__in=facturas)
     
     # Obtener las ventas por producto con más detalles
-    ventas_por_producto = detalles_ventas.values('producto').annotate(
-        cantidad_vendida=Sum('cantidad'),
-        subtotal=Sum('subtotal')
-    )
+    ventas_por_producto = ventas_productos(detalles_ventas, 'tienda', desde, hasta, sucursal_id)
     
-    productos_vendidos = []
-    for venta in ventas_por_producto:
-        producto = Producto.objects.get(id=venta['producto'])
-        
-        productos_vendidos.append({
-            'producto': {
-                'id': producto.id,
-                'nombre': producto.nombre,
-                'descripcion': producto.descripcion,
-                'precio_sin_igv': str(producto.precio_sin_igv),
-                'precio': str(producto.precio),
-                'stock': producto.stock,
-                'fecha_vencimiento': producto.fecha_vencimiento.strftime('%Y-%m-%d'),
-                'presentacion': producto.presentacion,
-                'categoria': producto.categoria.id,
-                'categoria_nombre': producto.categoria.nombre,
-                'proveedor': producto.proveedor.id,
-                'proveedor_nombre': producto.proveedor.nombre,
-                'imagen': producto.imagen.url if producto.imagen else None,
-                'imagen_url': producto.imagen.url if producto.imagen else None
-            },
-            'total_vendido': venta['cantidad_vendida']
-        })
+    # Los productos vendidos en una sola consulta, con la misma forma que la API de productos
+    por_id = {
+        producto['id']: producto
+        for producto in lecturas.productos(
+            Producto.objects.filter(pk__in=[venta['producto'] for venta in ventas_por_producto]), request
+        )
+    }
+    productos_vendidos = [
+        {'producto': por_id[venta['producto']], 'total_vendido': venta['cantidad_vendida']}
+        for venta in ventas_por_producto
+        if venta['producto'] in por_id
+    ]
     
     # Filtrar los pedidos por el año y mes proporcionados
     pedidos = Pedidos.objects.filter(fecha_pedido__year=year, fecha_pedido__month=month)
 
     
-    # Obtener proveedores con su total de pedidos y monto facturado
-    proveedores = Proveedor.objects.all()
-    proveedores_info = []
-    for proveedor in proveedores:
-        total_pedidos_mes = pedidos.aggregate(total_pedidos=Sum('total_pedido'))['total_pedidos'] or 0.0
-        monto_total = facturas.filter(detalles__producto__proveedor=proveedor).aggregate(monto_total=Sum('total'))['monto_total'] or 0
-        
-        proveedores_info.append({
-            'id': proveedor.id,
-            'nombre': proveedor.nombre,
+    # Obtener proveedores con su total de pedidos y monto facturado (una consulta agrupada)
+    total_pedidos_mes = pedidos.aggregate(total_pedidos=Sum('total_pedido'))['total_pedidos'] or 0.0
+    montos = dict(
+        detalles_ventas.values_list('producto__proveedor').annotate(monto_total=Sum('factura__total')).order_by()
+    )
+    ventas_archivadas = archivo.ventas_por_proveedor('tienda', desde, hasta, sucursal_id)
+    proveedores_info = [
+        {
+            'id': pk,
+            'nombre': nombre,
             'total_pedidos_mes': total_pedidos_mes,
-            'monto_total': str(monto_total)
-        })
+            'monto_total': str((montos.get(pk) or 0) + ventas_archivadas.get(pk, 0)),
+        }
+        for pk, nombre in Proveedor.objects.values_list('id', 'nombre')
+    ]
     
     # Crear el diccionario con todos los datos
     response_data = {
@@ -599,21 +1230,24 @@ def reporte_mensual(request, year, month):
         'productos_vendidos': productos_vendidos,
         'proveedores': proveedores_info,
         'total_pedidos_mes': total_pedidos_mes,
-        'total_pedidos_count': facturas.count(),  # Cantidad de facturas
+        'total_pedidos_count': cantidad_facturas,  # Cantidad de facturas
         'year': year,
         'month': month,
-        'nombre_mes': datetime(year, month, 1).strftime('%B')
+        'nombre_mes': datetime(year, month, 1).strftime('%B'),
+        'sucursal': sucursal_id,
     }
     
     return JsonResponse(response_data)
 
 def reporte_mensualpdf(request, year, month):
     # Filtrar las facturas por el año y mes proporcionados
-    facturas = Factura.objects.filter(fecha__year=year, fecha__month=month)
+    desde, hasta = rango_mes(year, month)
+    facturas = Factura.objects.filter(fecha__gte=desde, fecha__lt=hasta)
     
     # Calcular el total de ventas y el IGV
-    ventas_totales = facturas.aggregate(total_ventas=Sum('total'))['total_ventas'] or 0
-    total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0
+    archivados = archivo.totales('tienda', desde, hasta)
+    ventas_totales = (facturas.aggregate(total_ventas=Sum('total'))['total_ventas'] or 0) + archivados['total']
+    total_subtotal = (facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0) + archivados['subtotal']
     total_igv = ventas_totales - total_subtotal
     
     ventas_totales = round(ventas_totales, 2)
@@ -624,10 +1258,7 @@ def reporte_mensualpdf(request, year, month):
     detalles_ventas = DetalleFactura.objects.filter(factura__in=facturas)
     
     # Obtener las ventas por producto con más detalles
-    ventas_por_producto = detalles_ventas.values('producto').annotate(
-        cantidad_vendida=Sum('cantidad'),
-        subtotal=Sum('subtotal')
-    )
+    ventas_por_producto = ventas_productos(detalles_ventas, 'tienda', desde, hasta)
     
     productos_vendidos = []
     for venta in ventas_por_producto:
@@ -677,19 +1308,15 @@ def reporte_general_clientes(request):
         if request.GET.get('format') == 'pdf':
             # Generación del PDF
             facturas = FacturaCliente.objects.all()
-            total_facturas = facturas.aggregate(total_facturado=Sum('total'))['total_facturado'] or 0.0
-            total_igv = facturas.aggregate(total_igv=Sum('igv'))['total_igv'] or 0.0
-            total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0.0
+            total_facturas, total_igv, total_subtotal = totales_generales(facturas, 'cliente')
 
             # Resumen de productos más vendidos
-            productos_vendidos = FacturaCliente.objects.values('detalles__producto').annotate(
-                total_vendido=Sum('detalles__cantidad')
-            ).order_by('-total_vendido')[:5]
+            productos_vendidos = mas_vendidos(DetalleFacturaCliente.objects.all(), 'cliente')
 
             productos_data = []
             for producto_data in productos_vendidos:
                 try:
-                    producto = Producto.objects.get(id=producto_data['detalles__producto'])
+                    producto = Producto.objects.get(id=producto_data['producto'])
                     producto_serializer = ProductoSerializer(producto)
                     productos_data.append({
                         'producto': producto_serializer.data,
@@ -720,18 +1347,14 @@ def reporte_general_clientes(request):
         
         # Si no se requiere PDF, retornar los datos en formato JSON
         facturas = FacturaCliente.objects.all()
-        total_facturas = facturas.aggregate(total_facturado=Sum('total'))['total_facturado'] or 0.0
-        total_igv = facturas.aggregate(total_igv=Sum('igv'))['total_igv'] or 0.0
-        total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0.0
+        total_facturas, total_igv, total_subtotal = totales_generales(facturas, 'cliente')
 
-        productos_vendidos = FacturaCliente.objects.values('detalles__producto').annotate(
-            total_vendido=Sum('detalles__cantidad')
-        ).order_by('-total_vendido')[:5]
+        productos_vendidos = mas_vendidos(DetalleFacturaCliente.objects.all(), 'cliente')
 
         productos_data = []
         for producto_data in productos_vendidos:
             try:
-                producto = Producto.objects.get(id=producto_data['detalles__producto'])
+                producto = Producto.objects.get(id=producto_data['producto'])
                 producto_serializer = ProductoSerializer(producto)
                 productos_data.append({
                     'producto': producto_serializer.data,
@@ -757,8 +1380,12 @@ def reporte_mensual_clientes(request, year, month):
     facturas = FacturaCliente.objects.filter(fecha__year=year, fecha__month=month)
     
     # Calcular el total de ventas y el IGV
-    ventas_totales = facturas.aggregate(total_ventas=Sum('total'))['total_ventas'] or 0
-    total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0
+    desde, hasta = rango_mes(year, month, con_hora=True)
+    ventas_totales, total_subtotal, _, _ = sentencias.totales_facturas(FacturaCliente, desde, hasta)
+    mes_desde, mes_hasta = rango_mes(year, month)
+    archivados = archivo.totales('cliente', mes_desde, mes_hasta)
+    ventas_totales += archivados['total']
+    total_subtotal += archivados['subtotal']
     total_igv = ventas_totales - total_subtotal
     
     ventas_totales = round(ventas_totales, 2)
@@ -769,10 +1396,7 @@ def reporte_mensual_clientes(request, year, month):
     detalles_ventas = DetalleFacturaCliente.objects.filter(factura__in=facturas)
     
     # Obtener las ventas por producto con más detalles
-    ventas_por_producto = detalles_ventas.values('producto').annotate(
-        cantidad_vendida=Sum('cantidad'),
-        subtotal=Sum('subtotal')
-    )
+    ventas_por_producto = ventas_productos(detalles_ventas, 'cliente', mes_desde, mes_hasta)
     
     productos_vendidos = []
     for venta in ventas_por_producto:
@@ -816,8 +1440,10 @@ def reporte_mensual_pdf(request, year, month):
         facturas = FacturaCliente.objects.filter(fecha__year=year, fecha__month=month)
         
         # Calcular el total de ventas y el IGV
-        ventas_totales = facturas.aggregate(total_ventas=Sum('total'))['total_ventas'] or 0
-        total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0
+        desde, hasta = rango_mes(year, month)
+        archivados = archivo.totales('cliente', desde, hasta)
+        ventas_totales = (facturas.aggregate(total_ventas=Sum('total'))['total_ventas'] or 0) + archivados['total']
+        total_subtotal = (facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0) + archivados['subtotal']
         total_igv = ventas_totales - total_subtotal
         
         ventas_totales = round(ventas_totales, 2)
@@ -828,10 +1454,7 @@ def reporte_mensual_pdf(request, year, month):
         detalles_ventas = DetalleFacturaCliente.objects.filter(factura__in=facturas)
         
         # Obtener las ventas por producto con más detalles
-        ventas_por_producto = detalles_ventas.values('producto').annotate(
-            cantidad_vendida=Sum('cantidad'),
-            subtotal=Sum('subtotal')
-        )
+        ventas_por_producto = ventas_productos(detalles_ventas, 'cliente', desde, hasta)
         
         productos_vendidos = []
         for venta in ventas_por_producto:
@@ -892,22 +1515,19 @@ def descargar_reporte_general(request):
     try:
         # Obtener los datos para el reporte
         facturas = Factura.objects.all()
-        total_facturas = facturas.aggregate(total_facturado=Sum('total'))['total_facturado'] or Decimal('0.0')
-        total_igv = facturas.aggregate(total_igv=Sum('igv'))['total_igv'] or Decimal('0.0')
-        total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or Decimal('0.0')
+        total_facturas, total_igv, total_subtotal = totales_generales(facturas, 'tienda')
 
-        productos_vendidos = Factura.objects.values('detalles__producto').annotate(
-            total_vendido=Sum('detalles__cantidad')
-        ).order_by('-total_vendido')[:5]
+        productos_vendidos = mas_vendidos(DetalleFactura.objects.all(), 'tienda')
         
         productos_data = []
         for producto_data in productos_vendidos:
             try:
-                producto = Producto.objects.get(id=producto_data['detalles__producto'])
+                producto = Producto.objects.get(id=producto_data['producto'])
                 precio_unitario = Decimal(producto.precio)
                 cantidad_vendida = Decimal(producto_data['total_vendido'])
-                igv = (precio_unitario * cantidad_vendida * Decimal('0.18')).quantize(Decimal('0.01'))
-                total = (precio_unitario * cantidad_vendida * Decimal('1.18')).quantize(Decimal('0.01'))
+                # El precio ya incluye IGV: se separa del total como en la venta
+                total = redondear(precio_unitario * cantidad_vendida)
+                _, igv = desglosar(total)
                 producto_serializer = ProductoSerializer(producto)
                 productos_data.append({
                     'producto': producto_serializer.data,
@@ -918,15 +1538,17 @@ def descargar_reporte_general(request):
             except Producto.DoesNotExist:
                 continue
 
-        proveedores = Proveedor.objects.all()
+        proveedores = Proveedor.objects.annotate(
+            total_pedidos=Count('pedidos'), monto_total=Sum('pedidos__total_pedido')
+        )
         proveedores_top = ProveedorTopSerializer(proveedores, many=True)
 
         pedidos = Pedidos.objects.all()
         total_pedidos = pedidos.aggregate(total_pedidos=Sum('total_pedido'))['total_pedidos'] or Decimal('0.0')
         total_pedidos_count = pedidos.count()
 
-        # Cálculo de la ganancia neta
-        ganancia_neta = (total_subtotal - total_pedidos).quantize(Decimal('0.01'))
+        # Ganancia neta: ventas sin IGV menos su costo al promedio ponderado
+        ganancia_neta = margen_ventas()['total']['margen']
 
         reporte_data = {
             'total_facturado': total_facturas,
@@ -993,9 +1615,7 @@ def generar_reporte_pdf_cliente(request):
     try:
         # Obtener las facturas y realizar los cálculos
         facturas = FacturaCliente.objects.all()
-        total_facturado = facturas.aggregate(total_facturado=Sum('total'))['total_facturado'] or 0.0
-        total_igv = facturas.aggregate(total_igv=Sum('igv'))['total_igv'] or 0.0
-        total_subtotal = facturas.aggregate(total_subtotal=Sum('subtotal'))['total_subtotal'] or 0.0
+        total_facturado, total_igv, total_subtotal = totales_generales(facturas, 'cliente')
 
         # Redondear los valores a 2 decimales
         total_facturado = round(total_facturado, 2)
@@ -1003,9 +1623,7 @@ def generar_reporte_pdf_cliente(request):
         total_subtotal = round(total_subtotal, 2)
 
         # Productos más vendidos
-        productos_vendidos = DetalleFacturaCliente.objects.values('producto').annotate(
-            total_vendido=Sum('cantidad')
-        ).order_by('-total_vendido')[:5]
+        productos_vendidos = mas_vendidos(DetalleFacturaCliente.objects.all(), 'cliente')
 
         productos_data = []
         for producto_data in productos_vendidos:
@@ -1087,3 +1705,23 @@ def generar_pdf_factura_cliente(request, factura_id):
     except Exception as e:
         return HttpResponse(f"Error al generar el PDF: {str(e)}", status=500)
     
+
+@api_view(['GET'])
+def reporte_margen(request):
+    """
+    Ventas sin IGV, costo de ventas (costo promedio ponderado) y margen por mes y
+    por categoría entre ?desde=YYYY-MM y ?hasta=YYYY-MM (ambos opcionales).
+    """
+    desde = mes_param(request.query_params.get('desde'))
+    hasta = mes_param(request.query_params.get('hasta'))
+    if (request.query_params.get('desde') and desde is None) or (request.query_params.get('hasta') and hasta is None):
+        return Response({"error": "Use el formato YYYY-MM en 'desde' y 'hasta'."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(margen_ventas(desde, hasta))
+
+@api_view(['GET'])
+def valorizacion_inventario(request):
+    """Stock valorizado al costo promedio vigente por categoría, o por producto con ?categoria=."""
+    categoria_id = request.query_params.get('categoria')
+    if categoria_id is not None and not categoria_id.isdigit():
+        return Response({"error": "'categoria' debe ser un entero."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(valorizar_inventario(categoria_id))
@@ -0,0 +1,137 @@
+"""
+Versiones async de los endpoints de lectura más frecuentes, para servir con ASGI
+(settings.VISTAS_ASYNC). Mientras esperan a la BD o a un cliente lento no ocupan
+un worker, y devuelven el mismo JSON que las vistas DRF equivalentes.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+
+from . import eventos, lecturas
+from .autenticacion import ClaimsJWTAuthentication
+from .models import Clientes, Medicamento, Producto
+from .serializers import MedicamentoSerializer
+from .views import ProductoViewSet
+
+_autenticacion = ClaimsJWTAuthentication()
+_productos_sync = ProductoViewSet.as_view({'get': 'list', 'post': 'create'})
+
+
+def _json(datos, status_code=status.HTTP_200_OK, headers=None):
+    respuesta = HttpResponse(JSONRenderer().render(datos), status=status_code, content_type='application/json')
+    for nombre, valor in (headers or {}).items():
+        respuesta[nombre] = valor
+    return respuesta
+
+
+async def _autenticar(request):
+    """Usuario autenticado por JWT (o None) y, si falla, la respuesta de error de DRF."""
+    try:
+        resultado = await _autenticacion.aauthenticate(request)
+    except APIException as e:
+        # Mismo cuerpo que el exception handler de DRF
+        datos = e.detail if isinstance(e.detail, (list, dict)) else {'detail': e.detail}
+        return None, _json(datos, e.status_code, {'WWW-Authenticate': _autenticacion.authenticate_header(request)})
+    if resultado is None:
+        return None, _json(
+            {'detail': "Authentication credentials were not provided."},
+            status.HTTP_401_UNAUTHORIZED,
+            {'WWW-Authenticate': _autenticacion.authenticate_header(request)},
+        )
+    request.user, request.auth = resultado
+    return request.user, None
+
+
+async def _lista_productos(request, **filtros):
+    # La misma lectura rápida con values() que ProductoViewSet.list, en el hilo de la BD
+    return await sync_to_async(lecturas.productos)(Producto.objects.filter(**filtros), request)
+
+
+@csrf_exempt
+async def productos(request):
+    """GET /v1/productos/ async; el resto de métodos sigue en ProductoViewSet."""
+    if request.method != 'GET':
+        return await sync_to_async(_productos_sync)(request)
+    filtros = {}
+    categoria_id = request.GET.get('categoria_id')
+    if categoria_id is not None:
+        filtros['categoria_id'] = categoria_id
+    return _json(await _lista_productos(request, **filtros))
+
+
+@require_GET
+async def productos_por_categoria(request, categoria_id):
+    datos = await _lista_productos(request, categoria_id=categoria_id)
+    if datos:
+        return _json(datos)
+    return _json({"error": "No se encontraron productos para esta categoría."}, status.HTTP_404_NOT_FOUND)
+
+
+@require_GET
+async def medicamento_detalle(request, pk):
+    try:
+        medicamento = await Medicamento.objects.aget(pk=pk)
+    except Medicamento.DoesNotExist:
+        return _json({'detail': "No Medicamento matches the given query."}, status.HTTP_404_NOT_FOUND)
+    return _json(MedicamentoSerializer(medicamento).data)
+
+
+@require_GET
+async def usuario_actual(request):
+    user, error = await _autenticar(request)
+    if error is not None:
+        return error
+    try:
+        cliente = user.clientes  # Cargado junto con el usuario autenticado
+    except Clientes.DoesNotExist:
+        return _json({"error": "Cliente no encontrado"}, status.HTTP_404_NOT_FOUND)
+    return _json({
+        "cliente_id": cliente.id,
+        "username": user.username,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "direccion": cliente.direccion,
+        "dni": cliente.dni,
+    })
+
+
+@require_GET
+async def verificar_superusuario(request):
+    user, error = await _autenticar(request)
+    if error is not None:
+        return error
+    return _json({"is_superuser": user.is_superuser})
+
+
+@require_GET
+async def eventos_inventario(request):
+    """
+    Feed SSE de cambios de stock y ventas para los dashboards. EventSource no
+    permite cabeceras, así que el access token puede ir en ?token=. Para reanudar
+    se usa Last-Event-ID (o ?desde=<id>).
+    """
+    token = request.GET.get('token')
+    if token and 'HTTP_AUTHORIZATION' not in request.META:
+        request.META['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+    user, error = await _autenticar(request)
+    if error is not None:
+        return error
+    if not (user.is_staff or user.is_superuser):
+        return _json({'detail': "You do not have permission to perform this action."}, status.HTTP_403_FORBIDDEN)
+
+    try:
+        desde = int(request.headers.get('Last-Event-ID') or request.GET['desde'])
+    except (KeyError, ValueError):
+        desde = None
+    # Con WSGI un iterador async se consumiría completo antes de responder
+    contenido = eventos.flujo_async(desde) if isinstance(request, ASGIRequest) else eventos.flujo(desde)
+    respuesta = StreamingHttpResponse(contenido, content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'  # Sin buffer en nginx
+    return respuesta
@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 from datetime import timedelta
+from decimal import Decimal
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -10,8 +12,23 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Incluye is_superuser, is_staff y cliente_id como claims del token
+    'TOKEN_OBTAIN_SERIALIZER': 'api.autenticacion.TokenConClaimsSerializer',
+    # Refresh con pre-chequeo en memoria (filtro de Bloom) de tokens revocados
+    'TOKEN_REFRESH_SERIALIZER': 'api.lista_negra.TokenRefreshConFiltroSerializer',
 }
 
+# Filtro de Bloom de la lista negra de refresh tokens
+LISTA_NEGRA = {
+    'CAPACIDAD': 100000,  # Tokens revocados vigentes esperados
+    'TASA_ERROR': 0.001,  # Proporción de falsos positivos (consultan la BD)
+    'RECONSTRUIR_SEGUNDOS': 3600,  # Reconstrucción para descartar tokens expirados
+}
+
+# Caché en memoria de usuarios autenticados por JWT (segundos / entradas)
+AUTH_CACHE_USUARIOS_TTL = int(os.environ.get('AUTH_CACHE_USUARIOS_TTL', 60))
+AUTH_CACHE_USUARIOS_MAXIMO = 10000
+
 # Clave secreta para producción (asegúrate de usar una variable de entorno en producción)
 SECRET_KEY = os.environ.get('SECRET_KEY', default="dks234asd")
 
@@ -24,7 +41,7 @@ ALLOWED_HOSTS = ['localhost', 'http://localhost:5173/']  # Reemplaza con tu domi
 # Configuración de DRF
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.autenticacion.ClaimsJWTAuthentication',
     ),
 }
 
@@ -43,6 +60,7 @@ INSTALLED_APPS = [
     'drf_yasg',
     'corsheaders',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'cloudinary_storage',
     'cloudinary',
 ]
@@ -60,9 +78,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-# Configuración de URLs y WSGI
+# Configuración de URLs, WSGI y ASGI
 ROOT_URLCONF = 'farmavida.urls'
 WSGI_APPLICATION = 'farmavida.wsgi.application'
+ASGI_APPLICATION = 'farmavida.asgi.application'
+# Lecturas del catálogo y del usuario actual como vistas async (desplegar con ASGI:
+# gunicorn farmavida.asgi:application -k uvicorn.workers.UvicornWorker)
+VISTAS_ASYNC = os.environ.get('VISTAS_ASYNC', 'False') == 'True'
 
 # Configuración de plantillas
 TEMPLATES = [
@@ -120,6 +142,63 @@ CSRF_TRUSTED_ORIGINS = [
     "http://localhost:5173",  # Reemplaza con los dominios confiables
 ]
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Retry-After']
+
+# Sentencias preparadas (PREPARE/EXECUTE) para las consultas de venta y reportes.
+# Solo aplica con PostgreSQL y sin pooler en modo transacción.
+SENTENCIAS_PREPARADAS = os.environ.get('SENTENCIAS_PREPARADAS', 'False') == 'True'
+
+# Tasa del IGV aplicada a precios de venta, facturas y pedidos
+IGV_TASA = Decimal(os.environ.get('IGV_TASA', '0.18'))
+
+# Configuración de inventario
+INVENTARIO = {
+    'STOCK_MINIMO': 10,  # Unidades a partir de las cuales se alerta stock bajo
+    'DIAS_AVISO_VENCIMIENTO': 30,  # Días de anticipación para alertar vencimientos
+    'VENTANAS_VENTAS': (7, 30, 90),  # Ventanas móviles (días) para la velocidad de venta
+    'PESOS_VENTANAS': (0.5, 0.3, 0.2),  # Peso de cada ventana en la velocidad combinada
+    'DIAS_COBERTURA': 14,  # Días de venta a cubrir después de recibir el pedido
+    'DIAS_SEGURIDAD': 3,  # Stock de seguridad expresado en días de venta
+}
+
+# Claves de idempotencia de los endpoints de venta (cabecera Idempotency-Key)
+IDEMPOTENCIA = {
+    'TTL_HORAS': 24,  # Tiempo durante el que se conserva la respuesta registrada
+    'BLOQUEO_SEGUNDOS': 60,  # Tras este tiempo una clave EN_CURSO se considera abandonada
+}
+
+# Índice de co-compra "los clientes también compraron" (api/recomendaciones.py)
+RECOMENDACIONES = {
+    'MAXIMO_CESTA': 100,  # Facturas con más productos no generan pares (compras institucionales)
+    'VECES_MINIMAS': 2,  # Co-compras mínimas para recomendar un par
+}
+
+# Pronóstico de ventas con Holt-Winters (api/pronosticos.py)
+PRONOSTICOS = {
+    'DIAS_HISTORIA': 182,  # Días de ventas usados para ajustar (mínimo dos semanas)
+    'HORIZONTE': 28,  # Días pronosticados
+    'ALFAS': (0.1, 0.3, 0.5),  # Suavizado del nivel; se elige el mejor por producto
+    'GAMMAS': (0.05, 0.2),  # Suavizado de la estacionalidad semanal
+    'BETA': 0.02,  # Suavizado de la tendencia
+    'AMORTIGUAMIENTO': 0.9,  # Amortiguación de la tendencia en el horizonte
+}
+
+# Segundos que se conserva en caché la analítica de proveedores por ventana de fechas
+ANALITICA_PROVEEDORES_CACHE = 300
+
+# Feed SSE de stock y ventas (api/eventos.py)
+EVENTOS = {
+    'INTERVALO_SONDEO': 2,  # Segundos entre lecturas de la tabla (eventos de otros workers)
+    'LATIDO': 15,  # Comentario keep-alive para que proxies no cierren la conexión
+    'RETENCION_HORAS': 24,  # Antigüedad a partir de la cual purgar_eventos los elimina
+}
+
+# Archivo de periodos cerrados (api/archivo.py)
+ARCHIVO = {
+    'MESES_ACTIVOS': 12,  # Meses recientes que nunca se archivan
+    'LOTE': 2000,  # Facturas movidas por transacción
+}
 
 # Campo predeterminado para claves primarias
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'